@@ -1,5 +1,4 @@
 import os
-import copy
 import random
 from collections import defaultdict
 from typing import List, Dict, Tuple, Any
@@ -8,7 +7,12 @@ import time
 
 import matplotlib.patches as mpatches
 
-from data_reader import read_dynamic_fjsp_instance_json
+from data_reader import read_dynamic_fjsp_instance_json, compile_instance, EVENT_BREAKDOWN, EVENT_ADDED_JOB, \
+    EVENT_CANCEL_JOB
+from result_store import ResultStore, rule_hash
+
+# Versiunea semanticii simulării clasice (cheie în `result_store`)
+ENGINE_VERSION = "classic-tick-1"
 
 ###############################################################################
 # 0) UTILITARE COMUNE ---------------------------------------------------------
@@ -166,20 +170,6 @@ def calc_job_waiting_time(sched: List) -> Tuple[float, float]:
 # 3) Regulile de prioritizare / tie‑break
 ###############################################################################
 
-def remaining_processing_time(jobs_list_arg: List[List[List[Tuple[int, int]]]],
-                              job_idx_arg: int,
-                              current_op_idx_arg: int) -> float:
-    total_remaining_time = 0.0
-    if 0 <= job_idx_arg < len(jobs_list_arg):
-        job_ops_list = jobs_list_arg[job_idx_arg]
-        if 0 <= current_op_idx_arg < len(job_ops_list):
-            for op_list_idx in range(current_op_idx_arg, len(job_ops_list)):
-                operation_alternatives = job_ops_list[op_list_idx]
-                if operation_alternatives:
-                    total_remaining_time += min(float(p_time) for _m, p_time in operation_alternatives)
-    return total_remaining_time
-
-
 def compute_priority(rule: str,
                      job_id: int,
                      op_idx: int,
@@ -187,7 +177,7 @@ def compute_priority(rule: str,
                      ptime: int,
                      cur_time: int,
                      *,
-                     jobs,
+                     instance,
                      job_progress,
                      arrival_times,
                      machine_loads: Dict[int, int]) -> float:
@@ -201,11 +191,13 @@ def compute_priority(rule: str,
     if rule == "LIFO":
         return -arrival_times[job_id]
     if rule == "SRPT":
-        return remaining_processing_time(jobs, job_id, op_idx)
+        return instance.op_rpt_list[instance.job_op_ptr_list[job_id] + op_idx]
     if rule == "OPR":
-        return len(jobs[job_id]) - op_idx
+        return instance.job_num_ops_list[job_id] - op_idx
     if rule == "ECT":
-        remain_after = remaining_processing_time(jobs, job_id, op_idx+1)
+        remain_after = 0.0
+        if op_idx + 1 < instance.job_num_ops_list[job_id]:
+            remain_after = instance.op_rpt_list[instance.job_op_ptr_list[job_id] + op_idx + 1]
         return cur_time + ptime + remain_after
     if rule == "LLM":
         return machine_loads[machine]
@@ -221,103 +213,84 @@ def compute_priority(rule: str,
 
 
 def schedule_dynamic_no_parallel(
-        initial_jobs_ops: List[List[List[Tuple[int, int]]]],
-        n_machines: int,
-        events: Dict[str, Any],
+        instance,
         rule: str,
         max_simulation_time: float = 200000.0
 ) -> Tuple[float, List[Tuple[int, int, int, float, float]]]:
     """
     Simulare incrementală cu gestionarea evenimentelor dinamice și ETPC.
     NU foloseste due_dates.
+    `instance` este un `CompiledInstance` (vezi `data_reader.compile_instance`), citit fără copiere;
+    operațiile sunt adresate prin id-ul plat `job_op_ptr[job] + op_idx`.
     """
+    n_machines = instance.num_machines
+    job_op_ptr = instance.job_op_ptr_list
+    len_jobs = instance.job_num_ops_list
+    op_alternatives = instance.op_alternatives
+    etpc_out = instance.etpc_out
+    arrival_times = instance.job_arrival_list
 
-    etpc_map: Dict[Tuple[int, int], List[Tuple[int, int, float]]] = defaultdict(list)
-    min_start_due_to_etpc: Dict[Tuple[int, int], float] = defaultdict(float)
-
-    for constr in events.get('etpc_constraints', []):
-        try:
-            fj, fo = int(constr['fore_job']), int(constr['fore_op_idx'])
-            hj, ho = int(constr['hind_job']), int(constr['hind_op_idx'])
-            tl = float(constr['time_lapse']);
-            tl = max(0.0, tl)
-            etpc_map[(fj, fo)].append((hj, ho, tl))
-        except (KeyError, ValueError, TypeError) as e:
-            print(f"Warning: Skipping invalid ETPC constraint {constr}: {e}")
-
-    current_jobs_sim: List[List[List[Tuple[int, int]]]] = copy.deepcopy(initial_jobs_ops)
-    bds_events = events.get("breakdowns", {})
+    min_start_due_to_etpc: List[float] = [0.0] * instance.num_ops
+
+    bds_events = instance.breakdowns
     bds_per_machine: Dict[int, List[Tuple[float, float]]] = {
         m: sorted([(float(s), float(e)) for s, e in bds_events.get(m, [])], key=lambda x: x[0])
         for m in range(n_machines)
     }
 
-    job_progress = [0] * len(current_jobs_sim)
-    job_current_machine = [None] * len(current_jobs_sim)
-
-    arrival_times: List[float] = []
-    all_props = events.get('all_jobs_properties', [])
+    # Joburile adăugate dinamic au index fix în instanță, dar intră în simulare doar la sosire
+    job_arrived = [j < instance.num_initial_jobs for j in range(instance.num_jobs)]
+    job_progress = [0] * instance.num_jobs
+    job_current_machine = [None] * instance.num_jobs
 
-    for i in range(len(current_jobs_sim)):
-        props_found = next((p for p in all_props if p.get('is_initial') and p.get('initial_job_idx') == i), None)
-        current_arrival_time = 0.0
-        if props_found:
-            current_arrival_time = float(props_found.get('parsed_arrival_time', 0.0))
-        arrival_times.append(current_arrival_time)
+    job_earliest_start: List[float] = list(arrival_times)
+    effective_op_ready_time: List[float | None] = [None] * instance.num_ops
+    op_end_time: List[float | None] = [None] * instance.num_ops  # finalul din `schedule`, per operație
 
-    job_earliest_start: List[float] = [arr_time for arr_time in arrival_times]
-    effective_op_ready_time: Dict[Tuple[int, int], float] = {}
-
-    for j_init_idx in range(len(current_jobs_sim)):
-        if current_jobs_sim[j_init_idx]:
-            etpc_min = min_start_due_to_etpc.get((j_init_idx, 0), 0.0)
+    for j_init_idx in range(instance.num_initial_jobs):
+        if len_jobs[j_init_idx]:
+            op_first = job_op_ptr[j_init_idx]
+            etpc_min = min_start_due_to_etpc[op_first]
             # Pentru joburile initiale, arrival_times[j_init_idx] este timpul de sosire (0.0 de obicei)
-            effective_op_ready_time[(j_init_idx, 0)] = max(arrival_times[j_init_idx], etpc_min)
+            effective_op_ready_time[op_first] = max(arrival_times[j_init_idx], etpc_min)
 
     active_ops: Dict[int, Tuple[int, int, float, float] | None] = {m: None for m in range(n_machines)}
     schedule: List[Tuple[int, int, int, float, float]] = []
     t: float = 0.0
 
-    dynamic_event_list = []
-    for t_add, new_job_ops in events.get("added_jobs", []):
-        dynamic_event_list.append({'time': float(t_add), 'type': 'add', 'data': new_job_ops})
-    for t_c, j_c_idx in events.get("cancelled_jobs", []):
-        dynamic_event_list.append({'time': float(t_c), 'type': 'cancel', 'data': j_c_idx})
-    dynamic_event_list.sort(key=lambda ev: ev['time'])
+    # Defectele sunt tratate separat (intervale); aici păstrăm doar sosirile și anulările, deja sortate
+    dynamic_event_list = [row for row in instance.event_rows if row[1] != EVENT_BREAKDOWN]
     current_dynamic_event_idx = 0
 
     while t < max_simulation_time:
         num_active_uncompleted_jobs = 0
-        for j_idx_loop in range(len(current_jobs_sim)):
-            if j_idx_loop < len(job_progress) and job_progress[j_idx_loop] < len(current_jobs_sim[j_idx_loop]):
+        for j_idx_loop in range(instance.num_jobs):
+            if job_arrived[j_idx_loop] and job_progress[j_idx_loop] < len_jobs[j_idx_loop]:
                 num_active_uncompleted_jobs += 1
         if num_active_uncompleted_jobs == 0 and current_dynamic_event_idx >= len(dynamic_event_list):
             break
 
         while current_dynamic_event_idx < len(dynamic_event_list) and \
-                dynamic_event_list[current_dynamic_event_idx]['time'] <= t + 1e-9:
-            event = dynamic_event_list[current_dynamic_event_idx]
-            if abs(event['time'] - t) > 1e-9 and event['time'] < t:
+                dynamic_event_list[current_dynamic_event_idx][0] <= t + 1e-9:
+            ev_time, ev_type, ev_arg0, _ev_arg1 = dynamic_event_list[current_dynamic_event_idx]
+            if abs(ev_time - t) > 1e-9 and ev_time < t:
                 current_dynamic_event_idx += 1;
                 continue
             current_dynamic_event_idx += 1
-            if event['type'] == 'add':
-                new_job_ops_data = copy.deepcopy(event['data'])
-                new_j_id = len(current_jobs_sim)
-                current_jobs_sim.append(new_job_ops_data)
-                job_progress.append(0)
-                job_current_machine.append(None)
-                arrival_time_new_job = event['time']
-                arrival_times.append(arrival_time_new_job)  # Adaugam la lista de arrival_times
-                job_earliest_start.append(arrival_time_new_job)
-                if new_job_ops_data:  # Daca jobul adaugat are operatii
-                    etpc_min_new = min_start_due_to_etpc.get((new_j_id, 0), 0.0)
-                    effective_op_ready_time[(new_j_id, 0)] = max(arrival_time_new_job, etpc_min_new)
-            elif event['type'] == 'cancel':
-                j_c = event['data']
-                if j_c < len(job_progress) and job_progress[j_c] < len(current_jobs_sim[j_c]):
+            if ev_type == EVENT_ADDED_JOB:
+                new_j_id = ev_arg0
+                job_arrived[new_j_id] = True
+                arrival_time_new_job = ev_time
+                job_earliest_start[new_j_id] = arrival_time_new_job
+                if len_jobs[new_j_id]:  # Daca jobul adaugat are operatii
+                    op_first_new = job_op_ptr[new_j_id]
+                    etpc_min_new = min_start_due_to_etpc[op_first_new]
+                    effective_op_ready_time[op_first_new] = max(arrival_time_new_job, etpc_min_new)
+            elif ev_type == EVENT_CANCEL_JOB:
+                j_c = ev_arg0
+                if 0 <= j_c < instance.num_jobs and job_arrived[j_c] and job_progress[j_c] < len_jobs[j_c]:
                     print(f"Time {t:.2f}: Job {j_c} cancelled.")
-                    job_progress[j_c] = len(current_jobs_sim[j_c])
+                    job_progress[j_c] = len_jobs[j_c]
                     if job_current_machine[j_c] is not None:
                         active_ops[job_current_machine[j_c]] = None
                         job_current_machine[j_c] = None
@@ -330,8 +303,9 @@ def schedule_dynamic_no_parallel(
                 active_ops[m_bd_check] = None
                 job_current_machine[j_b] = None
                 job_earliest_start[j_b] = t
-                etpc_min_interrupted = min_start_due_to_etpc.get((j_b, op_b), 0.0)
-                effective_op_ready_time[(j_b, op_b)] = max(t, etpc_min_interrupted)
+                op_b_flat = job_op_ptr[j_b] + op_b
+                etpc_min_interrupted = min_start_due_to_etpc[op_b_flat]
+                effective_op_ready_time[op_b_flat] = max(t, etpc_min_interrupted)
 
         for m_adv in range(n_machines):
             if active_ops[m_adv] is not None and not any(
@@ -343,37 +317,31 @@ def schedule_dynamic_no_parallel(
                     job_progress[jop_adv] += 1
                     job_earliest_start[jop_adv] = finish_time
                     schedule.append((jop_adv, opidx_adv, m_adv, st_adv, finish_time))
+                    op_end_time[job_op_ptr[jop_adv] + opidx_adv] = finish_time
                     active_ops[m_adv] = None
                     job_current_machine[jop_adv] = None
 
-                    if (jop_adv, opidx_adv) in etpc_map:
-                        for j_h, o_h, lapse in etpc_map[(jop_adv, opidx_adv)]:
-                            new_min_start_for_hind = finish_time + lapse
-                            current_min_etpc = min_start_due_to_etpc.get((j_h, o_h), 0.0)
-                            min_start_due_to_etpc[(j_h, o_h)] = max(current_min_etpc, new_min_start_for_hind)
-
-                            # Actualizam effective_op_ready_time pentru operatia hind afectata
-                            # Daca operatia hind exista (jobul j_h a fost adaugat si op o_h e valida)
-                            if j_h < len(job_earliest_start) and \
-                                    ((o_h == 0) or \
-                                     (o_h > 0 and (
-                                     j_h, o_h - 1) in effective_op_ready_time)):  # Verificam daca pred din job e ready
-
-                                base_ready_for_hind = job_earliest_start[j_h] if o_h == 0 else float('-inf')
-                                if o_h > 0:
-                                    # Cautam timpul de final al operatiei (j_h, o_h-1) daca a fost programata
-                                    found_pred_in_schedule = False
-                                    for sj, so, _, _, se_sched in schedule:
-                                        if sj == j_h and so == o_h - 1:
-                                            base_ready_for_hind = se_sched
-                                            found_pred_in_schedule = True
-                                            break
-                                    # Daca predecesorul nu s-a terminat inca, nu putem seta effective_ready_time final
-                                    # Se va calcula cand devine candidat
-                                    if not found_pred_in_schedule: continue
-
-                                effective_op_ready_time[(j_h, o_h)] = max(base_ready_for_hind,
-                                                                          min_start_due_to_etpc.get((j_h, o_h), 0.0))
+                    for op_h, lapse in etpc_out[job_op_ptr[jop_adv] + opidx_adv]:
+                        j_h = instance.op_job_list[op_h]
+                        o_h = instance.op_index_list[op_h]
+                        new_min_start_for_hind = finish_time + lapse
+                        min_start_due_to_etpc[op_h] = max(min_start_due_to_etpc[op_h], new_min_start_for_hind)
+
+                        # Actualizam effective_op_ready_time pentru operatia hind afectata
+                        # Daca operatia hind exista (jobul j_h a sosit si op o_h e valida)
+                        if job_arrived[j_h] and \
+                                ((o_h == 0) or \
+                                 (o_h > 0 and effective_op_ready_time[op_h - 1] is not None)):  # Verificam daca pred din job e ready
+
+                            base_ready_for_hind = job_earliest_start[j_h] if o_h == 0 else float('-inf')
+                            if o_h > 0:
+                                # Timpul de final al operatiei (j_h, o_h-1), daca a fost programata
+                                base_ready_for_hind = op_end_time[op_h - 1]
+                                # Daca predecesorul nu s-a terminat inca, nu putem seta effective_ready_time final
+                                # Se va calcula cand devine candidat
+                                if base_ready_for_hind is None: continue
+
+                            effective_op_ready_time[op_h] = max(base_ready_for_hind, min_start_due_to_etpc[op_h])
                 else:
                     active_ops[m_adv] = (jop_adv, opidx_adv, st_adv, rem_adv)
 
@@ -385,33 +353,31 @@ def schedule_dynamic_no_parallel(
                     s_bd <= t < e_bd for s_bd, e_bd in bds_per_machine.get(m_dispatch, [])):
                 best_candidate_dispatch: Tuple[float, int, int, float] | None = None
 
-                for j_cand in range(len(current_jobs_sim)):
-                    if not (j_cand < len(job_progress) and job_progress[j_cand] < len(current_jobs_sim[j_cand])):
+                for j_cand in range(instance.num_jobs):
+                    if not (job_arrived[j_cand] and job_progress[j_cand] < len_jobs[j_cand]):
                         continue
                     if job_current_machine[j_cand] is not None:
                         continue
 
                     opidx_cand = job_progress[j_cand]
+                    op_cand = job_op_ptr[j_cand] + opidx_cand
 
                     # Asiguram ca effective_op_ready_time este calculat/actualizat pentru candidati
-                    base_time_cand = job_earliest_start[j_cand] if j_cand < len(job_earliest_start) else t
-                    etpc_min_cand = min_start_due_to_etpc.get((j_cand, opidx_cand), 0.0)
+                    base_time_cand = job_earliest_start[j_cand]
+                    etpc_min_cand = min_start_due_to_etpc[op_cand]
                     current_effective_op_earliest_start = max(base_time_cand, etpc_min_cand)
-                    effective_op_ready_time[(j_cand, opidx_cand)] = current_effective_op_earliest_start
+                    effective_op_ready_time[op_cand] = current_effective_op_earliest_start
 
                     if t < current_effective_op_earliest_start - 1e-9:
                         continue
 
-                    for m_alt, pt_alt_float in current_jobs_sim[j_cand][opidx_cand]:
+                    for m_alt, pt_alt in op_alternatives[op_cand]:
                         if m_alt == m_dispatch:
-                            pt_alt = float(pt_alt_float)
                             if pt_alt < 1e-9: continue
 
-                            current_arrival_time_cand = arrival_times[j_cand] if j_cand < len(arrival_times) else 0.0
-
                             # Apelam compute_priority fara due_dates
                             pr = compute_priority(rule, j_cand, opidx_cand, m_dispatch, pt_alt, t,
-                                                  jobs=current_jobs_sim, job_progress=job_progress,
+                                                  instance=instance, job_progress=job_progress,
                                                   arrival_times=arrival_times,  # due_dates a fost scos
                                                   machine_loads=machine_loads)
 
@@ -428,8 +394,7 @@ def schedule_dynamic_no_parallel(
 
     makespan = max(op_tuple[TUPLE_FIELDS["end"]] for op_tuple in schedule) if schedule else t
     if t >= max_simulation_time - 1e-9 and any(
-            job_progress[j] < len(current_jobs_sim[j]) for j in range(len(current_jobs_sim)) if
-            j < len(job_progress)):  # Verificam si len(job_progress)
+            job_progress[j] < len_jobs[j] for j in range(instance.num_jobs) if job_arrived[j]):
         makespan = max(makespan, max_simulation_time)
 
     return makespan, schedule
@@ -477,6 +442,8 @@ if __name__ == "__main__":
     wait_store  = {r: [] for r in RULES}   #  NEW
 
     RESULTS_FILE = "rezultate/classic.txt"
+    RESULT_STORE = "rezultate/results.sqlite"  # None = fără refolosirea rezultatelor
+    results_db = ResultStore(RESULT_STORE) if RESULT_STORE else None
     with open(RESULTS_FILE, "w") as fout:
         for fname in os.listdir(INPUT_DIR):
             fpath = os.path.join(INPUT_DIR, fname)
@@ -487,22 +454,26 @@ if __name__ == "__main__":
             fout.write(f"\n=== Instanța: {fname} (jobs={n_jobs}, machines={n_mach}) ===\n")
             print(f"\n=== Instanța: {fname} ===")
 
+            instance = compile_instance(jobs, n_mach, events, name=fname)
+
             for rule in RULES:
-                jb_copy = copy.deepcopy(jobs)
-                ev_copy = {
-                    "breakdowns": {m: list(bds) for m, bds in events["breakdowns"].items()},
-                    "added_jobs":     list(events["added_jobs"]),
-                    "cancelled_jobs": list(events["cancelled_jobs"]),
-                }
-
-                t0 = time.perf_counter()
-                ms, sched = schedule_dynamic_no_parallel(jb_copy, n_mach, ev_copy, rule)
-                elapsed = time.perf_counter() - t0
-
-                # --- METRICE SUPLIMENTARE ---------------------------------
-                _idle_total, idle_avg = calc_machine_idle_time(sched)
-                _wait_total, wait_avg = calc_job_waiting_time(sched)
-                # -----------------------------------------------------------
+                # "Random" nu e determinist, deci nu este refolosit
+                use_store = results_db is not None and rule != "Random"
+                cached = results_db.get(rule_hash(rule), instance.content_hash, ENGINE_VERSION) if use_store else None
+                if cached is not None:
+                    ms, idle_avg, wait_avg, elapsed = cached
+                    sched = None
+                else:
+                    t0 = time.perf_counter()
+                    ms, sched = schedule_dynamic_no_parallel(instance, rule)
+                    elapsed = time.perf_counter() - t0
+
+                    # --- METRICE SUPLIMENTARE ---------------------------------
+                    _idle_total, idle_avg = calc_machine_idle_time(sched)
+                    _wait_total, wait_avg = calc_job_waiting_time(sched)
+                    # -----------------------------------------------------------
+                    if use_store:
+                        results_db.put(rule_hash(rule), instance, ENGINE_VERSION, ms, idle_avg, wait_avg, elapsed, rule=rule)
 
                 metric_append(ms_store,   rule, ms)
                 metric_append(time_store, rule, elapsed)
@@ -512,11 +483,12 @@ if __name__ == "__main__":
                 fout.write(f"{rule} => MS={ms}, Idle_avg={idle_avg:.2f}, Wait_avg={wait_avg:.2f}, T={elapsed:.3f}s\n")
                 print(      f"{rule} => MS={ms}, Idle_avg={idle_avg:.2f}, Wait_avg={wait_avg:.2f}, T={elapsed:.3f}s")
 
-                plot_gantt(ms,
-                    sched, n_mach, ev_copy["breakdowns"],
-                    title=f"{fname} - {rule} (MS={ms})",
-                    save_path=os.path.join(OUTPUT_DIR, f"{fname}_{rule}.png".replace(".txt", ""))
-                )
+                if sched is not None:
+                    plot_gantt(ms,
+                        sched, n_mach, instance.breakdowns,
+                        title=f"{fname} - {rule} (MS={ms})",
+                        save_path=os.path.join(OUTPUT_DIR, f"{fname}_{rule}.png".replace(".txt", ""))
+                    )
 
         # --- MEDII PE REGULĂ ---------------------------------------------
         fout.write("\n=== Average per rule ===\n")
@@ -529,5 +501,7 @@ if __name__ == "__main__":
             fout.write(f"{r}: MS={avg_ms[r]:.2f}, Idle={avg_idle[r]:.2f}, Wait={avg_wait[r]:.2f}, T={avg_time[r]:.3f}s\n")
             print(      f"{r}: MS={avg_ms[r]:.2f}, Idle={avg_idle[r]:.2f}, Wait={avg_wait[r]:.2f}, T={avg_time[r]:.3f}s")
 
+    if results_db:
+        results_db.close()
     print(f"\nRezultatele au fost scrise în {RESULTS_FILE}")
     print(f"Graficele Gantt se află în directorul '{OUTPUT_DIR}'")
\ No newline at end of file
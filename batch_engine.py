@@ -0,0 +1,585 @@
+import math
+
+import numpy as np
+
+from data_reader import EVENT_BREAKDOWN, EVENT_ADDED_JOB, EVENT_CANCEL_JOB
+from scheduler import evaluate_individual, penalized_makespan
+
+MAX_TIME_LIMIT = 200000.0  # aceeași limită de siguranță ca în scheduler.Simulator
+
+# Starea operației curente a unui job într-o bandă (un job are cel mult o operație gata sau în lucru)
+JOB_IDLE, JOB_READY, JOB_RUNNING = 0, 1, 2
+
+
+def has_integral_times(instance):
+    """
+    True dacă toți timpii instanței (procesare, evenimente, sfârșit de defect, ETPC) sunt
+    întregi. Pe astfel de instanțe un pas de simulare fără schimbări este neutru, deci
+    benzile pot fi avansate împreună; altfel folosim simulatorul scalar.
+    """
+    return all(bool(np.all(arr == np.floor(arr)))
+               for arr in (instance.alt_ptime, instance.ev_time, instance.ev_arg1, instance.etpc_lapse))
+
+
+def evaluate_individuals_batch(individuals, instance, toolbox, max_time=999999.0, max_lanes=64, schedules=None,
+                               horizon=math.inf):
+    """
+    Simulează mai mulți indivizi pe aceeași instanță în pas sincron și întoarce lista
+    makespan-urilor, identice cu `scheduler.evaluate_individual` pentru fiecare individ.
+    Indivizii sunt împărțiți în loturi de cel mult `max_lanes` benzi.
+    Cu `schedules` (listă), se adaugă și planificarea fiecărui individ, în ordine.
+    Benzile care depășesc `horizon` se opresc cu makespan-ul penalizat, ca în `scheduler.Simulator`.
+
+    Regulile care folosesc terminalul NQ (lungimea cozii, care scade cu alocările din
+    același pas) sunt simulate cu `scheduler.evaluate_individual`.
+    """
+    individuals = list(individuals)
+    extended = getattr(toolbox, "extended_terminals", False)
+    if has_integral_times(instance):
+        lane_idx = [i for i, ind in enumerate(individuals) if not (extended and "NQ" in str(ind))]
+    else:
+        lane_idx = []
+    makespans = [None] * len(individuals)
+    scheds = [None] * len(individuals)
+    in_lanes = set(lane_idx)
+    for i, ind in enumerate(individuals):
+        if i not in in_lanes:
+            makespans[i], scheds[i] = evaluate_individual(ind, instance, toolbox, max_time=max_time,
+                                                          record_schedule=schedules is not None, horizon=horizon)
+
+    toolbox.np_rule_cache.compile_many([individuals[i] for i in lane_idx])
+    for start in range(0, len(lane_idx), max_lanes):
+        batch = lane_idx[start:start + max_lanes]
+        lane_inds = [individuals[i] for i in batch]
+        lane_scheds = [] if schedules is not None else None
+        lane_makespans = _simulate_lanes([toolbox.np_rule_cache.get(ind) for ind in lane_inds],
+                                         ["WIP" in str(ind) for ind in lane_inds],
+                                         instance, max_time, lane_scheds, extended, horizon)
+        for k, i in enumerate(batch):
+            makespans[i] = lane_makespans[k]
+            if lane_scheds is not None:
+                scheds[i] = lane_scheds[k]
+    if schedules is not None:
+        schedules.extend(scheds)
+    return makespans
+
+
+def evaluate_replications(individual, instances, toolbox, max_time=999999.0, max_lanes=1024, min_lanes=32,
+                          horizon=math.inf):
+    """
+    Simulează un individ pe replicările `instances` ale aceleiași instanțe de bază (scenarii
+    din `CompiledInstance.with_events`, ex. `scenario.realize_scenario`) în pas sincron, o
+    bandă per replicare, și întoarce lista makespan-urilor, identice cu
+    `scheduler.evaluate_individual` pe fiecare replicare. Tablourile operațiilor sunt
+    comune benzilor; regula este apelată o singură dată per pas, pe rândurile tuturor benzilor.
+
+    Costul unui pas al benzilor este dominat de apelurile NumPy, deci sub `min_lanes` replicări
+    (ca și pentru replicările care nu împart tablourile operațiilor, cu timpi neîntregi sau
+    regulile cu NQ) fiecare replicare este simulată cu `scheduler.evaluate_individual`.
+    """
+    instances = list(instances)
+    if not instances:
+        return []
+    base = instances[0]
+    extended = getattr(toolbox, "extended_terminals", False)
+    if len(instances) < min_lanes or (extended and "NQ" in str(individual)) \
+            or any(inst.alt_ptime is not base.alt_ptime for inst in instances) \
+            or not all(has_integral_times(inst) for inst in instances):
+        return [evaluate_individual(individual, inst, toolbox, max_time=max_time, record_schedule=False,
+                                    horizon=horizon)[0] for inst in instances]
+
+    toolbox.np_rule_cache.compile_many([individual])
+    rule = toolbox.np_rule_cache.get(individual)
+    uses_wip = "WIP" in str(individual)
+    makespans = []
+    for start in range(0, len(instances), max_lanes):
+        lane_insts = instances[start:start + max_lanes]
+        makespans += _simulate_lanes([rule] * len(lane_insts), [uses_wip] * len(lane_insts), base, max_time,
+                                     None, extended, horizon, lane_instances=lane_insts)
+    return makespans
+
+
+def replication_stats(makespans):
+    """
+    Statisticile makespan-urilor unor replicări: media, abaterea standard (de selecție),
+    minimul, mediana, percentila 95, maximul și semi-lățimea intervalului de încredere 95% al mediei (aproximarea normală).
+    """
+    ms = np.asarray(makespans, dtype=np.float64)
+    n = ms.size
+    if n == 0:
+        return {"n": 0}
+    std = float(ms.std(ddof=1)) if n > 1 else 0.0
+    return {"n": n, "mean": float(ms.mean()), "std": std, "min": float(ms.min()),
+            "median": float(np.median(ms)), "p95": float(np.percentile(ms, 95)), "max": float(ms.max()),
+            "ci95": 1.96 * std / math.sqrt(n)}
+
+
+def _simulate_lanes(rules, uses_wip, instance, max_time, schedules, extended=False, horizon=math.inf,
+                    lane_instances=None):
+    """
+    O bandă per regulă; starea fiecărei benzi stă pe un rând al matricelor
+    (benzi × mașini, benzi × joburi). Pașii (A)-(E) sunt cei din
+    `scheduler.evaluate_individual`, aplicați cu măști tuturor benzilor. Fiecare bandă are
+    propriul ceas: la fiecare iterație, fiecare bandă avansează la următorul ei moment
+    relevant (evenimente, final de operație sau de defect, reîncercare), deci benzile nu
+    se așteaptă una pe alta și numărul de iterații este cel al celei mai lungi benzi.
+    Pe instanțe cu timpi întregi, vizitarea unui moment fără schimbări nu modifică planificarea.
+    Cu `extended`, regulile primesc și NQ, NPT, JW, SL (NQ nu este folosit de regulile din benzi).
+
+    Cu `lane_instances` (o instanță per bandă, cu tablourile operațiilor lui `instance`, vezi
+    `CompiledInstance.with_events`), fiecare bandă are propriile evenimente și termene; altfel
+    toate benzile împart evenimentele lui `instance`.
+    """
+    P = len(rules)
+    M = instance.num_machines
+    J = instance.num_jobs
+    uses_wip = np.asarray(uses_wip, dtype=bool)
+
+    ptime = instance.ptime
+    compat = ptime > 1e-9
+    op_job = instance.op_job
+    op_index = instance.op_index
+    job_op_ptr = instance.job_op_ptr
+    job_num_ops = instance.job_num_ops
+    op_ro = instance.op_ro
+    op_rpt = instance.op_rpt
+    succ_ptr, succ_op, succ_lapse = instance.etpc_ptr, instance.etpc_succ, instance.etpc_lapse
+
+    # --- Evenimentele benzilor: [benzi × evenimente], completate cu timpul inf ---
+    if lane_instances is None:
+        ev_count = np.full(P, instance.num_events, dtype=np.int64)
+        ev_time, ev_type, ev_arg0, ev_arg1 = (np.broadcast_to(np.append(arr, fill), (P, instance.num_events + 1))
+                                              for arr, fill in ((instance.ev_time, np.inf), (instance.ev_type, -1),
+                                                                (instance.ev_arg0, 0), (instance.ev_arg1, 0.0)))
+        lane_slack = None
+    else:
+        ev_count = np.asarray([inst.num_events for inst in lane_instances], dtype=np.int64)
+        width = int(ev_count.max()) + 1
+        ev_time = np.full((P, width), np.inf)
+        ev_type = np.full((P, width), -1, dtype=np.int8)
+        ev_arg0 = np.zeros((P, width), dtype=np.int64)
+        ev_arg1 = np.zeros((P, width))
+        for p, inst in enumerate(lane_instances):
+            n = inst.num_events
+            ev_time[p, :n], ev_type[p, :n], ev_arg0[p, :n], ev_arg1[p, :n] = (inst.ev_time, inst.ev_type,
+                                                                              inst.ev_arg0, inst.ev_arg1)
+        lane_slack = np.stack([inst.op_slack for inst in lane_instances]) if extended else None
+    ev_ptr = np.zeros(P, dtype=np.int64)  # următorul eveniment neprocesat al fiecărei benzi
+    shared_rule = rules[0] if P and all(rule is rules[0] for rule in rules) else None
+
+    # --- Starea benzilor ---
+    busy = np.zeros((P, M), dtype=bool)
+    m_op = np.full((P, M), -1, dtype=np.int64)
+    start_time = np.zeros((P, M))
+    end_time = np.zeros((P, M))
+    broken_until = np.zeros((P, M))
+    idle_since = np.zeros((P, M))
+
+    job_state = np.zeros((P, J), dtype=np.int8)
+    job_op = np.zeros((P, J), dtype=np.int64)  # operația curentă (id plat), gata sau în lucru
+    job_pred = np.zeros((P, J))                 # finalul predecesorului operației curente
+    job_eff = np.full((P, J), np.inf)           # effective_ready_time al operației gata (inf: nicio operație gata)
+    etpc_min = np.zeros((P, instance.num_ops)) if succ_op.size else None
+
+    job_end = np.zeros((P, J))
+    done_count = np.zeros((P, J), dtype=np.int64)
+    completed = np.zeros(P, dtype=np.int64)
+    open_jobs = np.zeros(P, dtype=np.int64)  # joburi sosite, neanulate, cu ultima operație neterminată
+    arrived_jobs = np.full(P, instance.num_initial_jobs, dtype=np.int64)
+    total_ops = np.full(P, int(job_num_ops[:instance.num_initial_jobs].sum()), dtype=np.int64)
+    cancelled = np.zeros((P, J), dtype=bool)
+
+    retry = np.zeros(P, dtype=bool)
+    own_next = np.zeros(P)  # următorul moment relevant al benzii, fără evenimentele externe
+    lane_t = np.zeros(P)    # momentul curent al fiecărei benzi
+    finished = np.zeros(P, dtype=bool)
+    capped = np.zeros(P, dtype=bool)  # benzile oprite la `horizon`
+    final_time = np.zeros(P)
+    sched_parts = [] if schedules is not None else None
+
+    def make_ready(ls, ops, t):
+        js = op_job[ops]
+        job_state[ls, js] = JOB_READY
+        job_op[ls, js] = ops
+        job_pred[ls, js] = t
+        job_eff[ls, js] = t if etpc_min is None else np.maximum(t, etpc_min[ls, ops])
+
+    def release_machines(ls, ms, t):
+        busy[ls, ms] = False
+        m_op[ls, ms] = -1
+        start_time[ls, ms] = 0.0
+        end_time[ls, ms] = 0.0
+        idle_since[ls, ms] = t
+
+    def finish(ls, t):
+        finished[ls] = True
+        own_next[ls] = math.inf
+        final_time[ls] = t
+
+    first_jobs = np.nonzero(job_num_ops[:instance.num_initial_jobs] > 0)[0]
+    job_state[:, first_jobs] = JOB_READY
+    job_op[:, first_jobs] = job_op_ptr[first_jobs]
+    job_pred[:, first_jobs] = 0.0
+    job_eff[:, first_jobs] = 0.0
+    open_jobs[:] = first_jobs.size
+
+    job_lo = 0  # joburile < job_lo sunt terminate sau anulate în toate benzile active
+    act = np.arange(P)
+    while act.size:
+        T = np.minimum(own_next[act], ev_time[act, ev_ptr[act]])
+        lane_t[act] = T
+
+        # Oprirea benzilor ca în bucla scalară: `while current_time < max_time`, orizontul și limita de siguranță
+        stop = (T >= max_time) | (T > horizon) | (T > MAX_TIME_LIMIT)
+        if stop.any():
+            for p, t in zip(act[stop].tolist(), T[stop].tolist()):
+                if t > horizon and t < max_time:
+                    capped[p] = True
+                elif t > MAX_TIME_LIMIT and t < max_time:
+                    print(f"   Warning: Simulation time limit ({MAX_TIME_LIMIT:.2f}) reached. "
+                          f"Makespan: {t:.2f}. Aborting.")
+            finish(act[stop], T[stop])
+            act, T = act[~stop], T[~stop]
+            if not act.size:
+                break
+
+        # (A) Evenimentele externe, în ordine; o rundă procesează câte un eveniment pentru fiecare bandă
+        pending = act[ev_time[act, ev_ptr[act]] <= T + 1e-9]
+        while pending.size:
+            k = ev_ptr[pending]
+            ev_ptr[pending] += 1
+            kinds = ev_type[pending, k]
+            ls = pending[kinds == EVENT_BREAKDOWN]
+            if ls.size:
+                kk = k[kinds == EVENT_BREAKDOWN]
+                ms = ev_arg0[ls, kk]
+                broken_until[ls, ms] = np.maximum(broken_until[ls, ms], ev_arg1[ls, kk])
+                hit = busy[ls, ms] & (start_time[ls, ms] < broken_until[ls, ms])
+                if hit.any():
+                    ls, ms = ls[hit], ms[hit]
+                    make_ready(ls, m_op[ls, ms], lane_t[ls])
+                    release_machines(ls, ms, lane_t[ls])
+            ls = pending[kinds == EVENT_ADDED_JOB]
+            if ls.size:
+                js = ev_arg0[ls, k[kinds == EVENT_ADDED_JOB]]
+                arrived_jobs[ls] = np.maximum(arrived_jobs[ls], js + 1)
+                total_ops[ls] += job_num_ops[js]
+                has_ops = job_num_ops[js] > 0
+                ls, js = ls[has_ops], js[has_ops]
+                open_jobs[ls[~cancelled[ls, js]]] += 1
+                make_ready(ls, job_op_ptr[js], lane_t[ls])
+            ls = pending[kinds == EVENT_CANCEL_JOB]
+            if ls.size:
+                js = ev_arg0[ls, k[kinds == EVENT_CANCEL_JOB]]
+                fresh = ~cancelled[ls, js]
+                ls, js = ls[fresh], js[fresh]
+                if ls.size:
+                    cancelled[ls, js] = True
+                    rs, ms = np.nonzero(busy[ls] & (op_job[np.maximum(m_op[ls], 0)] == js[:, None]))
+                    release_machines(ls[rs], ms, lane_t[ls[rs]])
+                    job_state[ls, js] = JOB_IDLE
+                    job_eff[ls, js] = np.inf
+                    arrived = js < arrived_jobs[ls]
+                    ls, js = ls[arrived], js[arrived]
+                    n_ops = job_num_ops[js]
+                    open_jobs[ls[(n_ops > 0) & (done_count[ls, js] < n_ops)]] -= 1
+                    valid = js >= 0
+                    total_ops[ls[valid]] -= np.maximum(n_ops[valid] - done_count[ls[valid], js[valid]], 0)
+            pending = pending[ev_time[pending, ev_ptr[pending]] <= lane_t[pending] + 1e-9]
+
+        # (B) Final de defect și operații terminate
+        rows = slice(None) if act.size == P else act  # toate benzile active: vederi, fără copii
+        T_col = T[:, None]
+        a_broken = broken_until[rows]
+        a_busy = busy[rows]
+        broken_now = a_broken > T_col + 1e-9
+        repaired = ~broken_now & (np.abs(a_broken - T_col) < 1e-9) & (a_broken != 0)
+        if repaired.any():
+            ls, ms = np.nonzero(repaired)
+            broken_until[act[ls], ms] = 0.0
+            ls, ms = np.nonzero(repaired & ~a_busy)
+            idle_since[act[ls], ms] = T[ls]
+
+        ls, ms = np.nonzero(~broken_now & a_busy & (end_time[rows] - (T_col + 1.0) < 1e-9))
+        if ls.size:
+            ls = act[ls]
+            ops = m_op[ls, ms]
+            jobs = op_job[ops]
+            starts = start_time[ls, ms]
+            ends = end_time[ls, ms]
+            release_machines(ls, ms, ends)
+            np.add.at(completed, ls, 1)
+            job_end[ls, jobs] = ends
+            done_count[ls, jobs] += 1  # un job are cel mult o operație în lucru, deci perechile sunt unice
+            np.subtract.at(open_jobs, ls[(op_index[ops] + 1 == job_num_ops[jobs]) & ~cancelled[ls, jobs]], 1)
+            job_state[ls, jobs] = JOB_IDLE
+            if sched_parts is not None:
+                sched_parts.append((ls, jobs, op_index[ops], ms, starts, ends))
+
+            if etpc_min is not None:
+                n_succ = succ_ptr[ops + 1] - succ_ptr[ops]
+                if n_succ.any():
+                    rep = np.repeat(np.arange(ops.size), n_succ)
+                    pos = np.arange(rep.size) - np.repeat(np.cumsum(n_succ) - n_succ, n_succ) + succ_ptr[ops][rep]
+                    h_ls, h_ops = ls[rep], succ_op[pos]
+                    np.maximum.at(etpc_min, (h_ls, h_ops), ends[rep] + succ_lapse[pos])
+                    # Doar operația gata a jobului își mută effective_ready_time (celelalte îl calculează la make_ready)
+                    h_js = op_job[h_ops]
+                    cur = (job_state[h_ls, h_js] == JOB_READY) & (job_op[h_ls, h_js] == h_ops)
+                    h_ls, h_js, h_ops = h_ls[cur], h_js[cur], h_ops[cur]
+                    job_eff[h_ls, h_js] = np.maximum(job_pred[h_ls, h_js], etpc_min[h_ls, h_ops])
+
+            nxt = (op_index[ops] + 1 < job_num_ops[jobs]) & ~cancelled[ls, jobs]
+            if nxt.any():
+                make_ready(ls[nxt], ops[nxt] + 1, ends[nxt])
+
+        # (C) Alocări: mașinile în ordine, toate benzile active deodată
+        retry[act] = False
+        # Doar joburile sosite și neînchise pot avea o operație gata (job_eff finit)
+        while job_lo < J and (cancelled[rows, job_lo] | (done_count[rows, job_lo] >= job_num_ops[job_lo])).all():
+            job_lo += 1
+        window = slice(job_lo, max(job_lo, int(arrived_jobs[act].max())))
+        eligible = job_eff[rows, window] <= T_col + 1e-9
+        free = ~busy[rows] & (broken_until[rows] <= T_col + 1e-9)
+        deciding = eligible.any(axis=1) & free.any(axis=1)
+        if deciding.any():
+            _allocate(act[deciding], T[deciding], rules, uses_wip, eligible[deciding], free[deciding], compat,
+                      ptime, op_ro, op_rpt, busy, m_op, start_time, end_time, idle_since, job_state, job_op,
+                      job_eff, retry, instance if extended else None, instance.is_jsp, lane_slack, shared_rule,
+                      job_lo)
+
+        # (D) Terminare
+        a_eff = job_eff[rows, window]
+        all_done = (completed[act] >= total_ops[act]) & (open_jobs[act] == 0) & ~(a_eff < np.inf).any(axis=1)
+        if all_done.any():
+            finish(act[all_done], T[all_done])
+            act, T, a_eff = act[~all_done], T[~all_done], a_eff[~all_done]
+            rows = act
+
+        # (E) Următorul moment relevant al fiecărei benzi active
+        if act.size:
+            T_col = T[:, None]
+            a_end = end_time[rows] - 1.0
+            ends_next = np.where(busy[rows] & (a_end > T_col + 1e-9), a_end, np.inf).min(axis=1)
+            a_broken = broken_until[rows]
+            repairs = np.where(a_broken > T_col + 1e-9, a_broken, np.inf).min(axis=1)
+            deferred = np.where(a_eff > T_col + 1e-9, a_eff, np.inf).min(axis=1, initial=np.inf)
+            nxt_t = np.minimum(np.minimum(ends_next, repairs), deferred)
+            a_retry = retry[act]
+            nxt_t[a_retry] = np.minimum(nxt_t[a_retry], T[a_retry] + 1.0)
+            # Fără evenimente externe viitoare și fără treziri, simularea scalară ar sări peste limită
+            idle = np.isinf(nxt_t) & (ev_ptr[act] >= ev_count[act])
+            nxt_t[idle] = T[idle] + np.floor(MAX_TIME_LIMIT - T[idle]) + 1.0
+            own_next[act] = nxt_t
+
+    # --- Makespan, ca în simularea scalară ---
+    # Benzile oprite nu mai primesc evenimente, deci joburile sosite și anulate sunt cele de la oprire
+    jobs_ok = (np.arange(J)[None, :] < arrived_jobs[:, None]) & ~cancelled & (job_num_ops > 0)[None, :]
+    makespans = []
+    for p in range(P):
+        makespan = float(job_end[p, jobs_ok[p]].max()) if jobs_ok[p].any() else 0.0
+        if capped[p]:
+            makespan = penalized_makespan(makespan, horizon, int(completed[p]), int(total_ops[p]))
+        elif jobs_ok[p].any() and (completed[p] == 0 or makespan == 0.0):
+            if final_time[p] >= MAX_TIME_LIMIT - 1e-9:
+                makespan = float(MAX_TIME_LIMIT)
+            elif completed[p] == 0:
+                makespan = float(max_time)
+        makespans.append(makespan)
+
+    if schedules is not None:
+        lane_scheds = [[] for _ in range(P)]
+        for (ls, jobs, o_idx, ms, starts, ends) in sched_parts:
+            for row in zip(ls.tolist(), jobs.tolist(), o_idx.tolist(), ms.tolist(), starts.tolist(), ends.tolist()):
+                lane_scheds[row[0]].append(row[1:])
+        schedules.extend(lane_scheds)
+    return makespans
+
+
+def _allocate(dec_lanes, T, rules, uses_wip, eligible, free, compat, ptime, op_ro, op_rpt,
+              busy, m_op, start_time, end_time, idle_since, job_state, job_op, job_eff, retry, extended=None,
+              jsp=False, lane_slack=None, shared_rule=None, job_lo=0):
+    """
+    Pasul (C) pentru benzile `dec_lanes`, aflate la momentele `T` (câte unul per bandă). Fiecare regulă este apelată o singură dată, pe
+    vectorii tuturor perechilor (operație eligibilă, mașină liberă) ale benzii ei. WIP-ul
+    văzut de mașina m crește cu alocările făcute în același pas pe mașinile dinaintea ei,
+    deci pentru regulile care folosesc WIP rândurile sunt evaluate pentru fiecare valoare
+    posibilă a acestui decalaj; alocarea se face apoi mașină cu mașină, ca în bucla scalară.
+    `extended` (instanța, sau None) adaugă coloanele NQ, NPT, JW, SL; NQ este 0, fiindcă
+    regulile care îl folosesc nu ajung în benzi.
+    Cu `jsp` (fiecare operație are o singură mașină) cozile mașinilor sunt disjuncte, deci dacă
+    nicio bandă nu folosește WIP toate mașinile se decid deodată.
+    `lane_slack` [benzi × operații] înlocuiește `extended.op_slack` când termenele diferă între benzi;
+    `shared_rule` (aceeași regulă în toate benzile) este apelată o singură dată, pe toate rândurile.
+    Coloana k a lui `eligible` este jobul `job_lo + k`.
+    """
+    p_d, p_job = np.nonzero(eligible)  # perechi (bandă, job) eligibile, ordonate după bandă și job
+    p_job += job_lo
+    p_lane = dec_lanes[p_d]
+    p_op = job_op[p_lane, p_job]
+    cand = compat[p_op] & free[p_d]
+    pair, r_m = np.nonzero(cand)
+    lane_wip = uses_wip[dec_lanes]
+    if lane_wip.any():
+        has_cand = np.zeros(free.shape, dtype=bool)
+        has_cand[p_d[pair], r_m] = True
+        before = np.cumsum(has_cand, axis=1) - has_cand  # mașini cu candidați înaintea lui m
+        reps = np.where(lane_wip[p_d[pair]], before[p_d[pair], r_m] + 1, 1)
+        row = np.repeat(np.arange(pair.size), reps)
+        r_shift = np.arange(row.size) - np.repeat(np.cumsum(reps) - reps, reps)
+        pair, r_m = pair[row], r_m[row]
+    else:
+        r_shift = np.zeros(pair.size, dtype=np.int64)
+    d_idx, r_job, r_op = p_d[pair], p_job[pair], p_op[pair]
+    r_lane = dec_lanes[d_idx]
+
+    lane_t1 = T + 1.0
+    t1 = lane_t1[d_idx]
+    wait = t1 - job_eff[r_lane, r_job]
+    cols = (ptime[r_op, r_m], op_ro[r_op], t1 - idle_since[r_lane, r_m], np.where(wait > 0.0, wait, 0.0),
+            busy[dec_lanes].sum(axis=1)[d_idx] + r_shift.astype(np.float64), op_rpt[r_op])
+    if extended is not None:
+        slack = extended.op_slack[r_op] if lane_slack is None else lane_slack[r_lane, r_op]
+        cols += (np.zeros(r_op.size), extended.op_next_ptime[r_op], extended.job_weight[r_job], slack - t1)
+    priority = np.empty(d_idx.size)
+    bounds = np.searchsorted(d_idx, np.arange(dec_lanes.size + 1)).tolist()
+    with np.errstate(all="ignore"):
+        if shared_rule is not None:
+            try:
+                priority[:] = shared_rule(*cols)
+            except Exception:
+                priority[:] = np.inf
+        for d in range(dec_lanes.size if shared_rule is None else 0):
+            lo, hi = bounds[d], bounds[d + 1]
+            try:
+                priority[lo:hi] = rules[dec_lanes[d]](*(c[lo:hi] for c in cols))
+            except Exception:
+                priority[lo:hi] = np.inf
+    priority[~(priority < np.inf)] = np.inf  # NaN și +inf nu sunt alese niciodată
+
+    if jsp and not lane_wip.any():
+        # Un grup per (bandă, mașină); prioritatea minimă, la egalitate jobul cu index mic
+        key = d_idx * free.shape[1] + r_m
+        order = np.lexsort((r_job, priority, key))
+        first = np.ones(order.size, dtype=bool)
+        first[1:] = key[order][1:] != key[order][:-1]
+        best = order[first]
+        # Toate prioritățile inf/NaN pe o mașină: reîncercăm la pasul următor
+        retry[dec_lanes[d_idx[best[priority[best] == np.inf]]]] = True
+        chosen = best[priority[best] < np.inf]
+        ls, ms, js, ops = dec_lanes[d_idx[chosen]], r_m[chosen], r_job[chosen], r_op[chosen]
+        busy[ls, ms] = True
+        m_op[ls, ms] = ops
+        start_time[ls, ms] = t1[chosen]
+        end_time[ls, ms] = t1[chosen] + ptime[ops, ms]
+        job_state[ls, js] = JOB_RUNNING
+        job_eff[ls, js] = np.inf
+        return
+
+    if not lane_wip.any():
+        _allocate_rounds(dec_lanes, lane_t1, free.shape[1], d_idx, r_m, r_job, r_op, pair, p_d.size, priority,
+                         ptime, busy, m_op, start_time, end_time, job_state, job_eff, retry)
+        return
+
+    # Rândurile grupate pe mașini (stabil: în fiecare grup rămân ordonate după bandă și job)
+    by_m = np.argsort(r_m, kind="stable")
+    d_idx, pair, r_job, r_op, r_shift, priority = (d_idx[by_m], pair[by_m], r_job[by_m], r_op[by_m],
+                                                  r_shift[by_m], priority[by_m])
+    m_bounds = np.searchsorted(r_m[by_m], np.arange(free.shape[1] + 1)).tolist()
+    available = np.ones(p_d.size, dtype=bool)
+    shift = np.zeros(dec_lanes.size, dtype=np.int64)
+    for m in range(free.shape[1]):
+        lo, hi = m_bounds[m], m_bounds[m + 1]
+        if lo == hi:
+            continue
+        rows = lo + np.nonzero((r_shift[lo:hi] == shift[d_idx[lo:hi]]) & available[pair[lo:hi]])[0]
+        if not rows.size:
+            continue
+        queued = np.zeros(dec_lanes.size, dtype=bool)
+        queued[d_idx[rows]] = True
+        rows = rows[priority[rows] < np.inf]
+        # Prioritatea minimă; la egalitate, primul rând al benzii (jobul cu index mic)
+        rows = rows[np.lexsort((r_job[rows], priority[rows], d_idx[rows]))]
+        first = np.ones(rows.size, dtype=bool)
+        first[1:] = d_idx[rows][1:] != d_idx[rows][:-1]
+        chosen = rows[first]
+        ds, js, ops = d_idx[chosen], r_job[chosen], r_op[chosen]
+        ls = dec_lanes[ds]
+        busy[ls, m] = True
+        m_op[ls, m] = ops
+        start_time[ls, m] = lane_t1[ds]
+        end_time[ls, m] = lane_t1[ds] + ptime[ops, m]
+        job_state[ls, js] = JOB_RUNNING
+        job_eff[ls, js] = np.inf
+        available[pair[chosen]] = False
+        shift[ds[lane_wip[ds]]] += 1
+        # Toate prioritățile inf/NaN: reîncercăm la pasul următor
+        queued[ds] = False
+        retry[dec_lanes[queued]] = True
+
+
+def _allocate_rounds(dec_lanes, lane_t1, M, d_idx, r_m, r_job, r_op, pair, n_pairs, priority,
+                     ptime, busy, m_op, start_time, end_time, job_state, job_eff, retry):
+    """
+    Alocarea mașină cu mașină din `_allocate` când prioritățile nu depind de alocările din
+    același pas (fără WIP), în runde în loc de o iterație per mașină: în fiecare rundă, fiecare
+    grup (bandă, mașină) nedecis își propune cel mai bun job încă liber. Propunerile unei benzi
+    sunt definitive până la prima mașină care propune un job propus deja de o mașină
+    dinaintea ei: pentru mașinile de dinainte, cel mai bun job liber este și cel ales de bucla
+    secvențială. Restul grupurilor propun din nou în runda următoare.
+    """
+    if not d_idx.size:
+        return
+    key = d_idx * M + r_m
+    # Grupuri (bandă, mașină), apoi prioritatea; rândurile vin ordonate după bandă și job, iar
+    # sortarea este stabilă, deci la egalitate rămâne primul jobul cu index mic
+    order = np.lexsort((priority, key))
+    key_o, pair_o, prio_o = key[order], pair[order], priority[order]
+    new_group = np.empty(key_o.size, dtype=bool)
+    new_group[0] = True
+    np.not_equal(key_o[1:], key_o[:-1], out=new_group[1:])
+    g_start = np.flatnonzero(new_group)
+    g_end = np.append(g_start[1:], key_o.size)
+    g_lane = key_o[g_start] // M
+    best = g_start  # în prima rundă toate joburile sunt libere
+    has = np.ones(g_start.size, dtype=bool)
+    available = np.ones(n_pairs, dtype=bool)
+    owner = np.empty(n_pairs, dtype=np.int64)
+    while True:
+        picks = has & (prio_o[best] < np.inf)
+        # Prima propunere a fiecărei perechi (bandă, job) câștigă; grupurile sunt ordonate după
+        # bandă și mașină, iar la atribuiri repetate rămâne ultima, deci atribuim în ordine inversă
+        pk = np.flatnonzero(picks)
+        pk_pair = pair_o[best[pk]]
+        owner[pk_pair[::-1]] = pk[::-1]
+        conflict = pk[owner[pk_pair] != pk]
+        if conflict.size:
+            # Grupurile de la primul conflict al benzii lor încolo rămân pentru runda următoare
+            cut = np.full(dec_lanes.size, g_start.size)
+            cut[g_lane[conflict][::-1]] = conflict[::-1]
+            final = np.arange(g_start.size) < cut[g_lane]
+        else:
+            final = np.ones(g_start.size, dtype=bool)
+
+        rows = order[best[final & picks]]
+        ls, ms, js, ops, ds = dec_lanes[d_idx[rows]], r_m[rows], r_job[rows], r_op[rows], d_idx[rows]
+        busy[ls, ms] = True
+        m_op[ls, ms] = ops
+        start_time[ls, ms] = lane_t1[ds]
+        end_time[ls, ms] = lane_t1[ds] + ptime[ops, ms]
+        job_state[ls, js] = JOB_RUNNING
+        job_eff[ls, js] = np.inf
+        # Toate prioritățile inf/NaN: reîncercăm la pasul următor
+        retry[dec_lanes[g_lane[final & has & ~picks]]] = True
+        if not conflict.size:
+            return
+
+        available[pair[rows]] = False
+        keep = ~final
+        g_start, g_end, g_lane = g_start[keep], g_end[keep], g_lane[keep]
+        free_rows = np.flatnonzero(available[pair_o])
+        if not free_rows.size:
+            return
+        # Primul rând liber al fiecărui grup rămas, dacă există
+        best = free_rows[np.minimum(np.searchsorted(free_rows, g_start), free_rows.size - 1)]
+        has = (best >= g_start) & (best < g_end)
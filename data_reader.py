@@ -1,8 +1,21 @@
 import os
+import copy
 import json
+import hashlib
 import math # Needed for rounding arrival/start times if they are floats
 import pprint
 
+import numpy as np
+
+# Tipurile de evenimente din `CompiledInstance.ev_type`
+EVENT_BREAKDOWN = 0   # ev_arg0 = mașina, ev_arg1 = sfârșitul defectului
+EVENT_ADDED_JOB = 1   # ev_arg0 = indexul de simulare al jobului adăugat
+EVENT_CANCEL_JOB = 2  # ev_arg0 = indexul jobului anulat
+
+# Termenul folosit pentru joburile fără 'due_date' (limita de siguranță a simulatoarelor),
+# ca slack-ul (terminalul SL) să rămână finit
+NO_DUE_DATE = 200000.0
+
 # ... (read_dynamic_fjsp_instance_txt rămâne la fel) ...
 def read_dynamic_fjsp_instance_txt(file_path):
     """
@@ -307,13 +320,16 @@ def read_dynamic_fjsp_instance_json(file_path):
         # --- Inițializăm structurile de date returnate ---
         initial_jobs = [] # Va contine doar lista de operatii: List[List[List[Tuple[int, int]]]]
         job_properties = [] # MODIFICARE: Lista pentru proprietatile joburilor initiale
+        added_job_properties = [] # Proprietățile joburilor adăugate, în ordinea din 'added_jobs'
         dynamic_events = {
             "breakdowns": {},
             "added_jobs": [],
             "cancelled_jobs": [],
             # --- MODIFICARE: Adăugăm cheile noi aici ---
             "etpc_constraints": etpc_constraints, # Stocăm lista citită
-            "job_properties": job_properties # Vom popula această listă mai jos
+            "job_properties": job_properties, # Vom popula această listă mai jos
+            "added_job_properties": added_job_properties,
+            "params": data.get('params', {}) if isinstance(data.get('params', {}), dict) else {}
         }
         initial_job_index = 0
         initial_job_id_map = {}
@@ -379,11 +395,9 @@ def read_dynamic_fjsp_instance_json(file_path):
              if arrival_time > 0:
                  # Job adăugat dinamic - stocăm doar operațiile
                  dynamic_events['added_jobs'].append((arrival_time, current_job_ops))
-                 # Nota: 'weight' și 'due_date' pentru joburile adăugate dinamic nu sunt
-                 # stocate în această implementare pentru a păstra structura simplă
-                 # a 'added_jobs' ca List[Tuple[int, List[...]]].
-                 # Ar necesita o modificare a structurii interne a 'added_jobs' sau
-                 # un mecanism separat de stocare.
+                 # 'weight' și 'due_date' pentru joburile adăugate dinamic sunt stocate separat,
+                 # în 'added_job_properties' (aliniată cu 'added_jobs'), pentru a păstra structura
+                 # simplă a 'added_jobs' ca List[Tuple[int, List[...]]].
              else:
                  # Job inițial - stocăm operațiile în `initial_jobs`
                  initial_jobs.append(current_job_ops)
@@ -407,7 +421,10 @@ def read_dynamic_fjsp_instance_json(file_path):
                      'weight': weight,
                      'due_date': due_date
             }
-             job_properties.append(job_props) # Adaugam la lista
+             if arrival_time > 0:
+                 added_job_properties.append(job_props)
+             else:
+                 job_properties.append(job_props) # Adaugam la lista
 
                  # Mapăm ID-ul original la indexul intern (dacă ID-ul există)
              if original_id is not None:
@@ -455,7 +472,7 @@ def read_dynamic_fjsp_instance_json(file_path):
         # --- Procesăm alte evenimente dinamice ('added_jobs', 'cancelled_jobs' din cheia 'dynamic_events') ---
         # Logica existentă aici rămâne în mare parte neschimbată,
         # deoarece citește din data.get('dynamic_events', {}).
-        # Joburile adăugate aici *nu* vor avea 'weight'/'due_date' stocate (vezi nota de mai sus).
+        # Joburile adăugate aici primesc proprietățile implicite (weight 1, fără due_date).
         json_dynamic_events = data.get('dynamic_events', {})
         if isinstance(json_dynamic_events, dict):
             # ... (Parsarea cancelled_jobs din json_dynamic_events ramane la fel) ...
@@ -519,12 +536,17 @@ def read_dynamic_fjsp_instance_json(file_path):
                                 added_job_ops.append(alt_list)
                            # Adaugam la lista principala de added_jobs
                            dynamic_events['added_jobs'].append((arrival_time, added_job_ops))
+                           added_job_properties.append({'id': aj.get('id'), 'index': None,
+                                                        'weight': 1.0, 'due_date': float('inf')})
                       except (KeyError, ValueError, TypeError) as e:
                            print(f"   Warning: Skipping invalid dynamic added job entry {aj} at index {idx}: {e}")
 
 
         # --- Finalizăm și sortăm ---
-        dynamic_events['added_jobs'].sort(key=lambda x: x[0])
+        # Aceeași permutare (stabilă, după timpul de sosire) pentru joburile adăugate și proprietățile lor
+        added_order = sorted(range(len(dynamic_events['added_jobs'])), key=lambda i: dynamic_events['added_jobs'][i][0])
+        dynamic_events['added_jobs'] = [dynamic_events['added_jobs'][i] for i in added_order]
+        dynamic_events['added_job_properties'] = [added_job_properties[i] for i in added_order]
         dynamic_events['cancelled_jobs'].sort(key=lambda x: x[0])
         # Nota: job_properties este deja sortat implicit după indexul joburilor inițiale
 
@@ -544,12 +566,290 @@ def read_dynamic_fjsp_instance_json(file_path):
         return None, None, None, None
 
 
+# --- Reprezentare compilată (imuabilă) a unei instanțe ---
+def _frozen(arr):
+    arr.setflags(write=False)
+    return arr
+
+
+class CompiledInstance:
+    """
+    Instanță DFJSP compilată o singură dată per fișier și partajată (fără copiere)
+    de toate simulările. Joburile adăugate dinamic sunt incluse de la început,
+    cu indexul de simulare pe care îl primesc la sosire (după joburile inițiale,
+    în ordinea timpului de sosire).
+
+    Operațiile au un id plat `op = job_op_ptr[j] + o`. Tablourile NumPy sunt
+    read-only; pentru bucla interpretată a simulatoarelor există și vederi
+    echivalente sub formă de tuple (`op_alternatives`, `op_rpt_list`, ...),
+    construite tot o singură dată.
+
+    - `job_op_ptr` [num_jobs+1]: CSR job -> operații; `job_num_ops`, `job_arrival`.
+    - `op_job`, `op_index` [num_ops]: jobul și poziția operației în job.
+    - `op_alt_ptr` [num_ops+1], `alt_machine`, `alt_ptime`: CSR operație -> alternative.
+    - `ptime` [num_ops, num_machines]: timpul de procesare, 0.0 unde mașina nu e compatibilă.
+    - `is_jsp`: fiecare operație are cel mult o alternativă (job shop fără flexibilitate);
+      atunci `op_machine` [num_ops] este mașina operației (-1 dacă alternativa nu e validă),
+      iar simulatoarele folosesc calea specializată (o singură coadă per operație).
+    - `op_min_ptime`, `op_rpt` [num_ops]: timpul minim și suma sufix a timpilor minimi
+      (remaining processing time) de la operație până la finalul jobului.
+    - `op_ro` [num_ops]: operațiile rămase în job după operație (terminalul RO).
+    - `op_next_ptime` [num_ops]: timpul minim al operației următoare din job, 0 pentru ultima (NPT).
+    - `job_weight`, `job_due` [num_jobs]: 'weight' și 'due_date' din `job_properties`
+      (implicit 1 și `NO_DUE_DATE`); `op_slack` [num_ops] = due_date - RPT, deci terminalul
+      SL în momentul t este `op_slack[op] - t`.
+    - `ev_time`, `ev_type`, `ev_arg0`, `ev_arg1` [num_events]: evenimentele dinamice
+      sortate stabil după timp (defecte, apoi sosiri, apoi anulări la timpi egali).
+    - `etpc_ptr` [num_ops+1], `etpc_succ`, `etpc_lapse`: CSR operație fore -> (operație hind,
+      time_lapse) al constrângerilor ETPC; `etpc_out[op]` este vederea tuple
+      ((op_hind, time_lapse), ...), deci actualizarea la finalul unei operații costă O(grad ieșire).
+    - `etpc_successors`: {op_fore: ((op_hind, time_lapse), ...)}, doar pentru operațiile cu succesori.
+    - `params`: parametrii generatorului din fișierele .json (`mean_time_to_failure`,
+      `mean_repair_time`, `machine_util`, ...), {} dacă lipsesc; folosiți de `scenario`.
+    - `content_hash`: SHA-1 al conținutului simulat (nu depinde de numele fișierului),
+      folosit drept cheie în `result_store`.
+
+    `with_events()` dă o copie cu alte evenimente dinamice, cu tablourile operațiilor partajate.
+    """
+
+    def __init__(self, name, num_machines, jobs, events, job_ops_lists, job_arrival,
+                 event_rows, etpc_successors, job_weight=None, job_due=None):
+        self.name = name
+        self.num_machines = int(num_machines)
+        self.jobs = jobs          # datele parsate originale (doar pentru citire, ex. Gantt)
+        self.events = events
+        self.breakdowns = events.get("breakdowns", {})
+        self.params = events.get("params", {}) or {}
+        self.num_initial_jobs = len(jobs)
+        self.num_jobs = len(job_ops_lists)
+
+        job_num_ops = [len(ops) for ops in job_ops_lists]
+        job_op_ptr = [0]
+        for n_ops in job_num_ops:
+            job_op_ptr.append(job_op_ptr[-1] + n_ops)
+        self.num_ops = job_op_ptr[-1]
+
+        op_job, op_index, op_alt_ptr, alt_machine, alt_ptime = [], [], [0], [], []
+        op_alternatives = []
+        for j, ops in enumerate(job_ops_lists):
+            for o, alternatives in enumerate(ops):
+                op_job.append(j)
+                op_index.append(o)
+                alts = tuple((int(m), float(p)) for (m, p) in alternatives)
+                op_alternatives.append(alts)
+                for (m, p) in alts:
+                    alt_machine.append(m)
+                    alt_ptime.append(p)
+                op_alt_ptr.append(len(alt_machine))
+
+        self.job_op_ptr = _frozen(np.asarray(job_op_ptr, dtype=np.int64))
+        self.job_num_ops = _frozen(np.asarray(job_num_ops, dtype=np.int64))
+        self.job_arrival = _frozen(np.asarray(job_arrival, dtype=np.float64))
+        self.op_job = _frozen(np.asarray(op_job, dtype=np.int64))
+        self.op_index = _frozen(np.asarray(op_index, dtype=np.int64))
+        self.op_alt_ptr = _frozen(np.asarray(op_alt_ptr, dtype=np.int64))
+        self.alt_machine = _frozen(np.asarray(alt_machine, dtype=np.int64))
+        self.alt_ptime = _frozen(np.asarray(alt_ptime, dtype=np.float64))
+
+        ptime = np.zeros((self.num_ops, self.num_machines), dtype=np.float64)
+        alt_op = np.repeat(np.arange(self.num_ops), np.diff(self.op_alt_ptr))
+        # Prima alternativă pentru o mașină câștigă (ca în căutarea liniară din simulatoare)
+        for op, m, p in zip(alt_op[::-1], self.alt_machine[::-1], self.alt_ptime[::-1]):
+            ptime[op, m] = p
+        self.ptime = _frozen(ptime)
+
+        n_alts = np.diff(self.op_alt_ptr)
+        self.is_jsp = bool(np.all(n_alts <= 1))
+        op_machine = np.full(self.num_ops, -1, dtype=np.int64)
+        if self.is_jsp and self.num_ops:
+            single = n_alts == 1
+            m_single = self.alt_machine[self.op_alt_ptr[:-1][single]]
+            p_single = self.alt_ptime[self.op_alt_ptr[:-1][single]]
+            valid = (m_single >= 0) & (m_single < self.num_machines) & (p_single > 1e-9)
+            op_machine[np.nonzero(single)[0][valid]] = m_single[valid]
+        self.op_machine = _frozen(op_machine)
+
+        op_min_ptime = np.zeros(self.num_ops, dtype=np.float64)
+        has_alts = np.diff(self.op_alt_ptr) > 0
+        if has_alts.any():
+            op_min_ptime[has_alts] = np.minimum.reduceat(self.alt_ptime, self.op_alt_ptr[:-1][has_alts])
+        self.op_min_ptime = _frozen(op_min_ptime)
+        op_rpt = np.zeros(self.num_ops, dtype=np.float64)
+        for j in range(self.num_jobs):
+            first, last = job_op_ptr[j], job_op_ptr[j + 1]
+            if last > first:
+                op_rpt[first:last] = np.cumsum(op_min_ptime[first:last][::-1])[::-1]
+        self.op_rpt = _frozen(op_rpt)
+        self.op_ro = _frozen((self.job_num_ops[self.op_job] - self.op_index - 1).astype(np.float64))
+        op_next_ptime = np.zeros(self.num_ops, dtype=np.float64)
+        has_next = self.op_ro > 0
+        op_next_ptime[:-1][has_next[:-1]] = op_min_ptime[1:][has_next[:-1]]
+        self.op_next_ptime = _frozen(op_next_ptime)
+        self.job_weight = _frozen(np.asarray(job_weight if job_weight is not None else [1.0] * self.num_jobs,
+                                             dtype=np.float64))
+        self.job_due = _frozen(np.asarray(job_due if job_due is not None else [NO_DUE_DATE] * self.num_jobs,
+                                          dtype=np.float64))
+        self.op_slack = _frozen(self.job_due[self.op_job] - op_rpt)
+
+        self._set_events(event_rows)
+        self.etpc_successors = etpc_successors
+        etpc_counts = np.zeros(self.num_ops + 1, dtype=np.int64)
+        for op, succ in etpc_successors.items():
+            etpc_counts[op + 1] = len(succ)
+        self.etpc_ptr = _frozen(np.cumsum(etpc_counts))
+        self.etpc_out = tuple(etpc_successors.get(op, ()) for op in range(self.num_ops))
+        self.etpc_succ = _frozen(np.asarray([h for succ in self.etpc_out for (h, _lapse) in succ], dtype=np.int64))
+        self.etpc_lapse = _frozen(np.asarray([lapse for succ in self.etpc_out for (_h, lapse) in succ],
+                                             dtype=np.float64))
+
+        # Vederi Python (tuple) pentru bucla interpretată; construite o singură dată
+        self.job_op_ptr_list = tuple(job_op_ptr)
+        self.job_num_ops_list = tuple(job_num_ops)
+        self.job_arrival_list = tuple(float(a) for a in job_arrival)
+        self.op_job_list = tuple(op_job)
+        self.op_index_list = tuple(op_index)
+        self.op_alternatives = tuple(op_alternatives)
+        self.op_machine_list = tuple(self.op_machine.tolist())
+        self.op_min_ptime_list = tuple(self.op_min_ptime.tolist())
+        self.op_rpt_list = tuple(self.op_rpt.tolist())
+        self.op_ro_list = tuple(self.op_ro.tolist())
+        self.op_next_ptime_list = tuple(self.op_next_ptime.tolist())
+        self.job_weight_list = tuple(self.job_weight.tolist())
+        self.op_slack_list = tuple(self.op_slack.tolist())
+        self.content_hash = self._content_hash()
+
+    def _set_events(self, event_rows):
+        event_rows = sorted(event_rows, key=lambda row: row[0])
+        self.num_events = len(event_rows)
+        self.ev_time = _frozen(np.asarray([r[0] for r in event_rows], dtype=np.float64))
+        self.ev_type = _frozen(np.asarray([r[1] for r in event_rows], dtype=np.int8))
+        self.ev_arg0 = _frozen(np.asarray([r[2] for r in event_rows], dtype=np.int64))
+        self.ev_arg1 = _frozen(np.asarray([r[3] for r in event_rows], dtype=np.float64))
+        self.event_rows = tuple((float(t), int(k), int(a0), float(a1)) for (t, k, a0, a1) in event_rows)
+
+    def _content_hash(self):
+        digest = hashlib.sha1()
+        digest.update(repr((self.num_machines, self.num_initial_jobs)).encode())
+        for arr in (self.job_op_ptr, self.job_arrival, self.op_alt_ptr, self.alt_machine, self.alt_ptime,
+                    self.ev_time, self.ev_type, self.ev_arg0, self.ev_arg1, self.job_weight, self.job_due):
+            digest.update(arr.tobytes())
+        digest.update(repr(sorted(self.etpc_successors.items())).encode())
+        return digest.hexdigest()
+
+    def with_events(self, event_rows, job_arrival, name=None):
+        """
+        Copia instanței cu evenimentele `event_rows` ((timp, tip, arg0, arg1), sortate stabil
+        după timp) și timpii de sosire `job_arrival` [num_jobs]; operațiile, ETPC și celelalte
+        tablouri sunt partajate. Termenele finite (`job_due`) se mută odată cu sosirea jobului,
+        iar `breakdowns` este reconstruit din evenimente (pentru Gantt și `ClasicMethods`).
+        """
+        inst = copy.copy(self)
+        inst.name = self.name if name is None else name
+        inst.job_arrival = _frozen(np.asarray(job_arrival, dtype=np.float64))
+        inst.job_arrival_list = tuple(inst.job_arrival.tolist())
+        shift = inst.job_arrival - self.job_arrival
+        inst.job_due = _frozen(np.where(self.job_due < NO_DUE_DATE, self.job_due + shift, self.job_due))
+        inst.op_slack = _frozen(inst.job_due[self.op_job] - self.op_rpt)
+        inst.op_slack_list = tuple(inst.op_slack.tolist())
+        inst._set_events(event_rows)
+        inst.breakdowns = {}
+        for (t, kind, m, end) in inst.event_rows:
+            if kind == EVENT_BREAKDOWN:
+                inst.breakdowns.setdefault(m, []).append((t, end))
+        inst.content_hash = inst._content_hash()
+        return inst
+
+    def __repr__(self):
+        return (f"CompiledInstance({self.name!r}, jobs={self.num_jobs}, ops={self.num_ops}, "
+                f"machines={self.num_machines}, events={self.num_events}{', jsp' if self.is_jsp else ''})")
+
+
+def compile_instance(jobs, num_machines, events, name=None):
+    """
+    Construiește un `CompiledInstance` din datele returnate de cititoare
+    (`initial_jobs`, `num_machines`, `dynamic_events`). Datele de intrare nu sunt modificate.
+    """
+    job_ops_lists = [list(ops) for ops in jobs]
+    job_arrival = [0.0] * len(job_ops_lists)
+    event_rows = []
+
+    def weight_and_due(props):
+        if not isinstance(props, dict):
+            return 1.0, NO_DUE_DATE
+        due = props.get('due_date', math.inf)
+        return float(props.get('weight', 1.0)), float(due) if math.isfinite(due) else NO_DUE_DATE
+
+    initial_props = events.get("job_properties", []) or []
+    job_weight, job_due = [], []
+    for j in range(len(job_ops_lists)):
+        w, d = weight_and_due(initial_props[j] if j < len(initial_props) else None)
+        job_weight.append(w)
+        job_due.append(d)
+
+    breakdowns = events.get("breakdowns", {})
+    if isinstance(breakdowns, dict):
+        for m_id, bd_list in breakdowns.items():
+            if isinstance(bd_list, list):
+                for item in bd_list:
+                    if isinstance(item, tuple) and len(item) == 2:
+                        bd_start, bd_end = item
+                        event_rows.append((float(bd_start), EVENT_BREAKDOWN, int(m_id), float(bd_end)))
+
+    # Joburile adăugate primesc indecșii de simulare în ordinea (stabilă) a sosirii
+    # 'added_job_properties' (dacă există) este aliniată cu 'added_jobs'
+    added_jobs = events.get("added_jobs", [])
+    added_props = events.get("added_job_properties", []) or []
+    if len(added_props) != len(added_jobs):
+        added_props = [None] * len(added_jobs)
+    added = [(item, props) for item, props in zip(added_jobs, added_props)
+             if isinstance(item, tuple) and len(item) == 2 and isinstance(item[1], list)]
+    added.sort(key=lambda pair: float(pair[0][0]))
+    for (add_time, job_ops), props in added:
+        event_rows.append((float(add_time), EVENT_ADDED_JOB, len(job_ops_lists), 0.0))
+        job_ops_lists.append(list(job_ops))
+        job_arrival.append(float(add_time))
+        w, d = weight_and_due(props)
+        job_weight.append(w)
+        job_due.append(d)
+
+    for item in events.get("cancelled_jobs", []):
+        if isinstance(item, tuple) and len(item) == 2:
+            cancel_time, job_id_to_cancel = item
+            event_rows.append((float(cancel_time), EVENT_CANCEL_JOB, int(job_id_to_cancel), 0.0))
+
+    job_op_ptr = [0]
+    for ops in job_ops_lists:
+        job_op_ptr.append(job_op_ptr[-1] + len(ops))
+
+    etpc_lists = {}
+    for constr in events.get("etpc_constraints", []) or []:
+        try:
+            fj, fo = int(constr['fore_job']), int(constr['fore_op_idx'])
+            hj, ho = int(constr['hind_job']), int(constr['hind_op_idx'])
+            tl = max(0.0, float(constr['time_lapse']))
+        except (KeyError, ValueError, TypeError) as e_etpc:
+            print(f"   Warning: Skipping invalid ETPC constraint {constr}: {e_etpc}")
+            continue
+        # Constrângerile către operații inexistente nu pot influența simularea
+        if not (0 <= fj < len(job_ops_lists) and 0 <= fo < len(job_ops_lists[fj])):
+            continue
+        if not (0 <= hj < len(job_ops_lists) and 0 <= ho < len(job_ops_lists[hj])):
+            continue
+        etpc_lists.setdefault(job_op_ptr[fj] + fo, []).append((job_op_ptr[hj] + ho, tl))
+    etpc_successors = {fore_op: tuple(succ) for fore_op, succ in etpc_lists.items()}
+
+    return CompiledInstance(name, num_machines, jobs, events, job_ops_lists, job_arrival,
+                            event_rows, etpc_successors, job_weight=job_weight, job_due=job_due)
+
+
 # --- Modified loading function ---
 def load_instances_from_directory(input_dir):
     """
     Walks through `input_dir` and loads all .txt and .json FJSP instances.
     Prints the parsed data for each file.
-    Returns a list of tuples: (initial_jobs, num_machines, dynamic_events, filename).
+    Returns a list of `CompiledInstance` objects (one per file, compiled once);
+    the parsed (initial_jobs, num_machines, dynamic_events, filename) stay
+    available as `.jobs`, `.num_machines`, `.events` and `.name`.
     `dynamic_events` now contains additional keys if loaded from JSON.
     Skips files that cause parsing errors.
     """
@@ -612,7 +912,8 @@ def load_instances_from_directory(input_dir):
                     'cancelled_jobs' in instance_data[2] and \
                     'etpc_constraints' in instance_data[2] and \
                     'job_properties' in instance_data[2]: # Verificam si cheile noi
-                     all_instances.append(instance_data)
+                     jobs, num_machines, events, fname = instance_data
+                     all_instances.append(compile_instance(jobs, num_machines, events, name=fname))
                      # Afișăm confirmarea cu informații despre datele extra
                      extra_info = ""
                      if instance_data[2]['etpc_constraints']:
@@ -4,6 +4,7 @@ import random
 from unicodedata import category
 
 from ClasicMethods import schedule_dynamic_no_parallel
+from data_reader import compile_instance
 
 
 # Funcția pentru citirea instanței originale
@@ -96,7 +97,7 @@ def calculate_total_and_average_execution_times_per_machine(num_machines, jobs):
         "added_jobs": [],
         "cancelled_jobs": []
     }
-    final_time , _ = schedule_dynamic_no_parallel(jobs,num_machines,events,"SPT")
+    final_time , _ = schedule_dynamic_no_parallel(compile_instance(jobs, num_machines, events), "SPT")
 
     # Reconstruim machine_total_times astfel încât fiecare mașină
     # să aibă același timp = final_time
@@ -266,7 +267,7 @@ def classify_instance(num_machines, jobs):
         "added_jobs": [],
         "cancelled_jobs": []
     }
-    final_time, _ = schedule_dynamic_no_parallel(jobs, num_machines, events, "SPT")
+    final_time, _ = schedule_dynamic_no_parallel(compile_instance(jobs, num_machines, events), "SPT")
     return num_machines*final_time
 
 # Funcție recursivă pentru procesarea fișierelor dintr-un director și subdirectoare
@@ -0,0 +1,161 @@
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from rule_compiler import compile_numpy_rule
+from scheduler import DecisionTrace, Simulator
+from simple_tree import canonical_key
+
+
+class _History:
+    """
+    Evaluarea unei reguli pe o instanță: makespan, momentul final al simulării, urma
+    deciziilor și checkpoint-urile (until, snapshot, nr. decizii).
+    """
+
+    __slots__ = ("makespan", "end_time", "trace", "checkpoints")
+
+    def __init__(self, makespan, end_time, trace, checkpoints):
+        self.makespan = makespan
+        self.end_time = end_time
+        self.trace = trace
+        self.checkpoints = checkpoints
+
+
+def checkpoint_interval(instance, n_checkpoints):
+    """
+    Intervalul dintre checkpoint-uri: o margine inferioară a makespan-ului (încărcarea medie
+    a mașinilor, cel mai lung job, ultimul eveniment) împărțită la `n_checkpoints`.
+    """
+    lower = instance.op_min_ptime.sum() / max(1, instance.num_machines)
+    if instance.num_ops:
+        lower = max(lower, float(instance.op_rpt.max()))
+    if instance.num_events:
+        lower = max(lower, float(instance.ev_time[-1]))
+    return max(1.0, lower / max(1, n_checkpoints))
+
+
+def first_divergence(individual, toolbox, trace_arrays):
+    """
+    Indexul primei decizii din urmă în care regula lui `individual` ar alege alt job
+    (aceeași departajare ca simulatorul: prioritatea minimă, apoi jobul cu index mic;
+    -1 dacă nicio prioritate nu e finită). None dacă regula ia toate deciziile la fel;
+    0 dacă regula nu poate fi evaluată pe vectori.
+    """
+    times, offsets, rows, jobs, chosen = trace_arrays
+    if not times.size:
+        return None
+    rule = compile_numpy_rule(individual, toolbox)
+    priority = np.empty(len(rows))
+    with np.errstate(all="ignore"):
+        try:
+            priority[:] = rule(*rows.T)
+        except Exception:
+            return 0
+    priority[~(priority < np.inf)] = np.inf
+    decision = np.repeat(np.arange(times.size), np.diff(offsets))
+    best = np.lexsort((jobs, priority, decision))[offsets[:-1]]
+    choice = np.where(priority[best] < np.inf, jobs[best], -1)
+    differ = np.nonzero(choice != chosen)[0]
+    return int(differ[0]) if differ.size else None
+
+
+class ResumeCache:
+    """
+    Reluarea evaluării unui urmaș din punctul în care se desparte de părinte.
+
+    Pentru fiecare regulă evaluată (cheia: forma canonică, `simple_tree.canonical_key`) și
+    instanță se păstrează urma deciziilor (`scheduler.DecisionTrace`) și snapshot-uri ale
+    simulării la intervale regulate (`checkpoint_interval`). Un urmaș cu atributul
+    `resume_key` (forma canonică a părintelui, setată înainte de variație) este evaluat
+    întâi pe deciziile înregistrate ale părintelui, vectorizat: dacă le ia pe toate la fel,
+    makespan-ul este al părintelui, fără simulare; altfel simularea pornește din ultimul
+    checkpoint dinaintea primei decizii diferite. Rezultatele sunt identice cu simularea de la 0.
+
+    LRU pe perechi (regulă, instanță), cu cel mult `maxsize` intrări. Contoare: `skipped`
+    (fără simulare), `resumed` (reluate dintr-un checkpoint), `full` (simulate de la 0).
+    """
+
+    def __init__(self, maxsize=512, n_checkpoints=8):
+        self.maxsize = maxsize
+        self.n_checkpoints = n_checkpoints
+        self._histories = OrderedDict()
+        self._lock = threading.Lock()  # backend-ul "thread" evaluează din mai multe fire
+        self.skipped = 0
+        self.resumed = 0
+        self.full = 0
+
+    def __len__(self):
+        return len(self._histories)
+
+    def _get(self, key):
+        with self._lock:
+            history = self._histories.get(key)
+            if history is not None:
+                self._histories.move_to_end(key)
+            return history
+
+    def _store(self, key, history):
+        with self._lock:
+            self._histories[key] = history
+            self._histories.move_to_end(key)
+            while len(self._histories) > self.maxsize:
+                self._histories.popitem(last=False)
+
+    def makespan(self, individual, instance, toolbox, horizon=math.inf, counters=None):
+        """
+        Makespan-ul lui `individual` pe `instance`, identic cu `scheduler.evaluate_individual`.
+        Simulările oprite la `horizon` nu sunt păstrate (makespan-ul lor depinde de orizont);
+        o simulare păstrată ar fi fost oprită dacă momentul ei final depășește `horizon`.
+        `counters` (`scheduler.SimCounters`) numără doar pașii simulați efectiv, nu și pe cei
+        reluați din cache sau dintr-un checkpoint.
+        """
+        key = (canonical_key(individual), instance.content_hash)
+        history = self._get(key)
+        if history is not None and history.end_time <= horizon:
+            return history.makespan
+
+        parent_key = getattr(individual, "resume_key", None)
+        parent = self._get((parent_key, instance.content_hash)) if parent_key is not None else None
+        checkpoints = []
+        if parent is None:
+            sim = None
+        else:
+            trace_arrays = parent.trace
+            d = first_divergence(individual, toolbox, trace_arrays)
+            if d is None and parent.end_time <= horizon:
+                self.skipped += 1
+                self._store(key, parent)
+                return parent.makespan
+            t_div = trace_arrays[0][d] if d is not None else math.inf
+            checkpoints = [cp for cp in parent.checkpoints if cp[0] < t_div]
+            if checkpoints:
+                until, snapshot, n_decisions = checkpoints[-1]
+                trace = DecisionTrace(instance, getattr(toolbox, "extended_terminals", False), trace_arrays,
+                                      n_decisions)
+                sim = snapshot.fork(individual, trace=trace, horizon=horizon, counters=counters)
+            else:
+                sim = None
+
+        if sim is None:
+            self.full += 1
+            trace = DecisionTrace(instance, getattr(toolbox, "extended_terminals", False))
+            sim = Simulator(individual, instance, toolbox, record_schedule=False, trace=trace, horizon=horizon,
+                            counters=counters)
+            until = 0.0
+        else:
+            self.resumed += 1
+
+        interval = checkpoint_interval(instance, self.n_checkpoints)
+        while not sim.done:
+            until = max(until + interval, sim.current_time)
+            sim.run(until=until)
+            if not sim.done:
+                checkpoints.append((until, sim.snapshot(), len(sim.trace)))
+        makespan = sim.result()[0]
+        if sim.capped:
+            return makespan
+        self._store(key, _History(makespan, sim.current_time, sim.trace.arrays(), checkpoints))
+        return makespan
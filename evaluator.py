@@ -1,41 +1,606 @@
-import copy
+import concurrent.futures
+import contextlib
+import math
 import operator
-from deap import tools, algorithms, gp
+from deap import tools, algorithms, gp, creator
 import random as rd
+import threading
 
-from scheduler import evaluate_individual
+from scheduler import SimCounters, evaluate_individual
+from batch_engine import evaluate_individuals_batch
+from simple_tree import canonical_key
+from phenotype import PhenotypeCache
+from divergence import ResumeCache
+from scenario import realize_scenario
 
-def multi_instance_fitness(individual, instances, toolbox):
+# --- Starea unui proces worker (backend "process") ---
+# Fiecare worker primește instanțele de antrenare o singură dată, prin initializer,
+# și își construiește propriul toolbox/creator; între procese circulă doar
+# forma text a indivizilor și tuplurile de fitness.
+_WORKER_INSTANCES = None
+_WORKER_TOOLBOX = None
+
+
+def _init_worker(instances, extended_terminals=False):
+    global _WORKER_INSTANCES, _WORKER_TOOLBOX
+    from gp_setup import create_toolbox
+    _WORKER_INSTANCES = instances
+    _WORKER_TOOLBOX = create_toolbox(np=1, backend="serial", extended_terminals=extended_terminals)
+
+
+def _evaluate_chunk_in_worker(expr_strs, instance_ids, race, horizon, scenario, profile_timed=None):
+    pset = _WORKER_TOOLBOX.pset
+    individuals = [creator.Individual(gp.PrimitiveTree.from_string(s, pset)) for s in expr_strs]
+    _WORKER_TOOLBOX.rule_cache.compile_many(individuals)
+    instances = _WORKER_INSTANCES if instance_ids is None else [_WORKER_INSTANCES[i] for i in instance_ids]
+    profile = EngineProfile(profile_timed) if profile_timed is not None else None
+    fits = [multi_instance_fitness(ind, instances, _WORKER_TOOLBOX, race=race, horizon=horizon, scenario=scenario,
+                                   profile=profile)
+            for ind in individuals]
+    return fits, (profile.counters if profile is not None else None)
+
+
+def _process_map(executor, n_workers, instance_ids, func, individuals):
+    """
+    Înlocuiește `toolbox.map(toolbox.evaluate, ...)` în backend-ul "process":
+    `func` (evaluarea înregistrată) rulează în worker ca `multi_instance_fitness`
+    pe instanțele preîncărcate (subsetul `instance_ids`, None = toate), deci trimitem
+    doar `str(individ)`, în bucăți compilate de worker într-un singur exec.
+    Starea de racing, orizonturile și scenariul (argumentele `race`, `horizon` și `scenario`
+    ale lui `func`) sunt trimise cu fiecare bucată; actualizările orizonturilor din worker nu se întorc.
+    Scenariile sunt realizate în worker, din aceleași semințe.
+    Cu `profile` (vezi `EngineProfile`), fiecare bucată întoarce și contoarele simulărilor ei,
+    adunate aici în profilul procesului principal.
+    """
+    race = getattr(func, "keywords", {}).get("race")
+    horizon = getattr(func, "keywords", {}).get("horizon")
+    scenario = getattr(func, "keywords", {}).get("scenario")
+    profile = getattr(func, "keywords", {}).get("profile")
+    profile_timed = profile.timed if profile is not None else None
+    expr_strs = [str(ind) for ind in individuals]
+    chunk = max(1, len(expr_strs) // (4 * max(1, n_workers)))
+    chunks = [expr_strs[i:i + chunk] for i in range(0, len(expr_strs), chunk)]
+    results = []
+    for fits, counters in executor.map(_evaluate_chunk_in_worker, chunks, [instance_ids] * len(chunks),
+                                       [race] * len(chunks), [horizon] * len(chunks), [scenario] * len(chunks),
+                                       [profile_timed] * len(chunks)):
+        if profile is not None:
+            profile.merge(counters)
+        results.extend(fits)
+    return results
+
+
+class RaceResult(tuple):
+    """
+    Fitness (tuplul DEAP) plus makespan-urile pe instanțele evaluate, în ordine.
+    `partial` = individul a fost eliminat înainte de a fi simulat pe toate instanțele.
+    """
+
+    def __new__(cls, values, makespans, n_total):
+        obj = super().__new__(cls, values)
+        obj.makespans = tuple(makespans)
+        obj.n_total = n_total
+        return obj
+
+    def __reduce__(self):
+        return (RaceResult, (tuple(self), self.makespans, self.n_total))
+
+    @property
+    def partial(self):
+        return len(self.makespans) < self.n_total
+
+
+# Valori critice t-Student unilaterale (95%) după gradele de libertate; peste 30 folosim normala
+_T95 = {1: 6.314, 2: 2.920, 3: 2.353, 4: 2.132, 5: 2.015, 6: 1.943, 7: 1.895, 8: 1.860, 9: 1.833,
+        10: 1.812, 12: 1.782, 15: 1.753, 20: 1.725, 30: 1.697}
+
+
+def _t_critical(df):
+    for limit in sorted(_T95):
+        if df <= limit:
+            return _T95[limit]
+    return 1.645
+
+
+class Racing:
+    """
+    Evaluare prin "racing": instanțele se simulează în loturi de `batch_size`, iar după
+    fiecare lot individul este comparat (test pereche) cu referința = cel mai bun individ
+    evaluat complet până acum, pe aceleași instanțe. Dacă marginea inferioară a diferenței
+    medii, `mean(d) - t(n-1) * sd(d) / sqrt(n)`, este pozitivă (individul e clar mai slab),
+    evaluarea se oprește. Fitness-ul estimat este conservator: media completă a referinței
+    plus diferența medie observată, deci un individ eliminat nu apare niciodată mai bun
+    decât referința; indivizii eliminați nu intră în Hall-of-Fame.
+    """
+
+    def __init__(self, batch_size=2, min_instances=2):
+        self.batch_size = max(1, batch_size)
+        self.min_instances = max(2, min_instances)
+        self.reference = None  # makespan-urile per instanță ale referinței
+
+    def reset(self):
+        """Referința nu mai e valabilă (de ex. s-au schimbat instanțele de evaluare)."""
+        self.reference = None
+
+    def update(self, fit):
+        """Un individ evaluat complet și mai bun decât referința devine noua referință."""
+        if not isinstance(fit, RaceResult) or fit.partial:
+            return
+        if self.reference is None or sum(fit.makespans) < sum(self.reference):
+            self.reference = fit.makespans
+
+    def eliminate(self, makespans):
+        """Fitness-ul conservator dacă individul poate fi eliminat după `makespans`, altfel None."""
+        n = len(makespans)
+        if self.reference is None or n < self.min_instances or n % self.batch_size:
+            return None
+        diffs = [ms - ref for ms, ref in zip(makespans, self.reference)]
+        mean_d = sum(diffs) / n
+        sd_d = math.sqrt(sum((d - mean_d) ** 2 for d in diffs) / (n - 1))
+        lower = mean_d - _t_critical(n - 1) * sd_d / math.sqrt(n)
+        if lower <= 0.0:
+            return None
+        return sum(self.reference) / len(self.reference) + mean_d
+
+
+class HorizonCap:
+    """
+    Orizontul de simulare per instanță (cheia: `content_hash`): `factor` × cel mai bun
+    makespan cunoscut al instanței. Referința pornește de la regulile de bază din `seed`
+    (implicit SPT, adică terminalul PT, pe același simulator) și scade cu fiecare evaluare
+    terminată înainte de orizont. O simulare care depășește orizontul se oprește și primește
+    makespan-ul penalizat (`scheduler.penalized_makespan`), deci regulile patologice (NaN,
+    mașini ținute libere) nu mai rulează până la `MAX_TIME_LIMIT`.
+    `capped` numără simulările oprite în procesul curent.
+    """
+
+    def __init__(self, factor=3.0):
+        self.factor = factor
+        self.best = {}
+        self.capped = 0
+        self._lock = threading.Lock()  # backend-ul "thread" actualizează din mai multe fire
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def seed(self, instances, toolbox, rules=("PT",)):
+        """Makespan-urile regulilor de bază `rules` (expresii GP) devin referințele inițiale."""
+        for rule in rules:
+            ind = creator.Individual(gp.PrimitiveTree.from_string(rule, toolbox.pset))
+            for instance in instances:
+                ms, _ = evaluate_individual(ind, instance, toolbox, record_schedule=False)
+                self.update(instance, ms)
+
+    def horizon(self, instance):
+        best = self.best.get(instance.content_hash)
+        return math.inf if best is None else self.factor * best
+
+    def update(self, instance, makespan):
+        """Un makespan obținut fără oprire la orizont poate coborî referința instanței."""
+        with self._lock:
+            best = self.best.get(instance.content_hash)
+            if makespan > 0.0 and (best is None or makespan < best):
+                self.best[instance.content_hash] = makespan
+
+    def observe(self, instance, makespan):
+        """Înregistrează rezultatul unei evaluări cu orizontul curent al instanței."""
+        if makespan >= self.horizon(instance):
+            with self._lock:
+                self.capped += 1
+        else:
+            self.update(instance, makespan)
+
+
+class EngineProfile:
+    """
+    Contoarele simulatorului (`scheduler.SimCounters`) adunate pe instanțe: `counters[nume]`
+    cumulează toate simulările instanței (scenariile `nume@seed:index` sunt adunate la
+    instanța din care provin), iar `take_generation(gen)` întoarce totalul simulărilor de la
+    apelul anterior și îl păstrează, cu detaliul pe instanțe, în `history`. Cu `timed`, se
+    măsoară și timpii pașilor (A)-(D) ai buclei. Simulările prin `divergence.ResumeCache`
+    numără doar pașii simulați efectiv.
+    """
+
+    def __init__(self, timed=False):
+        self.timed = timed
+        self.counters = {}
+        self.history = []  # (gen, total, {nume: SimCounters})
+        self._generation = {}
+        self._lock = threading.Lock()  # backend-ul "thread" adună din mai multe fire
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def add(self, instance, counters):
+        """Adună contoarele unei simulări pe `instance`."""
+        self.merge({instance.name.split("@")[0]: counters})
+
+    def merge(self, counters_by_name):
+        """Adună contoarele pe instanțe ale altui profil (ex. ale unui worker)."""
+        with self._lock:
+            for name, counters in counters_by_name.items():
+                for target in (self.counters, self._generation):
+                    target.setdefault(name, SimCounters(self.timed)).add(counters)
+
+    def total(self, counters_by_name=None):
+        """Suma contoarelor pe toate instanțele (implicit cele cumulate)."""
+        total = SimCounters(self.timed)
+        for counters in (self.counters if counters_by_name is None else counters_by_name).values():
+            total.add(counters)
+        return total
+
+    def take_generation(self, gen):
+        """Totalul simulărilor de la apelul anterior, înregistrat în `history` pentru generația `gen`."""
+        with self._lock:
+            by_name, self._generation = self._generation, {}
+        total = self.total(by_name)
+        self.history.append((gen, total, by_name))
+        return total
+
+    def report(self):
+        """Rândurile rezumatului: câte unul pe instanță, în ordinea timpului măsurat sau a momentelor."""
+        key = (lambda item: sum(item[1].phase_time)) if self.timed else (lambda item: item[1].ticks)
+        return [f"{name}: {counters.report()}" for name, counters in sorted(self.counters.items(), key=key,
+                                                                              reverse=True)]
+
+
+def multi_instance_fitness(individual, instances, toolbox, race=None, horizon=None, scenario=None, profile=None):
     """
     Calculează fitness-ul pentru un individ,
     ca media makespan-ului pe o listă de instanțe.
+    Instanțele sunt `CompiledInstance` (read-only), deci nu mai copiem nimic per evaluare.
+    Cu `race` (vezi `Racing`), întoarce un `RaceResult` și se poate opri devreme.
+    Cu `toolbox.resume_cache` (vezi `divergence.ResumeCache`), simularea unui urmaș
+    pornește din punctul în care se desparte de părinte.
+    Cu `horizon` (vezi `HorizonCap`), simulările care depășesc orizontul instanței se opresc.
+    Cu `scenario` = (seed, index), fiecare instanță este înlocuită de scenariul ei
+    `scenario.realize_scenario(instance, seed, index)` (defecte și sosiri eșantionate).
+    Cu `profile` (vezi `EngineProfile`), contoarele fiecărei simulări se adună pe instanță.
     """
 
     print("   Evaluating individual " + str(individual))
+    if scenario is not None:
+        instances = [realize_scenario(instance, *scenario) for instance in instances]
+    resume_cache = getattr(toolbox, "resume_cache", None)
     total_makespan = 0.0
-    for (jobs, num_machines, events, _) in instances:
-        jb_copy = copy.deepcopy(jobs)
-        ev_copy = {
-            'breakdowns': {m: list(bd) for m, bd in events['breakdowns'].items()},
-            'added_jobs': list(events['added_jobs']),
-            'cancelled_jobs': list(events['cancelled_jobs'])
-        }
-
-        ms, _ = evaluate_individual(individual, jb_copy, num_machines, ev_copy, toolbox)
+    makespans = []
+    for instance in instances:
+        cap = horizon.horizon(instance) if horizon is not None else math.inf
+        counters = SimCounters(profile.timed) if profile is not None else None
+        if resume_cache is not None:
+            ms = resume_cache.makespan(individual, instance, toolbox, horizon=cap, counters=counters)
+        else:
+            ms, _ = evaluate_individual(individual, instance, toolbox, record_schedule=False, horizon=cap,
+                                        counters=counters)
+        if horizon is not None:
+            horizon.observe(instance, ms)
+        if profile is not None:
+            profile.add(instance, counters)
         total_makespan += ms
+        if race is not None:
+            makespans.append(ms)
+            if len(makespans) < len(instances):
+                estimate = race.eliminate(makespans)
+                if estimate is not None:
+                    return RaceResult((estimate,), makespans, len(instances))
+    if race is not None:
+        return RaceResult((total_makespan / len(instances),), makespans, len(instances))
     return (total_makespan / len(instances),)
 
-def run_genetic_program(instances, toolbox, ngen=10, pop_size=20, halloffame = 1 ):
+def batch_multi_instance_fitness(individuals, instances, toolbox, race=None, horizon=None, scenario=None):
+    """
+    Ca `multi_instance_fitness` pentru o listă de indivizi, dar fiecare instanță este
+    simulată pentru toți indivizii încă în cursă deodată (`batch_engine`).
+    Cu `race`, eliminarea se verifică după fiecare instanță, cu referința de la începutul apelului.
+    """
+    print(f"   Evaluating batch of {len(individuals)} individuals")
+    if scenario is not None:
+        instances = [realize_scenario(instance, *scenario) for instance in instances]
+    makespans = [[] for _ in individuals]
+    fits = [None] * len(individuals)
+    alive = list(range(len(individuals)))
+    for instance in instances:
+        if not alive:
+            break
+        cap = horizon.horizon(instance) if horizon is not None else math.inf
+        for i, ms in zip(alive, evaluate_individuals_batch([individuals[i] for i in alive], instance, toolbox,
+                                                           horizon=cap)):
+            makespans[i].append(ms)
+            if horizon is not None:
+                horizon.observe(instance, ms)
+        if race is not None:
+            still_alive = []
+            for i in alive:
+                estimate = race.eliminate(makespans[i]) if len(makespans[i]) < len(instances) else None
+                if estimate is not None:
+                    fits[i] = RaceResult((estimate,), makespans[i], len(instances))
+                else:
+                    still_alive.append(i)
+            alive = still_alive
+    for i in alive:
+        total_makespan = 0.0
+        for ms in makespans[i]:
+            total_makespan += ms
+        fit = (total_makespan / len(instances),)
+        fits[i] = RaceResult(fit, makespans[i], len(instances)) if race is not None else fit
+    return fits
+
+
+def _batch_map(toolbox, func, individuals):
+    """`toolbox.map` al backend-ului "batch": evaluarea înregistrată rulează pe toată lista deodată."""
+    keywords = getattr(func, "keywords", {})
+    if "instances" not in keywords:
+        return list(map(func, individuals))
+    return batch_multi_instance_fitness(list(individuals), keywords["instances"], toolbox, race=keywords.get("race"),
+                                        horizon=keywords.get("horizon"), scenario=keywords.get("scenario"))
+
+
+class FitnessCache:
+    """
+    Memoizare a fitness-ului după forma canonică a regulii (`simple_tree.canonical_key`):
+    reguli identice sau care diferă doar prin transformări ce nu schimbă ordonarea
+    candidaților primesc fitness-ul deja calculat, fără simulare.
+    Opțional (`phenotype`, vezi `phenotype.PhenotypeCache`), regulile noi care aleg
+    aceiași candidați ca una deja evaluată în situațiile de decizie eșantionate îi
+    moștenesc fitness-ul.
+    """
+
+    def __init__(self, phenotype=None):
+        self.fitness = {}
+        self.phenotype = phenotype
+        self.hits = 0
+        self.pheno_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.fitness)
+
+    def reset(self):
+        """Uită fitness-urile (de ex. când se schimbă instanțele de evaluare); contoarele rămân."""
+        self.fitness.clear()
+        if self.phenotype is not None:
+            self.phenotype.fitness.clear()
+
+
+def _assign_fitness(ind, fit, race):
+    ind.fitness.values = fit
+    ind.partial_evaluation = isinstance(fit, RaceResult) and fit.partial
+    if race is not None:
+        race.update(fit)
+
+
+def evaluate_population(individuals, toolbox, fitness_cache=None):
+    """
+    Evaluează indivizii cu fitness invalid prin `toolbox.map(toolbox.evaluate, ...)`.
+    Cu `fitness_cache`, fiecare formă canonică (și, dacă e activă, fiecare semnătură
+    comportamentală) este simulată o singură dată.
+    Cu racing (argumentul `race` al lui `toolbox.evaluate`), indivizii eliminați devreme
+    au `partial_evaluation = True`, iar referința cursei se actualizează.
+    Întoarce (hits, pheno_hits, misses) pentru apelul curent.
+    """
+    race = getattr(toolbox.evaluate, "keywords", {}).get("race")
+    invalid_ind = [ind for ind in individuals if not ind.fitness.valid]
+    if fitness_cache is None:
+        for ind, fit in zip(invalid_ind, toolbox.map(toolbox.evaluate, invalid_ind)):
+            _assign_fitness(ind, fit, race)
+        return 0, 0, len(invalid_ind)
+
+    groups = {}
+    for ind in invalid_ind:
+        groups.setdefault(canonical_key(ind), []).append(ind)
+    new_keys = [key for key in groups if key not in fitness_cache.fitness]
+
+    # Cheile noi cu aceeași semnătură sunt simulate o singură dată
+    pheno_hits = 0
+    to_eval = []
+    sig_of_key = {}
+    pending_sigs = set()
+    phenotype = fitness_cache.phenotype
+    for key in new_keys:
+        if phenotype is None:
+            to_eval.append(key)
+            continue
+        sig = phenotype.signature(groups[key][0], toolbox)
+        sig_of_key[key] = sig
+        if sig in phenotype.fitness or sig in pending_sigs:
+            pheno_hits += len(groups[key])
+        else:
+            pending_sigs.add(sig)
+            to_eval.append(key)
+
+    fits = toolbox.map(toolbox.evaluate, [groups[key][0] for key in to_eval])
+    for key, fit in zip(to_eval, fits):
+        if race is not None:
+            race.update(fit)
+        fitness_cache.fitness[key] = fit
+        if phenotype is not None:
+            phenotype.fitness[sig_of_key[key]] = fit
+    for key in new_keys:
+        if key not in fitness_cache.fitness:
+            fitness_cache.fitness[key] = phenotype.fitness[sig_of_key[key]]
+
+    hits = 0
+    for key, group in groups.items():
+        for ind in group:
+            _assign_fitness(ind, fitness_cache.fitness[key], None)
+        hits += len(group)
+    misses = len(to_eval)
+    hits -= misses + pheno_hits
+    fitness_cache.hits += hits
+    fitness_cache.pheno_hits += pheno_hits
+    fitness_cache.misses += misses
+    return hits, pheno_hits, misses
+
+
+def ea_simple_cached(population, toolbox, cxpb, mutpb, ngen, halloffame=None, fitness_cache=None,
+                     verbose=True, start_gen=0, on_generation=None):
+    """
+    Aceeași buclă ca `algorithms.eaSimple` (select, varAnd, evaluare, Hall-of-Fame),
+    cu evaluarea prin `evaluate_population`; logbook-ul raportează per generație
+    câte evaluări au venit din cache (`hits` canonice, `pheno_hits` comportamentale)
+    și câte au fost simulate (`nevals`), plus câți indivizi din populație au fost
+    eliminați devreme prin racing (`partial`). `start_gen` numerotează generațiile
+    când evoluția e împărțită în segmente.
+
+    `on_generation(gen)` este apelat după variație, înainte de evaluarea urmașilor, când
+    evaluarea se schimbă de la o generație la alta (ex. un scenariu nou); fitness-urile
+    urmașilor sunt atunci invalidate și reevaluate toate.
+
+    Cu profilul motorului (argumentul `profile` al lui `toolbox.evaluate`, vezi `EngineProfile`),
+    logbook-ul are și contoarele simulărilor generației (`SimCounters.as_dict`), inclusiv ale
+    reevaluărilor făcute înaintea ei.
+    """
+    profile = getattr(toolbox.evaluate, "keywords", {}).get("profile")
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'nevals', 'hits', 'pheno_hits', 'partial']
+    if profile is not None:
+        logbook.header += list(SimCounters(profile.timed).as_dict())
+
+    def engine_counters(gen):
+        return profile.take_generation(gen).as_dict() if profile is not None else {}
+
+    def n_partial(individuals):
+        return sum(1 for ind in individuals if getattr(ind, "partial_evaluation", False))
+
+    def fully_evaluated(individuals):
+        return [ind for ind in individuals if not getattr(ind, "partial_evaluation", False)]
+
+    hits, pheno_hits, nevals = evaluate_population(population, toolbox, fitness_cache)
+    if halloffame is not None:
+        halloffame.update(fully_evaluated(population))
+    logbook.record(gen=start_gen, nevals=nevals, hits=hits, pheno_hits=pheno_hits, partial=n_partial(population),
+                   **engine_counters(start_gen))
+    if verbose:
+        print(logbook.stream)
+
+    for gen in range(start_gen + 1, start_gen + ngen + 1):
+        offspring = toolbox.select(population, len(population))
+        if getattr(toolbox, "resume_cache", None) is not None:
+            # Clonele din varAnd păstrează cheia părintelui (primul părinte la încrucișare)
+            for ind in offspring:
+                ind.resume_key = canonical_key(ind)
+        offspring = algorithms.varAnd(offspring, toolbox, cxpb, mutpb)
+        if on_generation is not None:
+            on_generation(gen)
+            for ind in offspring:
+                del ind.fitness.values
+
+        hits, pheno_hits, nevals = evaluate_population(offspring, toolbox, fitness_cache)
+        if halloffame is not None:
+            halloffame.update(fully_evaluated(offspring))
+        population[:] = offspring
+
+        logbook.record(gen=gen, nevals=nevals, hits=hits, pheno_hits=pheno_hits, partial=n_partial(population),
+                       **engine_counters(gen))
+        if verbose:
+            print(logbook.stream)
+
+    return population, logbook
+
+
+def make_subset_schedule(n_instances, n_chunks, subset_rate, seed=0):
+    """
+    Planul (reproductibil) de subseturi: pentru fiecare segment, indecșii sortați a
+    `max(1, int(n_instances * subset_rate))` instanțe alese cu `random.Random(seed)`.
+    Cu `subset_rate >= 1.0` fiecare segment folosește toate instanțele.
+    """
+    rng = rd.Random(seed)
+    k = max(1, int(n_instances * subset_rate))
+    if subset_rate >= 1.0 or k >= n_instances:
+        return [list(range(n_instances)) for _ in range(n_chunks)]
+    return [sorted(rng.sample(range(n_instances), k)) for _ in range(n_chunks)]
+
+
+def _use_instances(toolbox, instances, instance_ids, executor=None, race=None, horizon=None, scenario=None,
+                   profile=None):
+    """
+    Evaluarea (și, pentru backend-ul "process", map-ul) pe subsetul `instance_ids` (None = toate),
+    pe scenariul `scenario` = (seed, index) al instanțelor (None = evenimentele din fișiere).
+    """
+    subset = instances if instance_ids is None else [instances[i] for i in instance_ids]
+    if race is not None:
+        race.reset()
+    toolbox.register("evaluate", multi_instance_fitness, instances=subset, toolbox=toolbox, race=race,
+                     horizon=horizon, scenario=scenario, profile=profile)
+    if executor is not None:
+        toolbox.register("map", _process_map, executor, toolbox.n_workers, instance_ids)
+    elif getattr(toolbox, "backend", None) == "batch":
+        toolbox.register("map", _batch_map, toolbox)
+
+
+def _reevaluate_hof(hof, toolbox, fitness_cache):
+    """Reevaluează elitele Hall-of-Fame pe instanțele curente, ca să rămână comparabile cu populația."""
+    elites = [toolbox.clone(ind) for ind in hof]
+    for ind in elites:
+        del ind.fitness.values
+    evaluate_population(elites, toolbox, fitness_cache)
+    hof.clear()
+    hof.update(elites)
+
+
+def run_genetic_program(instances, toolbox, ngen=10, pop_size=20, halloffame = 1, use_fitness_cache=True,
+                        use_phenotype_cache=True, subset_rate=1.0, chunk_size=5, subset_seed=0,
+                        racing=False, race_batch_size=2, resume_offspring=False, horizon_factor=None,
+                        stochastic_events=False, scenario_seed=0, profile_engine=False, profile_timers=False):
     """
     Rulează GP-ul pe instanțele date.
     `toolbox` trebuie să fie deja configurat cu operatorii DEAP.
+    Cu `use_fitness_cache`, regulile rank-echivalente sunt simulate o singură dată pe rulare;
+    cu `use_phenotype_cache`, și regulile cu aceeași semnătură comportamentală.
+
+    Cu `subset_rate < 1.0`, evoluția se împarte în segmente de `chunk_size` generații;
+    fiecare segment evaluează pe un subset nou de instanțe (proporție `subset_rate`,
+    plan reproductibil din `subset_seed`, vezi `make_subset_schedule`). La schimbarea
+    subsetului, populația și elitele Hall-of-Fame sunt reevaluate pe noul subset, iar la
+    final elitele sunt reevaluate pe toate instanțele.
+
+    Cu `racing`, instanțele se evaluează în loturi de `race_batch_size` și indivizii
+    clar mai slabi decât cel mai bun individ de până acum sunt opriți devreme (vezi `Racing`).
+    Elitele Hall-of-Fame sunt reevaluate complet la final.
+
+    Cu `toolbox.backend == "batch"`, indivizii de evaluat sunt simulați împreună pe
+    fiecare instanță (`batch_multi_instance_fitness`), cu aceleași makespan-uri.
+
+    Cu `resume_offspring`, urmașii sunt simulați doar de la ultimul checkpoint al părintelui
+    dinaintea primei decizii diferite (vezi `divergence.ResumeCache`); doar pentru
+    backend-urile "serial" și "thread", unde urmele părinților sunt în același proces.
+
+    Cu `horizon_factor`, simularea unui individ pe o instanță se oprește după
+    `horizon_factor` × cel mai bun makespan cunoscut al instanței (SPT la început, apoi
+    cele mai bune evaluări), cu makespan-ul penalizat (vezi `HorizonCap`); makespan-urile
+    obținute sub orizont sunt exacte.
+
+    Cu `stochastic_events`, generația `g` este evaluată pe scenariul `(scenario_seed, g)` al
+    fiecărei instanțe: defectele și sosirile sunt eșantionate din parametrii instanței (vezi
+    `scenario.realize_scenario`), aceleași pentru toți indivizii generației (numere aleatoare
+    comune). Urmașii și elitele Hall-of-Fame sunt reevaluați pe fiecare scenariu nou, iar la
+    final elitele sunt reevaluate pe instanțele din fișiere. Orizonturile `HorizonCap` se
+    învață separat pentru fiecare scenariu, iar `resume_offspring` nu câștigă nimic (părinții
+    au fost simulați pe alt scenariu).
+
+    Cu `profile_engine`, simulările numără momentele, evenimentele, candidații și apelurile
+    (și erorile) regulii, iar cu `profile_timers` și timpul pașilor buclei (vezi
+    `scheduler.SimCounters`); logbook-ul le raportează per generație, iar la final se afișează
+    totalurile pe instanțe. Profilul rămâne în `toolbox.engine_profile` (None fără profilare).
+    Nu este disponibil în backend-ul "batch", care nu folosește `scheduler.Simulator`.
     """
     # Adăugăm evaluarea și ceilalți operatori
 
     MAX_DEPTH = 8
 
     print("Running genetic program...")
-    toolbox.register("evaluate", multi_instance_fitness, instances=instances, toolbox=toolbox)
     toolbox.register("select", tools.selTournament, tournsize=3)
     toolbox.register("mate", gp.cxOnePoint)
     toolbox.register("mutate", gp.mutUniform, expr=toolbox.expr, pset=toolbox.pset)
@@ -46,80 +611,97 @@ def run_genetic_program(instances, toolbox, ngen=10, pop_size=20, halloffame = 1
     # Inițializăm populația
     pop = toolbox.population(n=pop_size)
     hof = tools.HallOfFame(halloffame)
+    fitness_cache = None
+    if use_fitness_cache:
+        phenotype = PhenotypeCache(instances, toolbox) if use_phenotype_cache else None
+        fitness_cache = FitnessCache(phenotype)
 
-    algorithms.eaSimple(pop, toolbox, cxpb=0.5, mutpb=0.3, ngen=ngen,
-                        halloffame=hof, verbose=True)
-
-    return hof
-
-'''def run_genetic_program_subsample(instances, toolbox,
-                                     ngen=10, pop_size=20,
-                                     chunk_size=5,
-                                     subset_rate=0.5,
-                                     cxpb=0.5, mutpb=0.3,
-                                     halloffame=15, pop_init=None):
-    """
-    Împarte evoluția în segmente de `chunk_size` generații.
-    La începutul fiecărui segment, alege un subset nou de instanțe
-    (proporție subset_rate) și actualizează `toolbox.evaluate`.
-    Apoi apelează `eaSimple` pentru chunk_size generații.
-    Repetă până acoperim toți cei ngen.
-    """
-    # 1) Iniț. populația
-    if pop_init is None:
-        pop = toolbox.population(n=pop_size)
+    race = Racing(batch_size=race_batch_size) if racing else None
+    horizon = None
+    if horizon_factor is not None:
+        horizon = HorizonCap(horizon_factor)
+        horizon.seed(instances, toolbox)
+    rotating = subset_rate < 1.0
+    if rotating:
+        num_chunks = max(1, (ngen + chunk_size - 1) // chunk_size)  # rotunjire "în sus"
+        subset_plan = make_subset_schedule(len(instances), num_chunks, subset_rate, seed=subset_seed)
     else:
-        pop = pop_init
-    hof = tools.HallOfFame(halloffame)
+        subset_plan = [None]
 
-    # 2) Stabilim câte segmente
-    num_chunks = (ngen + chunk_size - 1) // chunk_size  # rotunjire "în sus"
+    toolbox.resume_cache = None
+    if resume_offspring:
+        if getattr(toolbox, "backend", "thread") in ("serial", "thread"):
+            toolbox.resume_cache = ResumeCache()
+        else:
+            print(f"   Warning: resume_offspring is not supported by the {toolbox.backend!r} backend. Ignoring.")
 
-    # Generații deja efectuate
-    gens_done = 0
+    profile = None
+    if profile_engine or profile_timers:
+        if getattr(toolbox, "backend", "thread") == "batch":
+            print("   Warning: engine profiling is not supported by the 'batch' backend. Ignoring.")
+        else:
+            profile = EngineProfile(timed=profile_timers)
+    toolbox.engine_profile = profile
 
-    for chunk_idx in range(num_chunks):
-        # A) Verificăm câte generații facem în chunk-ul curent
-        gens_left = ngen - gens_done
-        gens_here = min(chunk_size, gens_left)
-        if gens_here <= 0:
-            break
+    use_processes = getattr(toolbox, "backend", "thread") == "process"
+    serial_map = toolbox.map
+    pool = (concurrent.futures.ProcessPoolExecutor(max_workers=toolbox.n_workers, initializer=_init_worker,
+                                                   initargs=(instances, getattr(toolbox, "extended_terminals", False)))
+            if use_processes else contextlib.nullcontext())
+    with pool as executor:
+        try:
+            gens_done = 0
+            for chunk_idx, instance_ids in enumerate(subset_plan):
+                gens_here = min(chunk_size, ngen - gens_done) if rotating else ngen
+                scenario = (scenario_seed, gens_done) if stochastic_events else None
+                _use_instances(toolbox, instances, instance_ids, executor, race, horizon, scenario, profile)
+                if rotating:
+                    print(f"=== Chunk {chunk_idx}, generații {gens_here}, instanțe {instance_ids} ===")
+                if chunk_idx > 0:
+                    # Fitness-urile de pe subsetul anterior nu sunt comparabile cu cele noi
+                    if fitness_cache is not None:
+                        fitness_cache.reset()
+                    for ind in pop:
+                        del ind.fitness.values
+                    _reevaluate_hof(hof, toolbox, fitness_cache)
 
-        print(f"=== Chunk {chunk_idx}, generații {gens_here} ===")
+                on_generation = None
+                if stochastic_events:
+                    def on_generation(gen, instance_ids=instance_ids):
+                        # Un scenariu nou: fitness-urile de pe scenariul anterior nu mai sunt comparabile
+                        _use_instances(toolbox, instances, instance_ids, executor, race, horizon,
+                                       (scenario_seed, gen), profile)
+                        if fitness_cache is not None:
+                            fitness_cache.reset()
+                        _reevaluate_hof(hof, toolbox, fitness_cache)
 
-        # B) Alegem subsetul pentru chunk-ul curent
-        if subset_rate < 1.0:
-            k = max(1, int(len(instances)*subset_rate))
-            chosen_insts = rd.sample(instances, k)
-        else:
-            chosen_insts = instances
-
-        # C) Definim evaluate care folosește chosen_insts
-        def evaluate_sub(ind):
-            return multi_instance_fitness(ind, chosen_insts, toolbox)
-
-        # D) Înregistrăm evaluate, select, mate, mutate (dacă nu era deja)
-        toolbox.register("evaluate", evaluate_sub)
-        toolbox.register("select", tools.selTournament, tournsize=3)
-        toolbox.register("mate", gp.cxOnePoint)
-        toolbox.register("mutate", gp.mutUniform, expr=toolbox.expr, pset=toolbox.pset)
-
-        # E) Apelăm eaSimple pentru chunk_size generații
-        #    dar dacă gens_here < chunk_size (ultimul chunk), facem doar gens_here
-        pop, log = algorithms.eaSimple(
-            pop, toolbox,
-            cxpb=cxpb, mutpb=mutpb,
-            ngen=gens_here,
-            halloffame=hof,
-            verbose=True
-        )
-
-        gens_done += gens_here
-        if gens_done >= ngen:
-            break
+                ea_simple_cached(pop, toolbox, cxpb=0.5, mutpb=0.3, ngen=gens_here,
+                                 halloffame=hof, fitness_cache=fitness_cache, verbose=True,
+                                 start_gen=gens_done, on_generation=on_generation)
+                gens_done += gens_here
 
-    # 3) Return final: best individ (sau tot hof)
-    return hof
+            if rotating or racing or stochastic_events:
+                # Fitness_train raportat pentru elite: media completă pe toate instanțele
+                _use_instances(toolbox, instances, None, executor, profile=profile)
+                if fitness_cache is not None:
+                    fitness_cache.reset()
+                _reevaluate_hof(hof, toolbox, fitness_cache)
+        finally:
+            toolbox.register("map", serial_map)
 
+    if fitness_cache is not None:
+        total = fitness_cache.hits + fitness_cache.pheno_hits + fitness_cache.misses
+        print(f"Fitness cache: {fitness_cache.hits}/{total} hits, {fitness_cache.pheno_hits}/{total} phenotype hits, "
+              f"{len(fitness_cache)} distinct rules")
+    if toolbox.resume_cache is not None:
+        rc = toolbox.resume_cache
+        print(f"Resume cache: {rc.skipped} skipped, {rc.resumed} resumed, {rc.full} full simulations")
+        toolbox.resume_cache = None
+    if horizon is not None and not use_processes:  # în backend-ul "process" opririle sunt numărate în workeri
+        print(f"Horizon cap: {horizon.capped} simulations stopped at {horizon.factor:g} x best known makespan")
+    if profile is not None:
+        print(f"Engine profile: {profile.total().report()}")
+        for line in profile.report():
+            print(f"   {line}")
 
-'''
+    return hof
@@ -0,0 +1,132 @@
+import math
+import os
+
+import numpy as np
+
+
+class FlightRecorder:
+    """
+    Înregistratorul deciziilor unei simulări (vezi `scheduler.Simulator`, argumentul `recorder`),
+    într-un buffer circular prealocat de `capacity` rânduri: la depășire se păstrează ultimele
+    `capacity` rânduri, iar `dropped` numără rândurile pierdute. Un rând are:
+    - `time`: momentul deciziei (operația aleasă începe la time + 1);
+    - `machine`: mașina liberă;
+    - `op`: operația aleasă (id plat), -1 dacă nicio prioritate nu a fost finită;
+    - `count`: numărul candidaților;
+    - `priority`: prioritatea câștigătoare;
+    - `margin`: diferența până la a doua prioritate (0 la egalitate, inf cu un singur candidat finit).
+    Rândurile cu `count` 0 sunt întreruperi: operația `op` a fost scoasă de pe mașină la `time`
+    (defect sau anularea jobului), deci `replay_schedule` poate reconstrui planificarea exact.
+
+    `end_time` și `finished` descriu oprirea simulării: terminată normal (momentul final a fost
+    procesat) sau oprită la un orizont sau o limită (momentul `end_time` nu a fost procesat).
+    Cu `recorder=None` simulatorul nu face nimic în plus.
+    """
+
+    def __init__(self, capacity=1 << 16, instance_hash=None):
+        self.capacity = int(capacity)
+        self.instance_hash = instance_hash
+        self.time = np.zeros(self.capacity)
+        self.machine = np.zeros(self.capacity, dtype=np.int32)
+        self.op = np.zeros(self.capacity, dtype=np.int64)
+        self.count = np.zeros(self.capacity, dtype=np.int32)
+        self.priority = np.zeros(self.capacity)
+        self.margin = np.zeros(self.capacity)
+        # Scrierile trec prin vederi memoryview (o scriere NumPy cu index scalar e mult mai lentă)
+        self._views = tuple(memoryview(arr) for arr in
+                            (self.time, self.machine, self.op, self.count, self.priority, self.margin))
+        self.n_recorded = 0
+        self.end_time = math.nan
+        self.finished = False
+
+    def __len__(self):
+        return min(self.n_recorded, self.capacity)
+
+    @property
+    def dropped(self):
+        return max(0, self.n_recorded - self.capacity)
+
+    def record(self, time, machine, op, count, priority, margin):
+        i = self.n_recorded % self.capacity
+        time_v, machine_v, op_v, count_v, priority_v, margin_v = self._views
+        time_v[i] = time
+        machine_v[i] = machine
+        op_v[i] = op
+        count_v[i] = count
+        priority_v[i] = priority
+        margin_v[i] = margin
+        self.n_recorded += 1
+
+    def stop(self, end_time, finished):
+        self.end_time = float(end_time)
+        self.finished = bool(finished)
+
+    def rows(self):
+        """(time, machine, op, count, priority, margin): rândurile păstrate, în ordine cronologică."""
+        arrays = (self.time, self.machine, self.op, self.count, self.priority, self.margin)
+        n = len(self)
+        if self.n_recorded <= self.capacity:
+            return tuple(arr[:n].copy() for arr in arrays)
+        head = self.n_recorded % self.capacity
+        return tuple(np.concatenate((arr[head:], arr[:head])) for arr in arrays)
+
+    def save(self, path):
+        """Salvează rândurile păstrate (.npz) împreună cu hash-ul instanței și starea de oprire."""
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        time, machine, op, count, priority, margin = self.rows()
+        np.savez_compressed(path, time=time, machine=machine, op=op, count=count, priority=priority,
+                            margin=margin, n_recorded=self.n_recorded, end_time=self.end_time,
+                            finished=self.finished, instance_hash=str(self.instance_hash or ""))
+
+    @classmethod
+    def load(cls, path):
+        """Înregistrarea salvată cu `save()`, cu capacitatea egală cu numărul rândurilor păstrate."""
+        with np.load(path) as data:
+            n = len(data["time"])
+            recorder = cls(max(1, n), instance_hash=str(data["instance_hash"]) or None)
+            recorder.n_recorded = int(data["n_recorded"])
+            # Rândurile sunt puse în pozițiile în care le-ar fi scris bufferul, deci `rows()` și
+            # `dropped` rămân cele de la salvare
+            for name in ("time", "machine", "op", "count", "priority", "margin"):
+                if n:
+                    getattr(recorder, name)[:] = np.roll(data[name], recorder.n_recorded % n)
+            recorder.stop(float(data["end_time"]), bool(data["finished"]))
+        return recorder
+
+
+def replay_schedule(recorder, instance):
+    """
+    Reconstruiește planificarea (job, op_idx, mașină, start, end) din înregistrare, fără simulare:
+    operația aleasă la momentul t pe mașina m rulează de la t + 1 cât timpul ei pe m și se termină
+    dacă nu este întreruptă (rând cu `count` 0) și dacă pasul ei final (end - 1) a fost procesat.
+    Ordinea este cea a simulatorului (după final, apoi după mașină), deci fără rânduri pierdute
+    rezultatul este egal cu `schedule` din `Simulator.result()`. Dacă bufferul s-a umplut,
+    lipsesc operațiile începute înaintea primului rând păstrat.
+    """
+    if recorder.instance_hash and recorder.instance_hash != instance.content_hash:
+        raise ValueError(f"Recording is for instance {recorder.instance_hash}, not {instance.content_hash}.")
+    op_job, op_index, op_alternatives = instance.op_job_list, instance.op_index_list, instance.op_alternatives
+    running = {}  # mașină -> (op, start, end)
+    schedule = []
+
+    def finish(machine):
+        op, start, end = running.pop(machine)
+        schedule.append((op_job[op], op_index[op], machine, start, end))
+
+    time, machine, op, count, _priority, _margin = (arr.tolist() for arr in recorder.rows())
+    for t, m, o, c in zip(time, machine, op, count):
+        if c == 0:
+            if m in running and running[m][0] == o:
+                del running[m]  # întreruptă: va fi aleasă din nou mai târziu
+        elif o >= 0:
+            if m in running:
+                finish(m)  # mașina a fost liberă la t, deci operația anterioară s-a terminat
+            ptime = next(p for (m_alt, p) in op_alternatives[o] if m_alt == m and p > 1e-9)
+            running[m] = (o, t + 1.0, t + 1.0 + ptime)
+    for m in list(running):
+        end_step = running[m][2] - 1.0
+        if end_step < recorder.end_time - 1e-9 or (recorder.finished and end_step <= recorder.end_time + 1e-9):
+            finish(m)
+    schedule.sort(key=lambda entry: (entry[4], entry[2]))
+    return schedule
@@ -1,25 +1,59 @@
 import concurrent.futures
+import functools
 import operator
 import random
+
+import numpy
 from deap import base, creator, tools, gp
 
+from rule_compiler import RuleCache, precompiling_map
+
 def protected_div(a, b):
     return a / b if abs(b) > 1e-9 else a
 
-def create_toolbox(np = 3):
+
+# Variante element cu element ale primitivelor, pentru reguli evaluate pe vectori NumPy.
+# Dau aceleași valori ca primitivele Python (inclusiv pentru NaN/inf): min(a, b) întoarce
+# b doar dacă b < a, max(a, b) doar dacă b > a, iar împărțirea protejată întoarce a.
+def np_protected_div(a, b):
+    with numpy.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        return numpy.where(numpy.abs(b) > 1e-9, numpy.divide(a, b), a)
+
+
+def np_min(a, b):
+    return numpy.where(b < a, b, a)
+
+
+def np_max(a, b):
+    return numpy.where(b > a, b, a)
+
+
+NUMPY_PRIMITIVES = {"protected_div": np_protected_div, "min": np_min, "max": np_max}
+
+# Terminalele, în ordinea argumentelor regulilor compilate (și a coloanelor din simulatoare)
+TERMINALS = ("PT",   # Processing Time
+             "RO",   # Remaining Operations
+             "MW",   # Machine Wait
+             "TQ",   # Time in Queue
+             "WIP",  # Work In Progress
+             "RPT")  # Remaining Processing Time (job-level)
+EXTENDED_TERMINALS = TERMINALS + (
+             "NQ",   # Number in Queue: operațiile eligibile din coada mașinii
+             "NPT",  # Next Processing Time: timpul minim al operației următoare a jobului
+             "JW",   # Job Weight
+             "SL")   # Slack: due_date - momentul startului - RPT
+
+
+def create_pset(extended_terminals=False):
     """
-    Creează și returnează un obiect `toolbox` DEAP cu
-    definirea primitivelor GP, a tipurilor de date și
-    operatorilor de încrucișare/mutare selecție etc.
+    Setul de primitive GP (6 argumente: PT, RO, MW, TQ, WIP, RPT; cu `extended_terminals`,
+    încă 4: NQ, NPT, JW, SL). Toate sunt întreținute incremental de simulatoare, deci
+    setul extins nu încetinește bucla de dispecerizare.
+    Separat de `create_toolbox` pentru ca procesele worker să îl poată reconstrui.
     """
-    print("Create toolbox")
-    pset = gp.PrimitiveSet("MAIN", 6)
-    pset.renameArguments(ARG0='PT')  # Processing Time
-    pset.renameArguments(ARG1='RO')  # Remaining Operations
-    pset.renameArguments(ARG2='MW')  # Machine Wait
-    pset.renameArguments(ARG3='TQ')  # Time in Queue
-    pset.renameArguments(ARG4='WIP')  # Work In Progress
-    pset.renameArguments(ARG5='RPT')  # Remaining Processing Time (job-level)
+    terminals = EXTENDED_TERMINALS if extended_terminals else TERMINALS
+    pset = gp.PrimitiveSet("MAIN", len(terminals))
+    pset.renameArguments(**{f"ARG{i}": name for i, name in enumerate(terminals)})
 
 
     pset.addPrimitive(operator.add, 2)
@@ -32,9 +66,37 @@ def create_toolbox(np = 3):
 
     pset.addTerminal(1.0)
     #pset.addTerminal(0.0)
+    return pset
+
+
+def create_creator_classes():
+    """Definește `creator.FitnessMin` și `creator.Individual` (o singură dată per proces)."""
+    if not hasattr(creator, "FitnessMin"):
+        creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+    if not hasattr(creator, "Individual"):
+        creator.create("Individual", gp.PrimitiveTree, fitness=creator.FitnessMin)
+
+
+def create_toolbox(np = 3, backend = "thread", extended_terminals = False):
+    """
+    Creează și returnează un obiect `toolbox` DEAP cu
+    definirea primitivelor GP, a tipurilor de date și
+    operatorilor de încrucișare/mutare selecție etc.
 
-    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
-    creator.create("Individual", gp.PrimitiveTree, fitness=creator.FitnessMin)
+    `backend` alege cum se evaluează populația:
+    - "thread": `toolbox.map` = ThreadPoolExecutor.map cu `np` fire (limitat de GIL);
+    - "process": evaluarea se face într-un pool de `np` procese, creat de
+      `evaluator.run_genetic_program` când instanțele de antrenare sunt cunoscute;
+      până atunci `toolbox.map` este `map` serial;
+    - "serial": `map` serial (folosit și în procesele worker);
+    - "batch": `map` serial, dar `evaluator.run_genetic_program` simulează populația
+      pe fiecare instanță în pas sincron (vezi `batch_engine`).
+
+    `extended_terminals` adaugă terminalele NQ, NPT, JW și SL (vezi `create_pset`).
+    """
+    print("Create toolbox")
+    pset = create_pset(extended_terminals)
+    create_creator_classes()
 
     toolbox = base.Toolbox()
     toolbox.register("expr", gp.genFull, pset=pset, min_=1, max_=3)
@@ -42,11 +104,25 @@ def create_toolbox(np = 3):
     toolbox.register("population", tools.initRepeat, list, toolbox.individual)
     toolbox.register("compile", gp.compile, pset=pset)
 
-    executor = concurrent.futures.ThreadPoolExecutor(max_workers=np)
-    # Pas 2: Să folosim executorul pentru evaluare în paralel
-    toolbox.register("map", executor.map)
+    # Regulile compilate sunt refolosite între instanțe (vezi rule_compiler.RuleCache);
+    # `map` compilează întâi toată generația într-un singur exec.
+    toolbox.rule_cache = RuleCache(pset)
+    # Aceleași reguli, compilate cu primitivele NumPy (evaluare pe vectori de candidați)
+    toolbox.np_rule_cache = RuleCache(pset, context=dict(pset.context, **NUMPY_PRIMITIVES))
+
+    if backend == "thread":
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=np)
+        # Pas 2: Să folosim executorul pentru evaluare în paralel
+        toolbox.register("map", functools.partial(precompiling_map, executor.map, toolbox.rule_cache))
+    elif backend in ("process", "serial", "batch"):
+        toolbox.register("map", functools.partial(precompiling_map, map, toolbox.rule_cache))
+    else:
+        raise ValueError(f"Unknown evaluation backend: {backend!r}")
 
     toolbox.pset = pset
+    toolbox.backend = backend
+    toolbox.n_workers = np
+    toolbox.extended_terminals = extended_terminals
 
     # De notat: nu configurăm aici încă 'evaluate', 'select', etc.
     # pentru că le putem seta din alt modul (evaluator.py).
@@ -1,10 +1,8 @@
 from __future__ import annotations
 
 import os
-import copy
 import time
 from pathlib import Path
-from collections import defaultdict
 from typing import List, Dict, Tuple
 
 from deap import gp
@@ -15,6 +13,10 @@ from gantt_plot   import plot_gantt
 from gp_setup     import create_toolbox
 from evaluator    import run_genetic_program  # dacă numele e diferit, ajustează
 from simple_tree import simplify_individual, tree_str, infix_str
+from result_store import ResultStore, rule_hash
+from scheduler    import ENGINE_VERSION, SimMetrics
+from scenario     import robustness
+from flight_recorder import FlightRecorder
 
 # ---------------------------------------------------------------------------
 # CONFIG
@@ -24,72 +26,28 @@ TEST_DIR  = Path("dfjss_inputs_and_generators/dynamic-FJSP-instances/test/barnes
 POP_SIZE  = 5
 N_GENERATIONS = 2
 N_WORKERS = 5         # trece la create_toolbox(np=N_WORKERS)
+EVAL_BACKEND = "process"  # "process" (un worker per nucleu), "thread" sau "batch" (populația în pas sincron)
 MAX_HOF   = 1         # câți păstrăm în Hall-of-Fame
+SUBSET_RATE = 1.0     # < 1.0: antrenare pe subseturi rotite de instanțe
+CHUNK_SIZE  = 5       # generații per subset
+SUBSET_SEED = 0       # planul de subseturi este reproductibil
+RACING      = False   # oprește devreme evaluarea indivizilor clar mai slabi
+EXTENDED_TERMINALS = False  # adaugă terminalele NQ, NPT, JW, SL la setul GP
+RESUME_OFFSPRING = False    # urmașii reiau simularea de la divergența față de părinte ("serial"/"thread")
+HORIZON_FACTOR = 3.0        # simularea se oprește la HORIZON_FACTOR × cel mai bun makespan (None = fără limită)
+STOCHASTIC_EVENTS = False   # fiecare generație pe un scenariu nou de defecte/sosiri, comun tuturor indivizilor
+SCENARIO_SEED = 0           # scenariile sunt reproductibile
+ROBUSTNESS_REPLICATIONS = 0 # > 0: makespan-ul pe atâtea scenarii ale fiecărei instanțe de test (0 = dezactivat)
+PROFILE_ENGINE = False      # contoarele simulatorului (momente, evenimente, candidați, apeluri ale regulii) per generație
+PROFILE_TIMERS = False      # și timpul pașilor (A)-(D) ai buclei de simulare
 
 RESULTS_FILE = "rezultate/genetic.txt"
+RESULT_STORE = "rezultate/results.sqlite"  # rezultate refolosite între rulări (None = dezactivat)
+GANTT        = True   # False: doar metrice (planificarea nu se construiește)
 GANTT_DIR    = Path("gantt_outputs/genetic")
 GANTT_DIR.mkdir(exist_ok=True)
-
-# ----------------------------------------------------------
-#  Ordinea câmpurilor într-un tuplu din `schedule`
-TUPLE_FIELDS = {
-    "job":     0,
-    "op":      1,
-    "machine": 2,
-    "start":   3,
-    "end":     4,
-}
-
-def field(op, name: str):
-    """Returnează câmpul `name` dintr-un op (dict sau tuple)."""
-    if isinstance(op, dict):
-        return op[name]
-    return op[TUPLE_FIELDS[name]]
-# ----------------------------------------------------------
-
-
-# ---------------------------------------------------------------------------
-#  UTILITARE METRICE
-# ---------------------------------------------------------------------------
-def calc_machine_idle_time(sched: List) -> Tuple[float, float]:
-    ops_by_m = defaultdict(list)
-    for op in sched:
-        ops_by_m[field(op, "machine")].append(
-            (field(op, "start"), field(op, "end"))
-        )
-
-    idle_total = 0.0
-    for ops in ops_by_m.values():
-        ops.sort(key=lambda x: x[0])          # sortăm după start
-        prev_end = 0.0
-        for st, en in ops:
-            idle_total += max(0.0, st - prev_end)
-            prev_end = en
-        makespan_m = max(e for _, e in ops)   # ultimul end pe mașină
-        idle_total += max(0.0, makespan_m - prev_end)
-
-    idle_avg = idle_total / len(ops_by_m) if ops_by_m else 0.0
-    return idle_total, idle_avg
-
-
-def calc_job_waiting_time(sched: List) -> Tuple[float, float]:
-    ops_by_j = defaultdict(list)
-    for op in sched:
-        ops_by_j[field(op, "job")].append(
-            (field(op, "start"), field(op, "end"))
-        )
-
-    wait_total = 0.0
-    for ops in ops_by_j.values():
-        ops.sort(key=lambda x: x[0])
-        prev_end = 0.0
-        for st, en in ops:
-            wait_total += max(0.0, st - prev_end)
-            prev_end = en
-
-    wait_avg = wait_total / len(ops_by_j) if ops_by_j else 0.0
-    return wait_total, wait_avg
-
+FLIGHT_RECORDER = 0   # > 0: deciziile simulărilor de test (ultimele atâtea) salvate în RECORDER_DIR
+RECORDER_DIR = Path("rezultate/recorder")  # `flight_recorder.replay_schedule` reconstruiește planificarea
 
 # ---------------------------------------------------------------------------
 # MAIN
@@ -102,7 +60,7 @@ def main() -> None:
     test_insts  = load_instances_from_directory(TEST_DIR)
 
     # 2) Toolbox
-    toolbox = create_toolbox(np=N_WORKERS)
+    toolbox = create_toolbox(np=N_WORKERS, backend=EVAL_BACKEND, extended_terminals=EXTENDED_TERMINALS)
 
     # 3) GP training ⇒ Hall-of-Fame (top 5)
     print("\n=== GP TRAINING ===")
@@ -112,6 +70,16 @@ def main() -> None:
         ngen=N_GENERATIONS,
         pop_size=POP_SIZE,
         halloffame=MAX_HOF,
+        subset_rate=SUBSET_RATE,
+        chunk_size=CHUNK_SIZE,
+        subset_seed=SUBSET_SEED,
+        racing=RACING,
+        resume_offspring=RESUME_OFFSPRING,
+        horizon_factor=HORIZON_FACTOR,
+        stochastic_events=STOCHASTIC_EVENTS,
+        scenario_seed=SCENARIO_SEED,
+        profile_engine=PROFILE_ENGINE,
+        profile_timers=PROFILE_TIMERS,
     )
     best_5: List = list(hof)[:MAX_HOF]
 
@@ -121,6 +89,7 @@ def main() -> None:
         print(f"  {idx}: {fit_val:.4f}  ->  {ind}")
 
     # 4) Test each individual
+    store = ResultStore(RESULT_STORE) if RESULT_STORE else None
     with open(RESULTS_FILE, "w", encoding="utf-8") as outf:
         for rank, ind in enumerate(best_5, 1):
             ind_fit = ind.fitness.values[0] if ind.fitness.valid else float("inf")
@@ -140,22 +109,29 @@ def main() -> None:
             sum_wait = 0.0
             time_vals: List[float] = []
 
-            for jobs, nm, ev, fname in test_insts:
-                jb_cp = copy.deepcopy(jobs)
-                ev_cp = {
-                    "breakdowns": {m: list(bd) for m, bd in ev["breakdowns"].items()},
-                    "added_jobs":  list(ev["added_jobs"]),
-                    "cancelled_jobs": list(ev["cancelled_jobs"]),
-                }
-
-                t0 = time.perf_counter()
-                ms, sched = evaluate_individual(ind, jb_cp, nm, ev_cp, toolbox)
-                elapsed = time.perf_counter() - t0
-
-                # --- metrice suplimentare -----------------------------------
-                idle_total, idle_avg = calc_machine_idle_time(sched)
-                wait_total, wait_avg = calc_job_waiting_time(sched)
-                # -------------------------------------------------------------
+            ind_hash = rule_hash(ind)
+            for inst in test_insts:
+                fname = inst.name
+
+                cached = store.get(ind_hash, inst.content_hash, ENGINE_VERSION) if store else None
+                if cached is not None:
+                    # Rezultat dintr-o rulare anterioară: fără simulare (și fără Gantt)
+                    ms, idle_avg, wait_avg, elapsed = cached
+                    sched = None
+                else:
+                    t0 = time.perf_counter()
+                    metrics = SimMetrics()  # metrice acumulate în simulare
+                    recorder = FlightRecorder(FLIGHT_RECORDER, inst.content_hash) if FLIGHT_RECORDER else None
+                    ms, sched = evaluate_individual(ind, inst, toolbox, record_schedule=GANTT, metrics=metrics,
+                                                    recorder=recorder)
+                    elapsed = time.perf_counter() - t0
+                    if recorder is not None:
+                        recorder.save(str(RECORDER_DIR / f"{Path(fname).stem}_ind{rank}.npz"))
+
+                    idle_total, idle_avg = metrics.idle_time()
+                    wait_total, wait_avg = metrics.waiting_time()
+                    if store:
+                        store.put(ind_hash, inst, ENGINE_VERSION, ms, idle_avg, wait_avg, elapsed, rule=str(ind))
 
                 sum_ms   += ms
                 sum_idle += idle_avg
@@ -174,11 +150,19 @@ def main() -> None:
                       f"Wait_avg={wait_avg:>7.2f} | "
                       f"T={elapsed:.3f}s")
 
+                if ROBUSTNESS_REPLICATIONS > 0:
+                    rob = robustness(ind, inst, toolbox, ROBUSTNESS_REPLICATIONS, seed=SCENARIO_SEED)
+                    rob_line = (f"Robustness({rob['n']}): MS_mean={rob['mean']:.2f}, MS_std={rob['std']:.2f}, "
+                                f"MS_p95={rob['p95']:.2f}, MS_max={rob['max']:.2f}")
+                    outf.write(f"  {rob_line}\n")
+                    print(f"    {rob_line}")
+
                 # Gantt (opţional)
-                gantt_name = f"{Path(fname).stem}_ind{rank}.png"
-                plot_gantt(ms, sched, nm, ev_cp["breakdowns"],
-                           title=f"{fname} – ind{rank} (MS={ms})",
-                           save_path=GANTT_DIR / gantt_name)
+                if sched is not None:
+                    gantt_name = f"{Path(fname).stem}_ind{rank}.png"
+                    plot_gantt(ms, sched, inst.num_machines, inst.breakdowns,
+                               title=f"{fname} – ind{rank} (MS={ms})",
+                               save_path=GANTT_DIR / gantt_name)
 
             n_tests = len(test_insts) or 1
             avg_ms     = sum_ms   / n_tests
@@ -198,6 +182,9 @@ def main() -> None:
             print(f"  Average Wait  = {avg_wait:.2f}")
             print(f"  Average T     = {avg_time:.3f}s")
 
+    if store:
+        store.close()
+
     print(f"\nRezultatele au fost scrise în '{RESULTS_FILE}'.")
     print(f"Durata totală: {time.time() - global_start:.1f}s")
 
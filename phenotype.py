@@ -0,0 +1,53 @@
+import random
+
+from deap import creator, gp
+
+from rule_compiler import compile_rule
+from scheduler import evaluate_individual
+
+# Reguli de referință care generează situațiile de decizie: SPT, FIFO (cel mai vechi în coadă), LWKR
+REFERENCE_RULES = ("PT", "neg(TQ)", "RPT")
+
+
+def sample_decision_situations(instances, toolbox, n_situations=200, reference_rules=REFERENCE_RULES, seed=0):
+    """
+    Rulează regulile de referință pe instanțele de antrenare și eșantionează (seeded)
+    `n_situations` situații de decizie; fiecare situație este tuplul vectorilor
+    (PT, RO, MW, TQ, WIP, RPT[, NQ, NPT, JW, SL]) ai candidaților, în ordinea de departajare.
+    """
+    situations = []
+    for expr_str in reference_rules:
+        rule = creator.Individual(gp.PrimitiveTree.from_string(expr_str, toolbox.pset))
+        for instance in instances:
+            evaluate_individual(rule, instance, toolbox, decision_log=situations)
+    rng = random.Random(seed)
+    if len(situations) > n_situations:
+        situations = rng.sample(situations, n_situations)
+    return situations
+
+
+class PhenotypeCache:
+    """
+    Semnătura comportamentală a unei reguli: indexul candidatului ales în fiecare
+    situație de decizie eșantionată (-1 dacă nicio prioritate nu e finită).
+    Indivizii cu aceeași semnătură ca unul deja evaluat îi moștenesc fitness-ul.
+    """
+
+    def __init__(self, instances, toolbox, n_situations=200, seed=0):
+        self.situations = sample_decision_situations(instances, toolbox, n_situations=n_situations, seed=seed)
+        self.fitness = {}
+
+    def signature(self, individual, toolbox):
+        rule = compile_rule(individual, toolbox)
+        chosen = []
+        for candidates in self.situations:
+            best_idx, best_priority = -1, float('inf')
+            for idx, features in enumerate(candidates):
+                try:
+                    priority = rule(*features)
+                except Exception:
+                    priority = float('inf')
+                if priority < best_priority:  # la egalitate rămâne primul (jobul cu index mic)
+                    best_idx, best_priority = idx, priority
+            chosen.append(best_idx)
+        return tuple(chosen)
@@ -0,0 +1,93 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+from simple_tree import canonical_key
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    rule_hash      TEXT NOT NULL,
+    instance_hash  TEXT NOT NULL,
+    engine_version TEXT NOT NULL,
+    rule           TEXT,
+    instance_name  TEXT,
+    makespan       REAL,
+    idle_avg       REAL,
+    wait_avg       REAL,
+    elapsed        REAL,
+    created        REAL,
+    PRIMARY KEY (rule_hash, instance_hash, engine_version)
+)
+"""
+
+
+def rule_hash(rule):
+    """
+    Hash-ul unei reguli: pentru un individ GP, al formei canonice (`simple_tree.canonical_key`),
+    deci regulile rank-echivalente împart rezultatele; pentru o regulă clasică, al numelui.
+    """
+    text = rule if isinstance(rule, str) else canonical_key(rule)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class ResultStore:
+    """
+    Rezultate per (regulă, instanță, versiune simulator) într-o bază SQLite locală:
+    makespan, Idle_avg, Wait_avg și timpul simulării. Scrierile sunt ținute în
+    memorie și scrise în loturi de `batch_size` (sau la `flush()`/`close()`).
+
+    Folosire:
+        with ResultStore("rezultate/results.sqlite") as store:
+            row = store.get(rule_hash(ind), instance.content_hash, ENGINE_VERSION)
+            if row is None:
+                ...simulare...
+                store.put(rule_hash(ind), instance, ENGINE_VERSION, ms, idle_avg, wait_avg, elapsed, rule=str(ind))
+    """
+
+    def __init__(self, path, batch_size=256):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+        self._pending = {}
+
+    def get(self, r_hash, instance_hash, engine_version):
+        """Întoarce (makespan, idle_avg, wait_avg, elapsed) sau None."""
+        key = (r_hash, instance_hash, engine_version)
+        if key in self._pending:
+            return self._pending[key][5:9]
+        row = self._conn.execute(
+            "SELECT makespan, idle_avg, wait_avg, elapsed FROM results "
+            "WHERE rule_hash = ? AND instance_hash = ? AND engine_version = ?", key).fetchone()
+        return tuple(row) if row is not None else None
+
+    def put(self, r_hash, instance, engine_version, makespan, idle_avg, wait_avg, elapsed, rule=None):
+        key = (r_hash, instance.content_hash, engine_version)
+        self._pending[key] = key + (rule, instance.name, float(makespan), float(idle_avg), float(wait_avg),
+                                    float(elapsed), time.time())
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO results (rule_hash, instance_hash, engine_version, rule, instance_name, "
+                "makespan, idle_avg, wait_avg, elapsed, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                list(self._pending.values()))
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,94 @@
+import threading
+from collections import OrderedDict
+
+
+class RuleCache:
+    """
+    Cache LRU de reguli compilate, cu cheia `str(individual)`.
+
+    Regula compilată este un lambda cu argumentele pozițional în ordinea din pset
+    (PT, RO, MW, TQ, WIP, RPT[, NQ, NPT, JW, SL]), deci poate fi apelată direct
+    `rule(PT, RO, MW, TQ, WIP, RPT)`, fără cost de keyword-uri. Un individ este compilat o singură dată și refolosit
+    pentru toate instanțele pe care este evaluat.
+    `context` înlocuiește `pset.context` (de ex. primitivele NumPy din `gp_setup`).
+    """
+
+    def __init__(self, pset, maxsize=10000, context=None):
+        self.pset = pset
+        self.context = pset.context if context is None else context
+        self.maxsize = maxsize
+        self.args = ",".join(pset.arguments)
+        self._rules = OrderedDict()
+        self._lock = threading.Lock()  # backend-ul "thread" folosește cache-ul din mai multe fire
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._rules)
+
+    def _store(self, key, rule):
+        self._rules[key] = rule
+        self._rules.move_to_end(key)
+        while len(self._rules) > self.maxsize:
+            self._rules.popitem(last=False)
+
+    def get(self, individual):
+        """Întoarce regula compilată (pozițională) pentru `individual`, compilând-o la nevoie."""
+        key = str(individual)
+        with self._lock:
+            rule = self._rules.get(key)
+            if rule is not None:
+                self._rules.move_to_end(key)
+                self.hits += 1
+                return rule
+            self.misses += 1
+        rule = eval(f"lambda {self.args}: {key}", self.context, {})
+        with self._lock:
+            self._store(key, rule)
+        return rule
+
+    def compile_many(self, individuals):
+        """
+        Compilează într-un singur `exec` toți indivizii care nu sunt încă în cache
+        (de ex. o generație întreagă, înainte de evaluare).
+        """
+        with self._lock:
+            keys = list(dict.fromkeys(key for key in map(str, individuals) if key not in self._rules))
+        if not keys:
+            return
+        src = "def _batch():\n    return (\n" + "".join(
+            f"        lambda {self.args}: {key},\n" for key in keys) + "    )\n"
+        namespace = {}
+        exec(src, self.context, namespace)
+        rules = namespace["_batch"]()
+        with self._lock:
+            for key, rule in zip(keys, rules):
+                self._store(key, rule)
+
+
+def compile_rule(individual, toolbox):
+    """Regula pozițională pentru `individual`, din `toolbox.rule_cache` dacă există."""
+    rule_cache = getattr(toolbox, "rule_cache", None)
+    if rule_cache is not None:
+        return rule_cache.get(individual)
+    return toolbox.compile(expr=individual)
+
+
+def compile_numpy_rule(individual, toolbox):
+    """
+    Regula pozițională pentru `individual`, compilată cu primitivele NumPy
+    (`toolbox.np_rule_cache`): acceptă vectori pentru fiecare argument.
+    """
+    rule_cache = getattr(toolbox, "np_rule_cache", None)
+    if rule_cache is not None:
+        return rule_cache.get(individual)
+    from gp_setup import NUMPY_PRIMITIVES
+    args = ",".join(toolbox.pset.arguments)
+    return eval(f"lambda {args}: {individual}", dict(toolbox.pset.context, **NUMPY_PRIMITIVES), {})
+
+
+def precompiling_map(base_map, rule_cache, func, individuals):
+    """`toolbox.map` care compilează mai întâi toată generația într-un singur `exec`."""
+    individuals = list(individuals)
+    rule_cache.compile_many(individuals)
+    return base_map(func, individuals)
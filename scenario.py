@@ -0,0 +1,116 @@
+import functools
+import math
+
+import numpy as np
+
+from batch_engine import evaluate_replications, replication_stats
+from data_reader import EVENT_ADDED_JOB, EVENT_BREAKDOWN, EVENT_CANCEL_JOB
+
+# Fluxurile aleatoare ale unui scenariu; fiecare mașină are propriul flux de defecte,
+# deci adăugarea unei mașini sau a unui job nu schimbă realizările celorlalte.
+STREAM_BREAKDOWNS = 0
+STREAM_ARRIVALS = 1
+
+
+def _rng(instance, seed, index, stream, key=0):
+    return np.random.default_rng(np.random.SeedSequence(
+        [int(seed), int(index), int(instance.content_hash[:8], 16), stream, int(key)]))
+
+
+def scenario_horizon(instance):
+    """Orizontul defectelor: `max_time_horizon` din parametri, altfel încărcarea medie sau ultimul eveniment."""
+    horizon = instance.params.get("max_time_horizon")
+    if horizon:
+        return float(horizon)
+    load = float(instance.op_min_ptime.sum()) / max(1, instance.num_machines)
+    last_event = float(instance.ev_time[-1]) if instance.num_events else 0.0
+    return max(load, last_event)
+
+
+def event_rates(instance):
+    """
+    (MTTF, MTTR, interval mediu între sosiri) ai instanței. Din `params` (fișierele .json:
+    `mean_time_to_failure`, `mean_repair_time`, `machine_util`), altfel estimate din
+    evenimentele instanței; None pentru un flux fără evenimente.
+    """
+    params = instance.params
+    mttf, mttr = params.get("mean_time_to_failure"), params.get("mean_repair_time")
+    if not (mttf and mttr):
+        mttf = mttr = None
+        n_bd = 0
+        down = 0.0
+        for intervals in instance.breakdowns.values():
+            for (start, end) in intervals:
+                n_bd += 1
+                down += end - start
+        if n_bd:
+            mttr = down / n_bd
+            mttf = max(1.0, (scenario_horizon(instance) * instance.num_machines - down) / n_bd)
+
+    n_added = instance.num_jobs - instance.num_initial_jobs
+    interarrival = None
+    if n_added:
+        util = params.get("machine_util")
+        if util:
+            alt_count = np.maximum(np.diff(instance.op_alt_ptr), 1)
+            op_mean = np.add.reduceat(instance.alt_ptime, instance.op_alt_ptr[:-1]) / alt_count \
+                if len(instance.alt_ptime) else np.zeros(instance.num_ops)
+            op_mean[np.diff(instance.op_alt_ptr) == 0] = 0.0
+            interarrival = float(op_mean.sum()) / instance.num_jobs / (float(util) * instance.num_machines)
+        else:
+            interarrival = max(instance.job_arrival[instance.num_initial_jobs:]) / n_added
+        interarrival = max(1.0, interarrival)
+    return mttf, mttr, interarrival
+
+
+@functools.lru_cache(maxsize=256)
+def realize_scenario(instance, seed, index):
+    """
+    Scenariul `index` al instanței: defectele (proces de reînnoire alternant pe fiecare mașină,
+    funcționare ~ Exp(MTTF), reparație ~ Exp(MTTR), până la `scenario_horizon`) și sosirile
+    joburilor adăugate (intervale ~ Exp, în aceeași ordine) sunt eșantionate din nou; anulările
+    rămân cele din fișier. Timpii sunt rotunjiți în sus, ca la citirea fișierelor.
+
+    Aceeași pereche (`seed`, `index`) dă același scenariu în orice proces (numere aleatoare
+    comune), deci toți indivizii unei generații sunt comparați pe aceleași evenimente.
+    """
+    mttf, mttr, interarrival = event_rates(instance)
+    rows = []
+    if mttf is not None:
+        horizon = scenario_horizon(instance)
+        for m in range(instance.num_machines):
+            rng = _rng(instance, seed, index, STREAM_BREAKDOWNS, m)
+            t = 0.0
+            while True:
+                start = math.ceil(t + rng.exponential(mttf))
+                if start >= horizon:
+                    break
+                end = start + max(1, math.ceil(rng.exponential(mttr)))
+                rows.append((float(start), EVENT_BREAKDOWN, m, float(end)))
+                t = end
+
+    job_arrival = list(instance.job_arrival_list)
+    if interarrival is not None:
+        rng = _rng(instance, seed, index, STREAM_ARRIVALS)
+        gaps = rng.exponential(interarrival, instance.num_jobs - instance.num_initial_jobs)
+        arrivals = np.maximum(1.0, np.ceil(np.cumsum(gaps)))
+        for job, arrival in enumerate(arrivals.tolist(), start=instance.num_initial_jobs):
+            job_arrival[job] = arrival
+            rows.append((arrival, EVENT_ADDED_JOB, job, 0.0))
+
+    rows.extend(row for row in instance.event_rows if row[1] == EVENT_CANCEL_JOB)
+    return instance.with_events(rows, job_arrival, name=f"{instance.name}@{seed}:{index}")
+
+
+def robustness(individual, instance, toolbox, n_replications=100, seed=0):
+    """
+    Robustețea unei reguli pe instanță: makespan-urile pe scenariile `(seed, 0..n_replications-1)`,
+    simulate împreună (`batch_engine.evaluate_replications`), plus statisticile lor
+    (`batch_engine.replication_stats`), în dicționarul întors sub cheia "makespans".
+    Scenariile nu trec prin cache-ul lui `realize_scenario`, ca să nu le scoată pe cele de antrenare.
+    """
+    replications = [realize_scenario.__wrapped__(instance, seed, index) for index in range(n_replications)]
+    makespans = evaluate_replications(individual, replications, toolbox)
+    stats = replication_stats(makespans)
+    stats["makespans"] = makespans
+    return stats
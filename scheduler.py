@@ -1,372 +1,1009 @@
-class MachineState:
+import copy
+import heapq
+import itertools
+import math
+import time
+
+import numpy as np
+
+from data_reader import EVENT_BREAKDOWN, EVENT_ADDED_JOB, EVENT_CANCEL_JOB
+from rule_compiler import compile_rule, compile_numpy_rule
+
+# Versiunea semanticii simulării; se schimbă când se schimbă rezultatele (invalidează `result_store`)
+ENGINE_VERSION = "gp-event-1"
+
+# De la câte perechi (candidat, mașină liberă) într-un pas regula se evaluează vectorizat
+VECTORIZE_MIN_CANDIDATES = 32
+
+# De la câte mașini finalizările și mașinile libere ale unui pas se caută cu operații pe tablouri
+VECTORIZE_MIN_MACHINES = 100
+
+MAX_TIME_LIMIT = 200000.0  # Limita de siguranță a timpului de simulare
+
+
+def penalized_makespan(makespan, horizon, completed_ops, total_ops):
+    """
+    Makespan-ul unei simulări oprite la orizontul `horizon` (vezi `Simulator`): cel puțin
+    orizontul, plus orizontul ponderat cu fracțiunea operațiilor neterminate. O simulare
+    oprită este deci mai slabă decât orice simulare terminată înainte de orizont, iar între
+    cele oprite contează progresul.
+    """
+    remaining = 1.0 - completed_ops / total_ops if total_ops > 0 else 0.0
+    return max(makespan, horizon) + remaining * horizon
+
+
+class MachineArrays:
     """
-    Clasă simplă pentru reținerea stării unei mașini.
-    Include un camp `id` pentru a evita `machines.index(...)`.
+    Starea mașinilor ca tablouri paralele indexate după mașină (în loc de un obiect per mașină):
+    - `op`: operația în curs (id plat), -1 dacă mașina e liberă;
+    - `start`, `end`: intervalul operației în curs; `end` este inf pe mașinile libere, deci
+      finalizările unui pas sunt o singură comparație pe tot tabloul;
+    - `broken_until`: mașina e defectă până la acest timp (0 dacă nu a fost defectă);
+    - `idle_since`: momentul când a devenit ultima dată liberă.
     """
 
-    def __init__(self, machine_id):
-        self.id = machine_id
-        self.busy = False
-        self.job_id = None
-        self.op_idx = None
-        self.time_remaining = 0
-        self.broken_until = 0   # mașina e defectă până la acest timp
-        self.start_time = 0     # momentul la care a început operația curentă
-        self.idle_since = 0     # momentul când a devenit ultima dată liberă
+    def __init__(self, num_machines):
+        self.op = np.full(num_machines, -1, dtype=np.int64)
+        self.start = np.zeros(num_machines)
+        self.end = np.full(num_machines, math.inf)
+        self.broken_until = np.zeros(num_machines)
+        self.idle_since = np.zeros(num_machines)
+
+    def release(self, m, idle_since):
+        """Mașina `m` (index sau mască) devine liberă de la `idle_since`."""
+        self.op[m] = -1
+        self.start[m] = 0.0
+        self.end[m] = math.inf
+        self.idle_since[m] = idle_since
+
+    def copy(self):
+        machines = MachineArrays.__new__(MachineArrays)
+        for name in ("op", "start", "end", "broken_until", "idle_since"):
+            setattr(machines, name, getattr(self, name).copy())
+        return machines
+
+
+class SimMetrics:
+    """
+    Metrice acumulate în timpul simulării, la fiecare operație terminată, fără `schedule`.
+    Pe o mașină (și într-un job) operațiile se termină în ordinea startului, deci golurile
+    se adună direct, fără sortarea planificării:
+    - timpul idle al unei mașini: golurile dinaintea operațiilor ei, începând de la 0;
+    - timpul de așteptare al unui job: golurile dinaintea operațiilor lui, începând de la 0.
+    Mediile sunt pe mașinile, respectiv joburile, cu cel puțin o operație terminată.
+    """
+
+    def __init__(self):
+        self.machine_idle = {}      # mașină -> timp idle acumulat
+        self.machine_last_end = {}
+        self.job_wait = {}          # job -> timp de așteptare acumulat
+        self.job_last_end = {}
+
+    def record(self, job, machine, start, end):
+        self.machine_idle[machine] = self.machine_idle.get(machine, 0.0) + max(
+            0.0, start - self.machine_last_end.get(machine, 0.0))
+        self.machine_last_end[machine] = end
+        self.job_wait[job] = self.job_wait.get(job, 0.0) + max(0.0, start - self.job_last_end.get(job, 0.0))
+        self.job_last_end[job] = end
+
+    def idle_time(self):
+        """(total, medie) a timpului idle pe mașini."""
+        total = sum(self.machine_idle.values())
+        return total, total / len(self.machine_idle) if self.machine_idle else 0.0
+
+    def waiting_time(self):
+        """(total, medie) a timpului de așteptare pe joburi."""
+        total = sum(self.job_wait.values())
+        return total, total / len(self.job_wait) if self.job_wait else 0.0
 
 
-def evaluate_individual(individual, jobs, num_machines, events, toolbox, max_time=999999.0):
+class SimCounters:
     """
-    Rulează simularea discretă a FJSP (inclusiv evenimente dinamice și ETPC)
-    folosind regula de dispecerizare compilată din `individual` (GP).
-    Returnează (makespan, schedule).
+    Contoarele de performanță ale simulării (argumentul `counters` al `Simulator`), acumulate
+    peste oricâte rulări:
+    - `ticks`: momentele procesate de bucla principală;
+    - `events`: evenimentele externe procesate (defecte, sosiri, anulări);
+    - `candidates`: prioritățile calculate (perechi candidat-mașină evaluate de regulă);
+    - `rule_calls`: apelurile regulii compilate (un apel NumPy evaluează mai mulți candidați);
+    - `rule_errors`: apelurile regulii terminate cu excepție (prioritate inf);
+    - `phase_time`: cu `timed`, secundele petrecute în pașii (A) evenimente, (B) mașini,
+      (C) alocare, (D) terminare și saltul la momentul următor.
+    """
+
+    PHASES = ("A", "B", "C", "D")
+
+    def __init__(self, timed=False):
+        self.timed = timed
+        self.ticks = 0
+        self.events = 0
+        self.candidates = 0
+        self.rule_calls = 0
+        self.rule_errors = 0
+        self.phase_time = [0.0, 0.0, 0.0, 0.0]
+
+    def add(self, other):
+        """Adună contoarele altui `SimCounters`."""
+        self.ticks += other.ticks
+        self.events += other.events
+        self.candidates += other.candidates
+        self.rule_calls += other.rule_calls
+        self.rule_errors += other.rule_errors
+        self.phase_time = [a + b for a, b in zip(self.phase_time, other.phase_time)]
+        return self
+
+    def as_dict(self):
+        row = {"ticks": self.ticks, "events": self.events, "candidates": self.candidates,
+               "rule_calls": self.rule_calls, "rule_errors": self.rule_errors}
+        if self.timed:
+            row.update({f"t_{phase}": round(t, 4) for phase, t in zip(self.PHASES, self.phase_time)})
+        return row
+
+    def report(self):
+        """Rezumatul pe un rând, cu ponderea fiecărui pas în timpul măsurat."""
+        line = (f"ticks={self.ticks} events={self.events} candidates={self.candidates} "
+                f"rule_calls={self.rule_calls} rule_errors={self.rule_errors}")
+        total = sum(self.phase_time)
+        if self.timed and total > 0.0:
+            line += " | " + " ".join(f"{phase}={t / total:.0%}" for phase, t in zip(self.PHASES, self.phase_time))
+            line += f" ({total:.3f}s)"
+        return line
+
+
+class DecisionTrace:
+    """
+    Urma compactă a deciziilor unei simulări: pentru fiecare decizie (o mașină liberă cu
+    candidați) momentul, MW, WIP, NQ și jobul ales (-1 dacă nicio prioritate nu a fost
+    finită); pentru fiecare candidat jobul, operația, timpul pe mașină și effective_ready_time.
+    Vectorii terminalelor se reconstruiesc o singură dată, vectorizat, în `arrays()`.
+    Simularea este deterministă, deci două reguli care iau aceleași decizii au aceeași
+    evoluție; urma unei reguli arată prima decizie în care alta ar alege diferit
+    (vezi `divergence.ResumeCache`).
+    `prefix` (rezultatul `arrays()` al altei urme) și `n_decisions` preiau primele decizii ale acesteia.
+    """
+
+    def __init__(self, instance, extended=False, prefix=None, n_decisions=0):
+        self.instance = instance
+        self.extended = extended
+        self.decisions = []   # (timp, MW, WIP, NQ, job ales)
+        self.counts = []      # numărul candidaților deciziei
+        self.candidates = []  # (op, ptime)
+        self.jobs = []
+        self.ready = []       # effective_ready_time al candidatului
+        self._prefix = None
+        if prefix is not None and n_decisions:
+            times, offsets, rows, jobs, chosen = prefix
+            end = offsets[n_decisions]
+            self._prefix = (times[:n_decisions], offsets[:n_decisions + 1], rows[:end], jobs[:end],
+                            chosen[:n_decisions])
+
+    def __len__(self):
+        return len(self.decisions) + (len(self._prefix[0]) if self._prefix is not None else 0)
+
+    def arrays(self):
+        """(times [D], offsets [D+1], rows [R, nr. terminale], jobs [R], chosen [D]) ca tablouri NumPy."""
+        instance = self.instance
+        width = 10 if self.extended else 6
+        decisions = np.asarray(self.decisions, dtype=np.float64).reshape(-1, 5)
+        counts = np.asarray(self.counts, dtype=np.int64)
+        cand = np.asarray(self.candidates, dtype=np.float64).reshape(-1, 2)
+        ops = cand[:, 0].astype(np.int64)
+        jobs = np.asarray(self.jobs, dtype=np.int64)
+        dec = np.repeat(np.arange(len(counts)), counts)
+        t1 = decisions[dec, 0] + 1.0
+        wait = t1 - np.asarray(self.ready, dtype=np.float64)
+        rows = np.empty((len(ops), width))
+        rows[:, 0] = cand[:, 1]
+        rows[:, 1] = instance.op_ro[ops]
+        rows[:, 2] = decisions[dec, 1]
+        rows[:, 3] = np.where(wait > 0.0, wait, 0.0)
+        rows[:, 4] = decisions[dec, 2]
+        rows[:, 5] = instance.op_rpt[ops]
+        if self.extended:
+            rows[:, 6] = decisions[dec, 3]
+            rows[:, 7] = instance.op_next_ptime[ops]
+            rows[:, 8] = instance.job_weight[jobs]
+            rows[:, 9] = instance.op_slack[ops] - t1
+        times = decisions[:, 0]
+        chosen = decisions[:, 4].astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        if self._prefix is not None:
+            p_times, p_offsets, p_rows, p_jobs, p_chosen = self._prefix
+            times = np.concatenate((p_times, times))
+            offsets = np.concatenate((p_offsets, p_offsets[-1] + offsets[1:]))
+            rows = np.concatenate((p_rows, rows))
+            jobs = np.concatenate((p_jobs, jobs))
+            chosen = np.concatenate((p_chosen, chosen))
+        return times, offsets, rows, jobs, chosen
+
+
+class Simulator:
+    """
+    Simularea discretă a FJSP (inclusiv evenimente dinamice și ETPC) cu regula de
+    dispecerizare compilată dintr-un individ GP, ca obiect cu stare.
+
+    Simularea este bazată pe evenimente: timpul sare direct la următorul moment
+    în care se poate schimba ceva (final de operație, început/final de defect,
+    sosire sau anulare de job, momentul în care o operație devine eligibilă din
+    cauza ETPC), luat dintr-o coadă de priorități. Pașii (A)-(D) sunt aceiași ca
+    în varianta cu tick-uri unitare, deci pe instanțe cu timpi întregi planificarea
+    rezultată este identică; timpii ne-întregi ai evenimentelor sunt acceptați.
+
+    `run(until)` procesează momentele <= `until` și se oprește înaintea primului moment
+    mai mare (`done` rămâne False), deci simularea poate fi continuată cu alt `run()`.
+    `snapshot()` copiază starea curentă într-un `SimSnapshot`, din care `fork()` pornește
+    oricâte simulări noi, eventual cu altă regulă (de ex. mai multe reguli sau rollout-uri
+    din aceeași stare intermediară, fără reluarea de la t=0). `fork()` pe simulator este
+    `snapshot().fork()`. Instanța compilată (tablourile read-only) este partajată de toate
+    copiile; se copiază doar starea de simulare (liste, cozi, mașini).
 
     Presupuneri:
-    - `jobs`: Lista inițială de joburi, unde fiecare job este un OpsList
-              (List[List[Tuple[int, int]]]). Această listă este extinsă dinamic.
-    - `events`: Un dicționar ce conține:
-        - `events['breakdowns']`: {m_id: [(start, end), ...]}
-        - `events['added_jobs']`: List[Tuple[ArrivalTime, OpsList]]
-        - `events['cancelled_jobs']`: List[Tuple[CancelTime, SimJobIdx]]
-        - `events['etpc_constraints']`: List[Dict], unde fiecare dicționar este
-          {"fore_job": SimJobIdx1, "fore_op_idx": OpIdx1,
-           "hind_job": SimJobIdx2, "hind_op_idx": OpIdx2, "time_lapse": N}.
-          `SimJobIdx1` și `SimJobIdx2` sunt indecși de simulare.
-        - `events['all_jobs_properties']` (opțional, folosit pentru maparea ID-urilor originale
-          dacă `etpc_constraints` ar folosi ID-uri originale, dar NU este folosit direct
-          în această implementare a ETPC dacă presupunem indecși de simulare în constrângeri).
+    - `instance`: `CompiledInstance` (vezi `data_reader.compile_instance`), citit fără
+      copiere. Joburile adăugate dinamic au deja indexul de simulare (după joburile
+      inițiale, în ordinea sosirii), evenimentele sunt pre-sortate în `event_rows`,
+      iar constrângerile ETPC sunt indexate pe id-uri plate de operații
+      (`op = job_op_ptr[job] + op_idx`) în `etpc_out` (vederea CSR-ului ETPC).
+    - `schedule` conține tuple (job, op_idx, mașină, start, end); cu `record_schedule=False`
+      nu se construiește (None); antrenarea folosește doar makespan-ul.
+    - `metrics`: un `SimMetrics` completat în timpul simulării (timpi idle și de așteptare),
+      deci metricele nu cer planificarea.
     - `max_time`: Timpul maxim de simulare.
+    - `horizon`: orizontul de siguranță al evaluării; simularea care îl depășește se oprește
+      (`capped`), iar `result()` întoarce makespan-ul penalizat (`penalized_makespan`).
+      Folosit la antrenare pentru regulile patologice (vezi `evaluator.HorizonCap`).
+    - `decision_log`: dacă e o listă, pentru fiecare decizie cu cel puțin doi candidați se
+      adaugă tuplul vectorilor (PT, RO, MW, TQ, WIP, RPT[, NQ, NPT, JW, SL]) ai candidaților,
+      în ordinea jobului (ordinea de departajare); folosit de `phenotype` pentru semnăturile
+      comportamentale.
+    - `trace`: un `DecisionTrace` în care se înregistrează toate deciziile.
+    - `recorder`: un `flight_recorder.FlightRecorder`, bufferul circular al deciziilor (moment,
+      mașină, operația aleasă, nr. candidați, prioritatea câștigătoare, marja față de a doua)
+      și al întreruperilor, din care `flight_recorder.replay_schedule` reconstruiește planificarea.
+    - `counters`: un `SimCounters` în care se adună contoarele buclei (momente, evenimente,
+      candidați, apeluri și erori ale regulii) și, cu `counters.timed`, timpii pașilor (A)-(D).
+
+    Starea mașinilor este un `MachineArrays` (tablouri paralele). Pe instanțele cu cel puțin
+    `VECTORIZE_MIN_MACHINES` mașini, reparațiile, finalizările și mașinile libere ale unui pas
+    se găsesc cu operații pe tablouri; pe cele mici, bucla Python pe vederile memoryview este
+    mai ieftină decât apelurile NumPy.
+
+    Pe instanțele job shop (`instance.is_jsp`, detectat de `data_reader`), fiecare operație
+    eligibilă intră direct în coada singurei ei mașini.
+
+    Terminalele sunt întreținute incremental: WIP este un contor al mașinilor ocupate,
+    RO, RPT, NPT, JW și baza slack-ului sunt tabele calculate la compilarea instanței,
+    iar NQ este lungimea cozii mașinii. Cu `toolbox.extended_terminals` regula primește și
+    NQ, NPT, JW și SL (vezi `gp_setup.create_pset`).
+
+    În pașii cu cel puțin `VECTORIZE_MIN_CANDIDATES` perechi (candidat, mașină liberă),
+    regula compilată cu primitivele NumPy este apelată o singură dată pe matricea
+    caracteristicilor tuturor perechilor (vezi `allocate_vectorized`); alegerile sunt
+    aceleași ca în bucla pe candidați.
     """
-    MAX_TIME_LIMIT = 200000.0  # Limita de siguranță a timpului de simulare
-    dispatch_rule = toolbox.compile(expr=individual)
-
-    # --- Inițializare și Pre-procesare ETPC ---
-    etpc_map = {}  # (fore_job_sim_idx, fore_op_idx) -> List[(hind_job_sim_idx, hind_op_idx, time_lapse)]
-    if 'etpc_constraints' in events and isinstance(events['etpc_constraints'], list):
-        for constr in events['etpc_constraints']:
-            try:
-                # Validam tipurile si existenta cheilor pentru ETPC
-                fj = int(constr['fore_job'])
-                fo = int(constr['fore_op_idx'])
-                hj = int(constr['hind_job'])
-                ho = int(constr['hind_op_idx'])
-                tl = float(constr['time_lapse'])  # Permitem float pentru lapse
-                if tl < 0: tl = 0.0  # Timpul de decalaj nu poate fi negativ
-
-                fore_key = (fj, fo)
-                if fore_key not in etpc_map:
-                    etpc_map[fore_key] = []
-                etpc_map[fore_key].append((hj, ho, tl))
-            except (KeyError, ValueError, TypeError) as e_etpc:
-                print(f"   Warning: Skipping invalid ETPC constraint {constr}: {e_etpc}")
-
-    min_start_due_to_etpc = {}
-    job_internal_pred_finish_time = {}
-    effective_ready_time = {}
-
-    # --- Transformarea evenimentelor standard intr-o lista sortata ---
-    event_list = []
-    if "breakdowns" in events and isinstance(events["breakdowns"], dict):
-        for m_id, bd_list in events["breakdowns"].items():
-            if isinstance(bd_list, list):
-                for item in bd_list:
-                    if isinstance(item, tuple) and len(item) == 2:
-                        bd_start, bd_end = item
-                        event_list.append((float(bd_start), "breakdown", int(m_id), float(bd_end)))
-
-    if "added_jobs" in events and isinstance(events["added_jobs"], list):
-        for item in events["added_jobs"]:
-            if isinstance(item, tuple) and len(item) == 2:
-                add_time, job_ops_list_for_add = item
-                # job_ops_list_for_add ar trebui sa fie OpsList
-                if isinstance(job_ops_list_for_add, list):
-                    event_list.append((float(add_time), "added_job", job_ops_list_for_add))
-
-    if "cancelled_jobs" in events and isinstance(events["cancelled_jobs"], list):
-        for item in events["cancelled_jobs"]:
-            if isinstance(item, tuple) and len(item) == 2:
-                cancel_time, job_id_to_cancel = item
-                event_list.append((float(cancel_time), "cancel_job", int(job_id_to_cancel)))
-
-    event_list.sort(key=lambda e: e[0])
-
-    # --- Inițializare stări simulare ---
-    machines = [MachineState(m) for m in range(num_machines)]
-
-    # `jobs` este lista initiala de OpsList-uri, va fi extinsa.
-    # Cream copii pentru a nu modifica lista originala din `instances`
-    current_jobs_sim = [list(op_list) for op_list in jobs]  # Copie superficiala a OpsList-urilor
-    job_end_time = [0.0] * len(current_jobs_sim)
-    len_jobs = [len(job_op_l) for job_op_l in current_jobs_sim]
-
-    ready_ops = set()
-
-    for j_init_idx, job_op_list_init in enumerate(current_jobs_sim):
-        if job_op_list_init:
-            job_internal_pred_finish_time[(j_init_idx, 0)] = 0.0
-            etpc_min_for_first_op = min_start_due_to_etpc.get((j_init_idx, 0), 0.0)
-            effective_ready_time[(j_init_idx, 0)] = max(0.0, etpc_min_for_first_op)
-            # Adaugam in ready_ops doar daca poate incepe la current_time (0) sau imediat dupa
-            if effective_ready_time[(j_init_idx, 0)] <= 1e-9:  # Practic, la t=0
-                ready_ops.add((j_init_idx, 0))
-            # Daca ETPC impune un start mai tarziu, va fi adaugat cand current_time atinge effective_ready_time
-            # Nu, mai bine il adaugam in ready_ops oricum, iar eligibilitatea se verifica in bucla de alocare
-
-    cancelled_jobs_set = set()
-    rpt_cache = {}
-    event_idx = 0
-    current_time = 0.0
-    completed_ops = 0
-    total_ops = sum(len_j for len_j in len_jobs)
-    schedule = []
-
-    # --- Funcții ajutătoare ---
-    def make_op_ready(j_sim_idx, op_sim_idx, internal_pred_finish_time_val):
-        job_internal_pred_finish_time[(j_sim_idx, op_sim_idx)] = float(internal_pred_finish_time_val)
-        etpc_min_val = min_start_due_to_etpc.get((j_sim_idx, op_sim_idx), 0.0)
-        actual_ready_time = max(float(internal_pred_finish_time_val), float(etpc_min_val))
-        effective_ready_time[(j_sim_idx, op_sim_idx)] = actual_ready_time
-        ready_ops.add((j_sim_idx, op_sim_idx))
-
-    def compute_rpt(job_sim_idx, op_sim_idx):
-        key = (job_sim_idx, op_sim_idx)
-        if key not in rpt_cache:
-            s = 0.0
-            if 0 <= job_sim_idx < len(len_jobs):
-                for k_op_idx in range(op_sim_idx, len_jobs[job_sim_idx]):
-                    # current_jobs_sim[job_sim_idx][k_op_idx] este lista de alternative [(m,p), ...]
-                    if current_jobs_sim[job_sim_idx][k_op_idx]:
-                        s += min(float(p_time) for (_, p_time) in current_jobs_sim[job_sim_idx][k_op_idx])
-            rpt_cache[key] = s
-        return rpt_cache.get(key, 0.0)
-
-    def add_new_job(new_job_ops_list_param, arrival_time_param):
-        nonlocal total_ops
-        new_sim_job_id_val = len(current_jobs_sim)
-        current_jobs_sim.append(new_job_ops_list_param)
-        job_end_time.append(0.0)
-        num_new_ops_val = len(new_job_ops_list_param)
-        len_jobs.append(num_new_ops_val)
-        total_ops += num_new_ops_val
-        if num_new_ops_val > 0:
-            make_op_ready(new_sim_job_id_val, 0, float(arrival_time_param))
-
-    # --- Bucla principală de simulare ---
-    while current_time < float(max_time):
-        if current_time > MAX_TIME_LIMIT:
-            print(
-                f"   Warning: Simulation time limit ({MAX_TIME_LIMIT:.2f}) reached. Makespan: {current_time:.2f}. Aborting.")
-            break
-
-        # (A) Activăm evenimentele la current_time
-        while event_idx < len(event_list) and event_list[event_idx][0] <= current_time:
-            ev_time, ev_type, *ev_data = event_list[event_idx]  # Extragem evenimentul curent
-
-            if abs(ev_time - current_time) < 1e-9:  # Procesam doar evenimente exact la current_time
-                event_idx += 1  # Consumam evenimentul DOAR daca e procesat
-                if ev_type == "breakdown":
-                    m_id, bd_end = ev_data
-                    machine = machines[m_id]
-                    machine.broken_until = max(machine.broken_until, bd_end)
-                    if machine.busy and machine.start_time < machine.broken_until:
-                        #print(f"   Time {current_time:.2f}: M{m_id} breakdown (until {bd_end:.2f}) interrupts J{machine.job_id} Op{machine.op_idx}")
-                        make_op_ready(machine.job_id, machine.op_idx, current_time)
-                        machine.busy = False;
-                        machine.job_id = None;
-                        machine.op_idx = None
-                        machine.time_remaining = 0.0;
-                        machine.start_time = 0.0
-                        machine.idle_since = current_time
-                elif ev_type == "added_job":
-                    add_new_job(ev_data[0], current_time)
-                elif ev_type == "cancel_job":
-                    job_id_to_cancel = ev_data[0]
+
+    def __init__(self, individual, instance, toolbox, max_time=999999.0, decision_log=None,
+                 record_schedule=True, metrics=None, trace=None, horizon=math.inf, recorder=None,
+                 counters=None):
+        self.instance = instance
+        self.toolbox = toolbox
+        self.max_time = max_time
+        self.horizon = horizon
+        self.decision_log = decision_log
+        self.metrics = metrics
+        self.trace = trace
+        self.recorder = recorder
+        self.counters = counters
+        self.set_rule(individual)
+
+        num_ops = instance.num_ops
+        # --- Stări per operație (id plat) ---
+        self.min_start_due_to_etpc = [0.0] * num_ops
+        self.job_internal_pred_finish_time = [None] * num_ops  # None = operația nu a fost încă gata
+        self.effective_ready_time = [math.inf] * num_ops
+        self.effective_ready_arr = np.full(num_ops, math.inf)  # copia NumPy, pentru `allocate_vectorized`
+
+        # --- Trezirile interne (heap): final de operație, final de defect, reîncercare ---
+        # Intrări (timp, seq); evenimentele externe sunt citite din `event_rows` cu `event_idx`.
+        self.wake_queue = []
+        self.event_idx = 0
+        self.seq = 0  # următorul număr de ordine pentru intrările din heap-uri
+
+        # --- Inițializare stări simulare ---
+        self.machines = MachineArrays(instance.num_machines)
+        self.busy_count = 0  # mașinile ocupate (terminalul WIP)
+        self.arrived_jobs = instance.num_initial_jobs  # joburile cu index >= arrived_jobs nu au sosit încă
+        self.job_end_time = [0.0] * instance.num_jobs
+
+        self.ready_ops = set()  # toate operațiile gata (eligibile sau încă blocate de ETPC)
+        # Index pe mașini al operațiilor eligibile: machine_queues[m] = {job: (op, ptime_pe_m)}.
+        # O operație eligibilă apare în coada fiecărei mașini care o poate procesa (ptime > 0);
+        # un job are cel mult o operație gata la un moment dat, deci cheia este jobul.
+        self.machine_queues = [dict() for _ in range(instance.num_machines)]
+        # Calendarul operațiilor gata dar cu effective_ready_time în viitor: heap (timp, seq, op)
+        self.ready_calendar = []
+
+        self.cancelled_jobs_set = set()
+        self.current_time = 0.0
+        self.completed_ops = 0
+        self.total_ops = sum(instance.job_num_ops_list[:self.arrived_jobs])
+        self.schedule = [] if record_schedule else None
+
+        # --- Registrul per job (actualizat la sosire, final de operație și anulare) ---
+        self.job_done_ops = [0] * instance.num_jobs   # operații terminate ale jobului
+        self.job_open = [False] * instance.num_jobs   # sosit, neanulat, cu operații, ultima operație neterminată
+        self.open_jobs = 0                            # numărul joburilor cu job_open adevărat
+
+        self.started = False  # joburile inițiale sunt puse în cozi la primul `run()`
+        self.done = False
+        self.capped = False   # simularea a depășit `horizon`
+
+    def set_rule(self, individual):
+        """Schimbă regula de dispecerizare (se aplică deciziilor de la momentul curent încolo)."""
+        self.individual = individual
+        # Regula compilată (din cache) se apelează pozițional: (PT, RO, MW, TQ, WIP, RPT[, NQ, NPT, JW, SL])
+        self.dispatch_rule = compile_rule(individual, self.toolbox)
+        self.extended = getattr(self.toolbox, "extended_terminals", False)
+        self.vector_rule = None
+        self.uses_nq = self.extended and "NQ" in str(individual)
+        self.uses_wip = "WIP" in str(individual) and not self.uses_nq
+
+    def snapshot(self):
+        """Copia stării curente (vezi `SimSnapshot`)."""
+        return SimSnapshot(self)
+
+    def fork(self, individual=None, **kwargs):
+        """O simulare nouă din starea curentă; argumentele sunt cele ale `SimSnapshot.fork`."""
+        return SimSnapshot(self).fork(individual, **kwargs)
+
+    def run(self, until=math.inf):
+        """
+        Avansează simularea până la terminare sau până la primul moment mai mare decât `until`.
+        Întoarce `self`.
+        """
+        if self.done:
+            return self
+        instance = self.instance
+        max_time = self.max_time
+        horizon = self.horizon
+        decision_log = self.decision_log
+        metrics = self.metrics
+        trace = self.trace
+        recorder = self.recorder
+        counters = self.counters
+        timed = counters is not None and counters.timed
+        dispatch_rule = self.dispatch_rule
+        extended = self.extended
+        vector_rule = self.vector_rule
+        uses_nq = self.uses_nq
+        uses_wip = self.uses_wip
+
+        num_machines = instance.num_machines
+        job_op_ptr = instance.job_op_ptr_list
+        len_jobs = instance.job_num_ops_list
+        op_job = instance.op_job_list
+        op_index = instance.op_index_list
+        op_alternatives = instance.op_alternatives
+        is_jsp = instance.is_jsp
+        op_machine = instance.op_machine_list
+        op_min_ptime = instance.op_min_ptime_list
+        op_rpt = instance.op_rpt_list
+        op_ro = instance.op_ro_list
+        op_next_ptime = instance.op_next_ptime_list
+        job_weight = instance.job_weight_list
+        op_slack = instance.op_slack_list
+        etpc_out = instance.etpc_out
+        event_rows = instance.event_rows
+        num_events = len(event_rows)
+
+        # Starea în variabile locale (bucla de mai jos este fierbinte); scalarii se scriu înapoi la final
+        min_start_due_to_etpc = self.min_start_due_to_etpc
+        job_internal_pred_finish_time = self.job_internal_pred_finish_time
+        effective_ready_time = self.effective_ready_time
+        effective_ready_arr = self.effective_ready_arr
+        wake_queue = self.wake_queue
+        event_idx = self.event_idx
+        event_seq = itertools.count(self.seq)
+        machines = self.machines
+        m_op, m_start, m_end = machines.op, machines.start, machines.end
+        m_broken, m_idle = machines.broken_until, machines.idle_since
+        # Vederi memoryview peste aceleași tablouri, pentru citirile și scrierile pe o singură
+        # mașină (mult mai ieftine decât indexarea NumPy cu un scalar)
+        op_at, start_at, end_at = memoryview(m_op), memoryview(m_start), memoryview(m_end)
+        broken_at, idle_at = memoryview(m_broken), memoryview(m_idle)
+        busy_count = self.busy_count
+        arrived_jobs = self.arrived_jobs
+        job_end_time = self.job_end_time
+        ready_ops = self.ready_ops
+        machine_queues = self.machine_queues
+        ready_calendar = self.ready_calendar
+        cancelled_jobs_set = self.cancelled_jobs_set
+        current_time = self.current_time
+        completed_ops = self.completed_ops
+        total_ops = self.total_ops
+        schedule = self.schedule
+        job_done_ops = self.job_done_ops
+        job_open = self.job_open
+        open_jobs = self.open_jobs
+        vectorize_machines = num_machines >= VECTORIZE_MIN_MACHINES
+        machine_range = range(num_machines)
+        # Margini inferioare ale momentelor în care pasul (B) are ceva de făcut, ca pașii fără
+        # finalizări sau reparații să nu atingă tablourile: next_end pentru cel mai mic `end`,
+        # next_repair pentru cel mai mic `broken_until` nenul încă neatins
+        next_end = m_end.min().item() if num_machines else math.inf
+        pending = m_broken[(m_broken != 0.0) & (m_broken > current_time - 1e-9)]
+        next_repair = pending.min().item() if pending.size else math.inf
+
+        # --- Funcții ajutătoare ---
+        def schedule_wake(wake_time):
+            # Forțează vizitarea momentului `wake_time` (dacă e în viitor)
+            if wake_time > current_time + 1e-9:
+                heapq.heappush(wake_queue, (float(wake_time), next(event_seq)))
+
+        if is_jsp:
+            # Job shop: operația are o singură mașină, deci o singură coadă (fără căutare în alternative)
+            def enqueue_eligible(op):
+                m_op = op_machine[op]
+                if m_op >= 0:
+                    machine_queues[m_op].setdefault(op_job[op], (op, op_min_ptime[op]))
+
+            def dequeue_eligible(op):
+                m_op = op_machine[op]
+                if m_op >= 0:
+                    machine_queues[m_op].pop(op_job[op], None)
+        else:
+            def enqueue_eligible(op):
+                j_sim_idx = op_job[op]
+                for (m_alt, p_alt) in op_alternatives[op]:
+                    if 0 <= m_alt < num_machines and p_alt > 1e-9:
+                        machine_queues[m_alt].setdefault(j_sim_idx, (op, p_alt))
+
+            def dequeue_eligible(op):
+                j_sim_idx = op_job[op]
+                for (m_alt, _p_alt) in op_alternatives[op]:
+                    if 0 <= m_alt < num_machines:
+                        machine_queues[m_alt].pop(j_sim_idx, None)
+
+        def release_or_defer(op):
+            # Operația intră în cozile mașinilor dacă e deja eligibilă, altfel așteaptă în calendar
+            ready_t = effective_ready_time[op]
+            if ready_t <= current_time + 1e-9:
+                enqueue_eligible(op)
+            else:
+                heapq.heappush(ready_calendar, (ready_t, next(event_seq), op))
+
+        def make_op_ready(op, internal_pred_finish_time_val):
+            job_internal_pred_finish_time[op] = float(internal_pred_finish_time_val)
+            effective_ready_time[op] = max(float(internal_pred_finish_time_val), min_start_due_to_etpc[op])
+            effective_ready_arr[op] = effective_ready_time[op]
+            ready_ops.add(op)
+            release_or_defer(op)
+
+        def assign(m, jj_sel, op_sel, ptime_sel):
+            nonlocal busy_count, next_end
+            busy_count += 1
+            start = current_time + 1.0
+            op_at[m] = op_sel
+            start_at[m] = start
+            end_at[m] = start + ptime_sel
+            next_end = min(next_end, start + ptime_sel)
+            dequeue_eligible(op_sel)
+            ready_ops.discard(op_sel)
+            schedule_wake(start + ptime_sel - 1.0)  # pasul (B) în care se finalizează
+
+        def allocate_vectorized(free_machines):
+            # Rândurile matricei (coloane PT, RO, MW, TQ, WIP, RPT[, NQ, NPT, JW, SL]): toate perechile
+            # (candidat, mașină liberă) ale pasului. WIP-ul văzut de o mașină crește cu alocările făcute
+            # înaintea ei în același pas, deci dacă regula folosește WIP, fiecare pereche apare o dată
+            # pentru fiecare decalaj posibil. NQ scade cu joburile luate de mașinile anterioare, deci
+            # regulile care îl folosesc sunt evaluate mașină cu mașină, pe coada rămasă.
+            nonlocal vector_rule
+            if vector_rule is None:
+                vector_rule = self.vector_rule = compile_numpy_rule(self.individual, self.toolbox)
+            t1 = current_time + 1.0
+            wip_now = busy_count
+            # Cozile mașinilor libere, concatenate: rândul = (op, ptime pe mașină)
+            parts = [np.array(list(machine_queues[m].values())) for m in free_machines]
+            r_pos = np.repeat(np.arange(len(parts)), [len(part) for part in parts])
+            pairs = np.concatenate(parts)
+            r_op = pairs[:, 0].astype(np.int64)
+            wait = t1 - effective_ready_arr[r_op]
+            features = np.empty((len(r_op), 10 if extended else 6))
+            features[:, 0] = pairs[:, 1]
+            features[:, 1] = instance.op_ro[r_op]
+            features[:, 2] = (t1 - m_idle[free_machines])[r_pos]
+            features[:, 3] = np.where(wait > 0.0, wait, 0.0)
+            features[:, 4] = wip_now
+            features[:, 5] = instance.op_rpt[r_op]
+            if extended:
+                features[:, 6] = np.asarray([len(part) for part in parts], dtype=np.float64)[r_pos]
+                features[:, 7] = instance.op_next_ptime[r_op]
+                features[:, 8] = instance.job_weight[instance.op_job[r_op]]
+                features[:, 9] = instance.op_slack[r_op] - t1
+            if uses_wip:
+                reps = r_pos + 1
+                take = np.repeat(np.arange(len(r_op)), reps)
+                r_shift = np.arange(take.size) - np.repeat(np.cumsum(reps) - reps, reps)
+                features = features[take]
+                features[:, 4] += r_shift
+                r_op, r_pos = r_op[take], r_pos[take]
+            else:
+                r_shift = np.zeros(len(r_op), dtype=np.int64)
+            r_job = instance.op_job[r_op]
+            bounds = np.searchsorted(r_pos, np.arange(len(free_machines) + 1)).tolist()
+
+            def evaluate_rows(rows):
+                priority_rows = np.empty(len(rows))
+                with np.errstate(all="ignore"):
+                    try:
+                        priority_rows[:] = vector_rule(*rows.T)
+                    except Exception:
+                        priority_rows[:] = np.inf
+                        if counters is not None:
+                            counters.rule_errors += 1
+                if counters is not None:
+                    counters.rule_calls += 1
+                    counters.candidates += len(rows)
+                priority_rows[~(priority_rows < np.inf)] = np.inf  # NaN și +inf nu sunt alese niciodată
+                return priority_rows
+
+            priority = np.full(len(features), np.inf) if uses_nq else evaluate_rows(features)
+
+            if is_jsp and not uses_wip and not uses_nq and trace is None and recorder is None:
+                # Job shop: cozile mașinilor sunt disjuncte și WIP nu intervine, deci alocările
+                # din pas sunt independente; câte o sortare pentru toate mașinile
+                order = np.lexsort((r_job, priority, r_pos))
+                first = np.ones(order.size, dtype=bool)
+                first[1:] = r_pos[order][1:] != r_pos[order][:-1]
+                best = order[first]
+                for pos, i, best_p, jj, op, pt in zip(r_pos[best].tolist(), best.tolist(), priority[best].tolist(),
+                                                      r_job[best].tolist(), r_op[best].tolist(),
+                                                      features[best, 0].tolist()):
+                    if best_p < math.inf:
+                        assign(free_machines[pos], jj, op, pt)
+                    else:
+                        schedule_wake(t1)
+                return
+
+            taken = np.zeros(instance.num_jobs, dtype=bool)
+            assigned = 0
+            for pos, m in enumerate(free_machines):
+                lo, hi = bounds[pos], bounds[pos + 1]
+                sel = lo + np.nonzero(r_shift[lo:hi] == (assigned if uses_wip else 0))[0]
+                if not is_jsp:  # în job shop un job apare în coada unei singure mașini
+                    sel = sel[~taken[r_job[sel]]]
+                if not sel.size:
+                    continue  # coada s-a golit în pasul curent
+                if uses_nq:
+                    rows = features[sel]
+                    rows[:, 4] = wip_now + assigned
+                    rows[:, 6] = sel.size
+                    priority[sel] = evaluate_rows(rows)
+                best = priority[sel].min()
+                i = None
+                if best < math.inf:
+                    winners = sel[priority[sel] == best]
+                    i = int(winners[np.argmin(r_job[winners])])  # la egalitate, jobul cu index mic
+                if trace is not None:
+                    trace.decisions.append((current_time, features[sel[0], 2].item(), wip_now + assigned,
+                                            float(sel.size), r_job[i].item() if i is not None else -1))
+                    trace.counts.append(sel.size)
+                    trace.candidates.extend(zip(r_op[sel].tolist(), features[sel, 0].tolist()))
+                    trace.jobs.extend(r_job[sel].tolist())
+                    trace.ready.extend(effective_ready_arr[r_op[sel]].tolist())
+                if recorder is not None:
+                    runner_up = np.partition(priority[sel], 1)[1].item() if sel.size > 1 else math.inf
+                    recorder.record(current_time, m, r_op[i].item() if i is not None else -1, sel.size,
+                                    best.item(), runner_up - best.item())
+                if i is None:
+                    schedule_wake(t1)  # ca mai jos: toate prioritățile inf/NaN
+                    continue
+                assign(m, r_job[i].item(), r_op[i].item(), features[i, 0].item())
+                taken[r_job[i]] = True
+                assigned += 1
+
+        if not self.started:
+            self.started = True
+            for j_init_idx in range(arrived_jobs):
+                if len_jobs[j_init_idx] > 0:
+                    job_open[j_init_idx] = True
+                    open_jobs += 1
+                    make_op_ready(job_op_ptr[j_init_idx], 0.0)
+
+        # --- Bucla principală de simulare ---
+        paused = False
+        finished = False  # oprită de (D): momentul final a fost procesat
+        events_before = event_idx
+        phase_time = counters.phase_time if timed else None
+        while current_time < float(max_time):
+            if current_time > until:
+                paused = True  # momentul curent rămâne neprocesat; `run()` continuă de aici
+                break
+            if current_time > horizon:
+                self.capped = True
+                break
+            if current_time > MAX_TIME_LIMIT:
+                print(
+                    f"   Warning: Simulation time limit ({MAX_TIME_LIMIT:.2f}) reached. Makespan: {current_time:.2f}. Aborting.")
+                break
+            if counters is not None:
+                counters.ticks += 1
+                if timed:
+                    t_mark = time.perf_counter()
+
+            # (A) Activăm evenimentele la current_time (pre-sortate după timp în instanță)
+            while event_idx < num_events and event_rows[event_idx][0] <= current_time + 1e-9:
+                _ev_time, ev_type, ev_arg0, ev_arg1 = event_rows[event_idx]
+                event_idx += 1
+
+                if ev_type == EVENT_BREAKDOWN:
+                    m_id, bd_end = ev_arg0, ev_arg1
+                    broken_until = max(broken_at[m_id], bd_end)
+                    broken_at[m_id] = broken_until
+                    next_repair = min(next_repair, broken_until)
+                    schedule_wake(bd_end)
+                    op_interrupted = op_at[m_id]
+                    if op_interrupted >= 0 and start_at[m_id] < broken_until:
+                        #print(f"   Time {current_time:.2f}: M{m_id} breakdown (until {bd_end:.2f}) interrupts Op{op_interrupted}")
+                        if recorder is not None:
+                            recorder.record(current_time, m_id, op_interrupted, 0, math.nan, math.nan)
+                        make_op_ready(op_interrupted, current_time)
+                        busy_count -= 1
+                        machines.release(m_id, current_time)
+                elif ev_type == EVENT_ADDED_JOB:
+                    new_sim_job_id = ev_arg0
+                    arrived_jobs = max(arrived_jobs, new_sim_job_id + 1)
+                    total_ops += len_jobs[new_sim_job_id]
+                    if len_jobs[new_sim_job_id] > 0:
+                        if new_sim_job_id not in cancelled_jobs_set and not job_open[new_sim_job_id]:
+                            job_open[new_sim_job_id] = True
+                            open_jobs += 1
+                        make_op_ready(job_op_ptr[new_sim_job_id], current_time)
+                elif ev_type == EVENT_CANCEL_JOB:
+                    job_id_to_cancel = ev_arg0
                     if job_id_to_cancel not in cancelled_jobs_set:
                         cancelled_jobs_set.add(job_id_to_cancel)
-                        for mach_cancel in machines:
-                            if mach_cancel.busy and mach_cancel.job_id == job_id_to_cancel:
-                                mach_cancel.busy = False;
-                                mach_cancel.job_id = None;
-                                mach_cancel.op_idx = None
-                                mach_cancel.time_remaining = 0.0;
-                                mach_cancel.start_time = 0.0
-                                mach_cancel.idle_since = current_time
-                        ready_ops = {(jj, oo) for (jj, oo) in ready_ops if jj != job_id_to_cancel}
-                        ops_done_for_cancelled = 0
-                        for sched_entry in schedule:
-                            if sched_entry[0] == job_id_to_cancel: ops_done_for_cancelled += 1
-                        if 0 <= job_id_to_cancel < len(len_jobs):
+                        first_op_c = job_op_ptr[job_id_to_cancel]
+                        # Mașinile care lucrează la job: operația în curs are id-ul în intervalul jobului
+                        running = (m_op >= first_op_c) & (m_op < first_op_c + len_jobs[job_id_to_cancel])
+                        if running.any():
+                            busy_count -= int(running.sum())
+                            if recorder is not None:
+                                for m in running.nonzero()[0].tolist():
+                                    recorder.record(current_time, m, op_at[m], 0, math.nan, math.nan)
+                            machines.release(running, current_time)
+                        for op_c in range(first_op_c, first_op_c + len_jobs[job_id_to_cancel]):
+                            if op_c in ready_ops:
+                                dequeue_eligible(op_c)
+                                ready_ops.discard(op_c)
+                        if job_open[job_id_to_cancel]:
+                            job_open[job_id_to_cancel] = False
+                            open_jobs -= 1
+                        ops_done_for_cancelled = job_done_ops[job_id_to_cancel]
+                        if 0 <= job_id_to_cancel < arrived_jobs:
                             total_ops_of_cancelled_job = len_jobs[job_id_to_cancel]
                             ops_not_done_and_will_not_be = total_ops_of_cancelled_job - ops_done_for_cancelled
                             if ops_not_done_and_will_not_be > 0: total_ops -= ops_not_done_and_will_not_be
-            elif ev_time < current_time:  # Eveniment din trecut, skip si consuma
-                print(f"   Warning: Skipping past event at time {ev_time:.2f} (current_time is {current_time:.2f})")
-                event_idx += 1
-            else:  # ev_time > current_time
-                break  # Oprim procesarea evenimentelor pentru acest pas de timp
-
-        # (B) Actualizăm starea mașinilor și finalizăm operații
-        for machine in machines:
-            m_id = machine.id
-            if machine.broken_until > current_time + 1e-9: continue  # Daca e inca defecta in intervalul curent
-            if abs(machine.broken_until - current_time) < 1e-9 and machine.broken_until != 0:
-                # A fost defecta PANA ACUM (current_time), devine disponibila de la current_time
-                machine.broken_until = 0.0
-                if not machine.busy: machine.idle_since = current_time
-
-            if machine.busy:
-                machine.time_remaining -= 1.0
-                if machine.time_remaining < 1e-9:  # Aproape de zero
-                    jdone, odone = machine.job_id, machine.op_idx
-                    start_op_time, end_op_time = machine.start_time, current_time + 1.0
-
-                    machine.busy = False;
-                    machine.job_id = None;
-                    machine.op_idx = None
-                    machine.time_remaining = 0.0;
-                    machine.start_time = 0.0
-                    machine.idle_since = end_op_time
 
-                    completed_ops += 1
-                    # Asiguram ca jdone este un index valid pentru job_end_time
-                    if 0 <= jdone < len(job_end_time):
-                        job_end_time[jdone] = end_op_time
-                    else:  # Jobul a fost adaugat si job_end_time nu a fost extins corect - eroare de logica
-                        print(f"   ERROR: jdone index {jdone} out of bounds for job_end_time (len {len(job_end_time)})")
+            if timed:
+                t_now = time.perf_counter()
+                phase_time[0] += t_now - t_mark
+                t_mark = t_now
+
+            # (B) Actualizăm starea mașinilor și finalizăm operații, doar când marginile o cer.
+            # Mașinile încă defecte în intervalul curent sunt sărite; cele defecte PÂNĂ ACUM
+            # (current_time) devin disponibile de la current_time.
+            if next_repair <= current_time + 1e-9:
+                if vectorize_machines:
+                    repaired = (m_broken != 0.0) & (np.abs(m_broken - current_time) < 1e-9)
+                    m_broken[repaired] = 0.0
+                    m_idle[repaired & (m_op < 0)] = current_time
+                    pending = m_broken[m_broken > current_time + 1e-9]
+                    next_repair = pending.min().item() if pending.size else math.inf
+                else:
+                    for m in machine_range:
+                        if broken_at[m] != 0.0 and abs(broken_at[m] - current_time) < 1e-9:
+                            broken_at[m] = 0.0
+                            if op_at[m] < 0:
+                                idle_at[m] = current_time
+                    t_eps = current_time + 1e-9
+                    next_repair = min((b for b in broken_at if b > t_eps), default=math.inf)
+            # Timpul rămas după pasul curent este end - (current_time + 1), aproape de zero la final
+            if next_end - (current_time + 1.0) < 1e-9:
+                if vectorize_machines:
+                    done = m_end - (current_time + 1.0) < 1e-9
+                    if next_repair < math.inf:
+                        done &= m_broken <= current_time + 1e-9
+                    done = done.nonzero()[0].tolist()
+                else:
+                    t1, t_eps = current_time + 1.0, current_time + 1e-9
+                    done = [m for m in machine_range if end_at[m] - t1 < 1e-9 and broken_at[m] <= t_eps]
+                for m_id in done:
+                    op_done, start_op_time, end_op_time = op_at[m_id], start_at[m_id], end_at[m_id]
+                    jdone, odone = op_job[op_done], op_index[op_done]
+                    busy_count -= 1
+                    op_at[m_id] = -1
+                    start_at[m_id] = 0.0
+                    end_at[m_id] = math.inf
+                    idle_at[m_id] = end_op_time
 
-                    schedule.append((jdone, odone, m_id, start_op_time, end_op_time))
+                    completed_ops += 1
+                    job_end_time[jdone] = end_op_time
+                    job_done_ops[jdone] += 1
+                    if odone == len_jobs[jdone] - 1 and job_open[jdone]:
+                        job_open[jdone] = False
+                        open_jobs -= 1
+
+                    if schedule is not None:
+                        schedule.append((jdone, odone, m_id, start_op_time, end_op_time))
+                    if metrics is not None:
+                        metrics.record(jdone, m_id, start_op_time, end_op_time)
                     # print(f"   Time {end_op_time:.2f}: J{jdone} Op{odone} END on M{m_id}. Comp: {completed_ops}/{total_ops}")
 
-                    if (jdone, odone) in etpc_map:
-                        for j_h_etpc, o_h_etpc, lapse_val_etpc in etpc_map[(jdone, odone)]:
-                            new_min_start_for_hind_etpc = end_op_time + lapse_val_etpc
-                            current_etpc_min_for_hind = min_start_due_to_etpc.get((j_h_etpc, o_h_etpc), 0.0)
-                            min_start_due_to_etpc[(j_h_etpc, o_h_etpc)] = max(current_etpc_min_for_hind,
-                                                                              new_min_start_for_hind_etpc)
-
-                            if (j_h_etpc, o_h_etpc) in job_internal_pred_finish_time:
-                                base_jprd_time_etpc = job_internal_pred_finish_time[(j_h_etpc, o_h_etpc)]
-                                effective_ready_time[(j_h_etpc, o_h_etpc)] = max(base_jprd_time_etpc,
-                                                                                 min_start_due_to_etpc[
-                                                                                     (j_h_etpc, o_h_etpc)])
+                    for op_h_etpc, lapse_val_etpc in etpc_out[op_done]:
+                        min_start_due_to_etpc[op_h_etpc] = max(min_start_due_to_etpc[op_h_etpc],
+                                                               end_op_time + lapse_val_etpc)
+                        if job_internal_pred_finish_time[op_h_etpc] is not None:
+                            effective_ready_time[op_h_etpc] = max(job_internal_pred_finish_time[op_h_etpc],
+                                                                  min_start_due_to_etpc[op_h_etpc])
+                            effective_ready_arr[op_h_etpc] = effective_ready_time[op_h_etpc]
+                            if op_h_etpc in ready_ops:
+                                # Termenul ETPC poate amâna o operație deja eligibilă: o scoatem din cozi
+                                dequeue_eligible(op_h_etpc)
+                                release_or_defer(op_h_etpc)
 
                     if odone + 1 < len_jobs[jdone] and jdone not in cancelled_jobs_set:
-                        make_op_ready(jdone, odone + 1, end_op_time)
-
-        # (C) Alocăm operații noi pe mașinile libere
-        for machine in machines:
-            m_id = machine.id
-            if not machine.busy and machine.broken_until <= current_time + 1e-9:  # Daca e libera si nu e defecta (sau devine disponibila exact acum)
-                WIP_val = sum(1 for m2_wip in machines if m2_wip.busy)
-                MW_val = (current_time + 1.0) - machine.idle_since  # Cat timp va fi stat idle pana la startul urm op
+                        make_op_ready(op_done + 1, end_op_time)
+                next_end = m_end.min().item() if vectorize_machines else min(end_at)
+
+            if timed:
+                t_now = time.perf_counter()
+                phase_time[1] += t_now - t_mark
+                t_mark = t_now
+
+            # (C) Alocăm operații noi pe mașinile libere
+            # Operațiile din calendar al căror effective_ready_time a fost atins devin eligibile
+            while ready_calendar and ready_calendar[0][0] <= current_time + 1e-9:
+                cal_ready_t, _cal_seq, op_cal = heapq.heappop(ready_calendar)
+                if op_cal in ready_ops and effective_ready_time[op_cal] == cal_ready_t:
+                    enqueue_eligible(op_cal)
+
+            # Mașinile libere și nedefecte (sau care devin disponibile exact acum), cu candidați
+            if vectorize_machines:
+                free = m_op < 0
+                if next_repair < math.inf:
+                    free &= m_broken <= current_time + 1e-9
+                free_machines = [m for m in free.nonzero()[0].tolist() if machine_queues[m]]
+            else:
+                t_eps = current_time + 1e-9
+                free_machines = [m for m in machine_range
+                                 if machine_queues[m] and op_at[m] < 0 and broken_at[m] <= t_eps]
+            if (decision_log is None and
+                    sum(len(machine_queues[m]) for m in free_machines) >= VECTORIZE_MIN_CANDIDATES):
+                allocate_vectorized(free_machines)
+                free_machines = ()
+
+            for m_id in free_machines:
+                queue_alloc = machine_queues[m_id]
+                if not queue_alloc:
+                    continue  # golită de alocările făcute pe mașinile anterioare
+                WIP_val = busy_count
+                MW_val = (current_time + 1.0) - idle_at[m_id]  # Cat timp va fi stat idle pana la startul urm op
+                NQ_val = float(len(queue_alloc))
 
                 best_candidate_op_alloc = None
                 best_priority_val_alloc = float('inf')
-
-                current_ready_ops_list_alloc = list(ready_ops)
-                for (jj_alloc, oo_alloc) in current_ready_ops_list_alloc:
-                    if jj_alloc in cancelled_jobs_set:
-                        if (jj_alloc, oo_alloc) in ready_ops: ready_ops.remove((jj_alloc, oo_alloc))
-                        continue
-
-                    op_effective_ready_t_alloc = effective_ready_time.get((jj_alloc, oo_alloc), float('inf'))
-                    # Poate incepe la current_time + 1.0 (adica in intervalul [current_time, current_time+1))
-                    if op_effective_ready_t_alloc > current_time + 1.0 - 1e-9:
-                        continue
-
-                    if not (0 <= jj_alloc < len(current_jobs_sim) and 0 <= oo_alloc < len_jobs[jj_alloc]):
-                        # print(f"   Warning: Invalid job/op index ({jj_alloc},{oo_alloc}) in ready_ops. Skipping.")
-                        if (jj_alloc, oo_alloc) in ready_ops: ready_ops.remove((jj_alloc, oo_alloc))
-                        continue
-
-                    current_op_alternatives_alloc = current_jobs_sim[jj_alloc][oo_alloc]
-                    ptime_on_this_machine_alloc = None
-                    for (mach_alt_idx_alloc, p_val_alloc) in current_op_alternatives_alloc:
-                        if mach_alt_idx_alloc == m_id:
-                            ptime_on_this_machine_alloc = float(p_val_alloc);
-                            break
-
-                    if ptime_on_this_machine_alloc is not None and ptime_on_this_machine_alloc > 1e-9:
-                        PT_val = ptime_on_this_machine_alloc
-                        RO_val = len_jobs[jj_alloc] - oo_alloc - 1.0
-                        TQ_val = max(0.0, (current_time + 1.0) - op_effective_ready_t_alloc)
-                        RPT_val = compute_rpt(jj_alloc, oo_alloc)
-
-                        try:
-                            priority = dispatch_rule(PT=PT_val, RO=RO_val, MW=MW_val, TQ=TQ_val, WIP=WIP_val,
-                                                     RPT=RPT_val)
-                        except Exception as e_dispatch:
-                            priority = float('inf')
-
-                        if priority < best_priority_val_alloc:
-                            best_priority_val_alloc = priority
-                            best_candidate_op_alloc = (jj_alloc, oo_alloc, ptime_on_this_machine_alloc)
+                runner_up_priority = float('inf')  # a doua prioritate (pentru `recorder`)
+                if counters is not None:
+                    counters.rule_calls += len(queue_alloc)
+                    counters.candidates += len(queue_alloc)
+
+                # Doar operațiile eligibile pe care m_id le poate procesa; la egalitate câștigă jobul cu index mic
+                for jj_alloc, (op_alloc, ptime_on_this_machine_alloc) in queue_alloc.items():
+                    PT_val = ptime_on_this_machine_alloc
+                    RO_val = op_ro[op_alloc]
+                    TQ_val = max(0.0, (current_time + 1.0) - effective_ready_time[op_alloc])
+                    RPT_val = op_rpt[op_alloc]
+
+                    try:
+                        if extended:
+                            priority = dispatch_rule(PT_val, RO_val, MW_val, TQ_val, WIP_val, RPT_val, NQ_val,
+                                                     op_next_ptime[op_alloc], job_weight[jj_alloc],
+                                                     op_slack[op_alloc] - (current_time + 1.0))
+                        else:
+                            priority = dispatch_rule(PT_val, RO_val, MW_val, TQ_val, WIP_val, RPT_val)
+                    except Exception as e_dispatch:
+                        priority = float('inf')
+                        if counters is not None:
+                            counters.rule_errors += 1
+
+                    if priority < best_priority_val_alloc or (
+                            priority == best_priority_val_alloc and best_candidate_op_alloc is not None
+                            and jj_alloc < best_candidate_op_alloc[0]):
+                        runner_up_priority = best_priority_val_alloc
+                        best_priority_val_alloc = priority
+                        best_candidate_op_alloc = (jj_alloc, op_alloc, ptime_on_this_machine_alloc)
+                    elif priority < runner_up_priority:
+                        runner_up_priority = priority
+
+                if decision_log is not None and len(queue_alloc) > 1:
+                    decision_log.append(tuple(
+                        (p_log, op_ro[op_log], MW_val,
+                         max(0.0, (current_time + 1.0) - effective_ready_time[op_log]), WIP_val, op_rpt[op_log])
+                        + ((NQ_val, op_next_ptime[op_log], job_weight[j_log], op_slack[op_log] - (current_time + 1.0))
+                           if extended else ())
+                        for j_log, (op_log, p_log) in sorted(queue_alloc.items())))
+
+                if trace is not None:
+                    trace.decisions.append((current_time, MW_val, WIP_val, NQ_val,
+                                            best_candidate_op_alloc[0] if best_candidate_op_alloc is not None else -1))
+                    trace.counts.append(len(queue_alloc))
+                    trace.candidates.extend(queue_alloc.values())
+                    trace.jobs.extend(queue_alloc)
+                    trace.ready.extend([effective_ready_time[op_t] for op_t, _p_t in queue_alloc.values()])
+                if recorder is not None:
+                    recorder.record(current_time, m_id,
+                                    best_candidate_op_alloc[1] if best_candidate_op_alloc is not None else -1,
+                                    len(queue_alloc), best_priority_val_alloc,
+                                    runner_up_priority - best_priority_val_alloc)
 
                 if best_candidate_op_alloc is not None:
-                    jj_sel, oo_sel, ptime_sel = best_candidate_op_alloc
-                    # print(f"   Time {current_time + 1.0:.2f}: Assign J{jj_sel} Op{oo_sel} (PT={ptime_sel:.2f}) to M{m_id} (Pri={best_priority_val_alloc:.2f})")
-                    machine.busy = True
-                    machine.job_id = jj_sel
-                    machine.op_idx = oo_sel
-                    machine.time_remaining = float(ptime_sel)
-                    machine.start_time = current_time + 1.0
-                    if (jj_sel, oo_sel) in ready_ops: ready_ops.remove((jj_sel, oo_sel))
-
-        # (D) Verificăm condiția de terminare
-        all_jobs_truly_completed = False  # Incepem cu fals
-        if completed_ops >= total_ops:  # Conditie necesara, dar nu suficienta
-            all_jobs_truly_completed = True  # Presupunem ca e adevarat si invalidam daca gasim un job neterminat
-            for j_check_idx_final in range(len(len_jobs)):
-                if j_check_idx_final not in cancelled_jobs_set:
-                    if len_jobs[j_check_idx_final] > 0:
-                        last_op_of_job_final = len_jobs[j_check_idx_final] - 1
-                        # Verificam daca ultima operatie a fost programata
-                        is_j_finished_in_schedule_final = False
-                        for sched_j_f, sched_o_f, _, _, _ in schedule:
-                            if sched_j_f == j_check_idx_final and sched_o_f == last_op_of_job_final:
-                                is_j_finished_in_schedule_final = True;
-                                break
-                        if not is_j_finished_in_schedule_final:
-                            all_jobs_truly_completed = False;
-                            break
-
-        if all_jobs_truly_completed and not ready_ops:
-            # print(f"--- Simulation finished at time {current_time + 1.0:.2f} (all ops done and no ready ops) ---")
-            break
-
-        # (E) Incrementăm timpul
-        current_time += 1.0
-
-    # --- Calcul Makespan ---
-    makespan = 0.0
-    valid_job_existed_and_not_cancelled = False
-    for j_id_final_mk in range(len(len_jobs)):  # len(len_jobs) poate fi mai mare decat len(job_end_time) initial
-        if j_id_final_mk not in cancelled_jobs_set and len_jobs[j_id_final_mk] > 0:
-            valid_job_existed_and_not_cancelled = True
-            if j_id_final_mk < len(job_end_time):  # Asiguram ca accesam un index valid
-                makespan = max(makespan, float(job_end_time[j_id_final_mk]))
-            # Daca un job a fost adaugat dar nu a inceput/terminat, job_end_time[j_id_final_mk] va fi 0.0
-            # Daca un job adaugat nu are nicio operatie finalizata, makespan nu va fi afectat de el direct
-            # decat daca e singurul job si nu se intampla nimic.
-
-    if not schedule and valid_job_existed_and_not_cancelled:  # Nimic programat desi existau joburi valide
-        if current_time >= MAX_TIME_LIMIT - 1e-9:
-            makespan = float(MAX_TIME_LIMIT)
-        else:
-            makespan = float(max_time)
-        # print(f"   Warning: No operations scheduled, but valid jobs existed. Makespan set to {makespan:.2f}")
-
-    if makespan == 0.0 and valid_job_existed_and_not_cancelled:
-        if current_time >= MAX_TIME_LIMIT - 1e-9:
-            # print(f"   Warning: Makespan is 0 but MAX_TIME_LIMIT was hit. Setting makespan to {MAX_TIME_LIMIT:.2f}")
-            makespan = float(MAX_TIME_LIMIT)
-        else:  # S-a terminat normal, dar makespan e 0 (poate toate joburile aveau timp 0?)
-            # print(f"   Warning: Makespan is 0.0 but valid jobs existed. Sim time: {current_time:.2f}.")
-            # Daca s-a terminat (completed_ops == total_ops) si ready_ops e goala,
-            # un makespan de 0 e posibil daca toate timpii de procesare sunt 0.
-            # Daca schedule e gol, inseamna ca nu s-a facut nimic.
-            # Daca current_time e mic, e si mai suspect.
-            pass
-
-    # print(f"Final Makespan: {makespan:.2f}. Total Ops Completed: {completed_ops}. Target Ops (adjusted for cancels): {total_ops}.")
-    return makespan, schedule
\ No newline at end of file
+                    # print(f"   Time {current_time + 1.0:.2f}: Assign J{best_candidate_op_alloc[0]} to M{m_id} (Pri={best_priority_val_alloc:.2f})")
+                    assign(m_id, *best_candidate_op_alloc)
+                else:
+                    # Toate prioritățile au fost inf/NaN; MW și TQ cresc cu timpul, deci reîncercăm la pasul următor
+                    schedule_wake(current_time + 1.0)
+
+            if timed:
+                t_now = time.perf_counter()
+                phase_time[2] += t_now - t_mark
+                t_mark = t_now
+
+            # (D) Verificăm condiția de terminare: toate operațiile numărate sunt gata, niciun job
+            # sosit și neanulat nu mai are ultima operație neterminată și nu mai există operații gata
+            if completed_ops >= total_ops and open_jobs == 0 and not ready_ops:
+                # print(f"--- Simulation finished at time {current_time + 1.0:.2f} (all ops done and no ready ops) ---")
+                finished = True
+                if timed:
+                    phase_time[3] += time.perf_counter() - t_mark
+                break
+
+            # (E) Sărim la următorul moment relevant: eveniment extern, trezire sau operație din calendar
+            while wake_queue and wake_queue[0][0] <= current_time + 1e-9:
+                heapq.heappop(wake_queue)  # treziri deja acoperite de pasul curent
+            next_time = min(event_rows[event_idx][0] if event_idx < num_events else math.inf,
+                            wake_queue[0][0] if wake_queue else math.inf,
+                            ready_calendar[0][0] if ready_calendar else math.inf)
+            if next_time < math.inf:
+                current_time = next_time
+            else:
+                # Nu mai poate apărea nicio schimbare: simularea cu tick-uri ar fi mers în gol până la limită
+                current_time += math.floor(MAX_TIME_LIMIT - current_time) + 1.0
+            if timed:
+                phase_time[3] += time.perf_counter() - t_mark
+
+        self.done = not paused
+        if recorder is not None:
+            recorder.stop(current_time, finished)
+        if counters is not None:
+            counters.events += event_idx - events_before
+        self.event_idx = event_idx
+        self.seq = next(event_seq)
+        self.busy_count = busy_count
+        self.arrived_jobs = arrived_jobs
+        self.current_time = current_time
+        self.completed_ops = completed_ops
+        self.total_ops = total_ops
+        self.open_jobs = open_jobs
+        return self
+
+    def result(self):
+        """(makespan, schedule) pentru starea curentă (finală după un `run()` complet)."""
+        len_jobs = self.instance.job_num_ops_list
+        makespan = 0.0
+        valid_job_existed_and_not_cancelled = False
+        for j_id_final_mk in range(self.arrived_jobs):  # doar joburile care au sosit până la final
+            if j_id_final_mk not in self.cancelled_jobs_set and len_jobs[j_id_final_mk] > 0:
+                valid_job_existed_and_not_cancelled = True
+                if j_id_final_mk < len(self.job_end_time):  # Asiguram ca accesam un index valid
+                    makespan = max(makespan, float(self.job_end_time[j_id_final_mk]))
+                # Daca un job a fost adaugat dar nu a inceput/terminat, job_end_time[j_id_final_mk] va fi 0.0
+                # Daca un job adaugat nu are nicio operatie finalizata, makespan nu va fi afectat de el direct
+                # decat daca e singurul job si nu se intampla nimic.
+
+        if self.capped:
+            makespan = penalized_makespan(makespan, self.horizon, self.completed_ops, self.total_ops)
+        elif self.completed_ops == 0 and valid_job_existed_and_not_cancelled:  # Nimic programat desi existau joburi valide
+            if self.current_time >= MAX_TIME_LIMIT - 1e-9:
+                makespan = float(MAX_TIME_LIMIT)
+            else:
+                makespan = float(self.max_time)
+            # print(f"   Warning: No operations scheduled, but valid jobs existed. Makespan set to {makespan:.2f}")
+
+        if makespan == 0.0 and valid_job_existed_and_not_cancelled:
+            if self.current_time >= MAX_TIME_LIMIT - 1e-9:
+                # print(f"   Warning: Makespan is 0 but MAX_TIME_LIMIT was hit. Setting makespan to {MAX_TIME_LIMIT:.2f}")
+                makespan = float(MAX_TIME_LIMIT)
+            else:  # S-a terminat normal, dar makespan e 0 (poate toate joburile aveau timp 0?)
+                # print(f"   Warning: Makespan is 0.0 but valid jobs existed. Sim time: {self.current_time:.2f}.")
+                # Daca s-a terminat (completed_ops == total_ops) si ready_ops e goala,
+                # un makespan de 0 e posibil daca toate timpii de procesare sunt 0.
+                # Daca schedule e gol, inseamna ca nu s-a facut nimic.
+                # Daca current_time e mic, e si mai suspect.
+                pass
+
+        # print(f"Final Makespan: {makespan:.2f}. Total Ops Completed: {completed_ops}. Target Ops (adjusted for cancels): {total_ops}.")
+        return makespan, self.schedule
+
+
+class SimSnapshot:
+    """
+    Starea unui `Simulator` la un moment dat, copiată o singură dată; nu se modifică,
+    deci poate fi bifurcată de oricâte ori cu `fork()`. Tablourile instanței nu sunt
+    copiate (sunt read-only și partajate).
+    """
+
+    _LISTS = ("min_start_due_to_etpc", "job_internal_pred_finish_time", "effective_ready_time",
+              "wake_queue", "job_end_time", "ready_calendar", "job_done_ops", "job_open")
+    _SCALARS = ("instance", "max_time", "horizon", "event_idx", "seq", "busy_count", "arrived_jobs", "current_time",
+                "completed_ops", "total_ops", "open_jobs", "started", "done", "capped")
+
+    def __init__(self, sim):
+        for name in self._LISTS:
+            setattr(self, name, list(getattr(sim, name)))
+        for name in self._SCALARS:
+            setattr(self, name, getattr(sim, name))
+        self.toolbox = sim.toolbox
+        self.individual = sim.individual
+        self.effective_ready_arr = sim.effective_ready_arr.copy()
+        self.machines = sim.machines.copy()
+        self.ready_ops = set(sim.ready_ops)
+        self.machine_queues = [dict(queue) for queue in sim.machine_queues]
+        self.cancelled_jobs_set = set(sim.cancelled_jobs_set)
+        self.schedule = list(sim.schedule) if sim.schedule is not None else None
+        self.metrics = copy.deepcopy(sim.metrics)
+
+    def fork(self, individual=None, toolbox=None, max_time=None, decision_log=None, metrics=None, trace=None,
+             horizon=None, recorder=None, counters=None):
+        """
+        Un `Simulator` nou, în starea din snapshot. `individual` (implicit regula din
+        snapshot) decide de la momentul snapshot-ului încolo. `metrics` implicit continuă
+        o copie a metricelor din snapshot; planificarea (dacă era înregistrată) este copiată.
+        `trace` (`DecisionTrace`) primește deciziile simulării noi; `horizon` (implicit cel
+        din snapshot) se aplică de la momentul snapshot-ului încolo; `recorder` primește deciziile
+        simulării noi, iar `counters` contoarele ei.
+        """
+        sim = Simulator.__new__(Simulator)
+        for name in self._LISTS:
+            setattr(sim, name, list(getattr(self, name)))
+        for name in self._SCALARS:
+            setattr(sim, name, getattr(self, name))
+        sim.toolbox = self.toolbox if toolbox is None else toolbox
+        if max_time is not None:
+            sim.max_time = max_time
+        if horizon is not None:
+            sim.horizon = horizon
+        sim.decision_log = decision_log
+        sim.trace = trace
+        sim.recorder = recorder
+        sim.counters = counters
+        sim.metrics = copy.deepcopy(self.metrics) if metrics is None else metrics
+        sim.effective_ready_arr = self.effective_ready_arr.copy()
+        sim.machines = self.machines.copy()
+        sim.ready_ops = set(self.ready_ops)
+        sim.machine_queues = [dict(queue) for queue in self.machine_queues]
+        sim.cancelled_jobs_set = set(self.cancelled_jobs_set)
+        sim.schedule = list(self.schedule) if self.schedule is not None else None
+        sim.set_rule(self.individual if individual is None else individual)
+        return sim
+
+
+def evaluate_individual(individual, instance, toolbox, max_time=999999.0, decision_log=None,
+                        record_schedule=True, metrics=None, horizon=math.inf, recorder=None, counters=None):
+    """
+    Rulează simularea completă cu regula compilată din `individual` (vezi `Simulator`)
+    și returnează (makespan, schedule); contoarele simulării se adună în `counters`
+    (un `SimCounters`), dacă este dat.
+    """
+    sim = Simulator(individual, instance, toolbox, max_time=max_time, decision_log=decision_log,
+                    record_schedule=record_schedule, metrics=metrics, horizon=horizon, recorder=recorder,
+                    counters=counters)
+    return sim.run().result()
@@ -8,6 +8,9 @@ Features
   În caz de eroare, întoarce individul original (fără crash).
 
 * **tree_str** – ascii‑tree pentru un `PrimitiveTree`.
+
+* **canonical_key** – formă canonică, echivalentă ca ordonare a candidaților,
+  folosită drept cheie pentru memoizarea fitness-ului.
 """
 from __future__ import annotations
 
@@ -91,11 +94,12 @@ def _simplify_rec(name: str, args: Sequence[Any]):
                 case "neg":
                     return -consts[0]
                 case "protected_div":
-                    return 1.0 if consts[1] == 0 else consts[0] / consts[1]
+                    # aceeași semantică ca gp_setup.protected_div
+                    return consts[0] / consts[1] if abs(consts[1]) > 1e-9 else consts[0]
         except Exception:  # pragma: no cover
             pass
 
-    if len(children) == 1:
+    if len(children) == 1 and name != "neg":  # neg(x) rămâne neg(x)
         return children[0]
 
     return (name, *children)
@@ -168,6 +172,77 @@ def simplify_individual(ind: gp.PrimitiveTree, pset):
         return ind
 
 
+# ---------------------------------------------------------------------------
+# Canonical, rank-equivalent form
+# ---------------------------------------------------------------------------
+
+# Terminale egale pentru toți candidații unei decizii (aceeași mașină, același moment)
+_INVARIANT_TERMINALS = frozenset({"MW", "WIP", "NQ"})
+_COMMUTATIVE = frozenset({"add", "mul", "min", "max"})
+
+
+def _is_invariant(nested) -> bool:
+    if isinstance(nested, tuple):
+        return all(_is_invariant(c) for c in nested[1:])
+    return _is_const(nested) or nested in _INVARIANT_TERMINALS
+
+
+def _canonical_rec(nested):
+    if not isinstance(nested, tuple):
+        return nested
+    name, *children = nested
+    children = [_canonical_rec(c) for c in children]
+    if name in _COMMUTATIVE:
+        children.sort(key=lambda c: _from_nested(c, None))
+    simplified = _simplify_rec(name, children)
+    if isinstance(simplified, tuple) and simplified[0] in _COMMUTATIVE:
+        simplified = (simplified[0], *sorted(simplified[1:], key=lambda c: _from_nested(c, None)))
+    return simplified
+
+
+def _rank_rec(nested, sign: int):
+    """
+    Elimină transformările strict monotone de la rădăcină (care nu schimbă ordinea
+    candidaților): termeni invarianți adunați/scăzuți, neg, înmulțire/împărțire cu
+    o constantă nenulă. `sign` = -1 dacă ordinea a fost inversată.
+    """
+    if _is_invariant(nested):
+        return 1.0  # toți candidații sunt la egalitate
+    if isinstance(nested, tuple):
+        name, *children = nested
+        if name == "neg":
+            return _rank_rec(children[0], -sign)
+        if name == "add":
+            variant = [c for c in children if not _is_invariant(c)]
+            if len(variant) == 1:
+                return _rank_rec(variant[0], sign)
+        if name == "sub":
+            if _is_invariant(children[1]):
+                return _rank_rec(children[0], sign)
+            if _is_invariant(children[0]):
+                return _rank_rec(children[1], -sign)
+        if name in ("mul", "protected_div"):
+            divisor = name == "protected_div"
+            for i, c in enumerate(children):
+                if divisor and i == 0:
+                    continue
+                if _is_const(c) and abs(_const_val(c)) > 1e-9:
+                    rest = children[1 - i]
+                    return _rank_rec(rest, sign if _const_val(c) > 0 else -sign)
+    return nested if sign > 0 else _simplify_rec("neg", [nested])
+
+
+def canonical_key(ind: gp.PrimitiveTree) -> str:
+    """
+    Cheie canonică a unei reguli: două reguli cu aceeași cheie aleg același candidat
+    în orice situație de decizie (presupunând valori finite), deci au același fitness.
+    Pe lângă regulile peephole de mai sus, sortează argumentele operatorilor comutativi
+    și elimină transformările monotone de la rădăcină (vezi `_rank_rec`).
+    """
+    nested, _ = _to_nested(ind)
+    return _from_nested(_rank_rec(_canonical_rec(nested), 1), None)
+
+
 # ---------------------------------------------------------------------------
 # ASCII tree printer
 # ---------------------------------------------------------------------------